@@ -2,10 +2,9 @@ from flask import Flask
 import secrets
 from server_code.routes import routes
 import http.client as http_client
-from anthropic import Anthropic
 import os
-from dotenv import load_dotenv
 from server_code.logger_config import setup_logging
+from server_code.anthropic_client import get_anthropic_client
 
 # Initialize logging first
 setup_logging()
@@ -13,10 +12,8 @@ setup_logging()
 import logging
 logger = logging.getLogger(__name__)
 
-# Load environment variables and set up Anthropic client
-load_dotenv()
-api_key = os.getenv('ANTHROPIC_API_KEY')
-client = Anthropic(api_key=api_key)
+# Set up the shared Anthropic client (this also loads environment variables)
+client = get_anthropic_client()
 
 # Get the absolute path to the project root directory
 root_dir = os.path.dirname(os.path.abspath(__file__))
@@ -0,0 +1,65 @@
+import os
+import logging
+import threading
+import importlib.util
+
+import httpx
+from anthropic import Anthropic, AsyncAnthropic, DefaultHttpxClient, DefaultAsyncHttpxClient
+from dotenv import load_dotenv
+
+from .config import (
+    ANTHROPIC_MAX_CONNECTIONS, ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS, ANTHROPIC_KEEPALIVE_EXPIRY,
+    ANTHROPIC_CONNECT_TIMEOUT, ANTHROPIC_READ_TIMEOUT, ANTHROPIC_HTTP2,
+)
+from .logger_config import LogCategory, log_with_category
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Anthropic client factory
+#
+# Every LLM call goes through one of the two clients made here, so they share a connection pool
+# (and the TLS handshakes that went into it) instead of each call site opening its own. The async
+# client belongs to the shared event loop in async_runtime and must only be used from there.
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def get_anthropic_client():
+    """
+    Returns the process-wide sync Anthropic client.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), http_client=DefaultHttpxClient(**_http_client_settings()))
+        return _client
+
+
+def get_async_anthropic_client():
+    """
+    Returns the process-wide AsyncAnthropic client.
+    """
+    global _async_client
+    with _client_lock:
+        if _async_client is None:
+            # Retries are handled by llm_resilience, so the SDK's own are turned off
+            _async_client = AsyncAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), http_client=DefaultAsyncHttpxClient(**_http_client_settings()), max_retries=0)
+        return _async_client
+
+
+def _http_client_settings():
+    http2 = ANTHROPIC_HTTP2 and importlib.util.find_spec('h2') is not None
+    log_with_category(LogCategory.LLM, logging.DEBUG, f"Creating Anthropic HTTP client (max connections {ANTHROPIC_MAX_CONNECTIONS}, HTTP/2 {'on' if http2 else 'off'})")
+    return {
+        'limits': httpx.Limits(
+            max_connections=ANTHROPIC_MAX_CONNECTIONS,
+            max_keepalive_connections=ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=ANTHROPIC_KEEPALIVE_EXPIRY,
+        ),
+        'timeout': httpx.Timeout(ANTHROPIC_READ_TIMEOUT, connect=ANTHROPIC_CONNECT_TIMEOUT),
+        'http2': http2,
+    }
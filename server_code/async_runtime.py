@@ -0,0 +1,52 @@
+import asyncio
+import logging
+import threading
+
+from .logger_config import LogCategory, log_with_category
+
+logger = logging.getLogger(__name__)
+
+# All LLM traffic runs as coroutines on this one event loop, on its own thread, so any number of
+# turns, world generations and background tasks can be waiting on the API at once without each
+# holding a thread of its own. Sync code (Flask routes, background tasks) hands coroutines over with
+# run_coroutine, which blocks the calling thread until the result is ready.
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop():
+    """
+    Returns the shared event loop, starting it on first use.
+    """
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_run_loop, args=(_loop,), name='async_runtime', daemon=True)
+            _loop_thread.start()
+            log_with_category(LogCategory.ADVANCE_CONVERSATION_LOGIC, logging.DEBUG, "Started shared event loop")
+        return _loop
+
+
+def submit_coroutine(coroutine):
+    """
+    Schedules coroutine on the shared event loop and returns a concurrent.futures.Future for its result.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop())
+
+
+def run_coroutine(coroutine):
+    """
+    Runs coroutine on the shared event loop and returns its result, blocking the calling thread.
+    Code already running on the loop must await the coroutine instead.
+    """
+    if threading.current_thread() is _loop_thread:
+        coroutine.close()
+        raise RuntimeError("run_coroutine called from the shared event loop; await the coroutine instead")
+    return submit_coroutine(coroutine).result()
+
+
+def _run_loop(loop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
@@ -0,0 +1,28 @@
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import BACKGROUND_TASK_WORKERS
+from .logger_config import LogCategory, log_with_category
+
+logger = logging.getLogger(__name__)
+
+# Work that a turn kicks off but shouldn't make the player wait for (e.g. coaching) runs on this pool.
+# Tasks that change a conversation must take its conversation_lock before reading and saving it.
+_executor = ThreadPoolExecutor(max_workers=BACKGROUND_TASK_WORKERS, thread_name_prefix='background_task')
+
+
+def submit_background_task(description, function, *args, **kwargs):
+    """
+    Runs function(*args, **kwargs) on the background task pool and returns its Future.
+    Exceptions are logged, since nothing else will see them.
+    """
+    def run():
+        try:
+            return function(*args, **kwargs)
+        except Exception as e:
+            log_with_category(LogCategory.ADVANCE_CONVERSATION_LOGIC, logging.ERROR, f"Background task '{description}' failed: {e}\n{traceback.format_exc()}")
+            raise
+
+    log_with_category(LogCategory.ADVANCE_CONVERSATION_LOGIC, logging.DEBUG, f"Submitting background task '{description}'")
+    return _executor.submit(run)
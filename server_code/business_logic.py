@@ -1,11 +1,18 @@
 import os
+import asyncio
 import datetime
+import threading
+import traceback
 from datetime import datetime as dt
 from .config import *
 from .persistence import *
 from .route_utils import *
 from .llm_communication import *
 from .format_utils import *
+from .background_tasks import submit_background_task
+from .async_runtime import run_coroutine
+from .cache_planner import plan_cache_points
+from .cache_keepalive import note_conversation_activity
 
 import logging
 logger = logging.getLogger(__name__)
@@ -26,21 +33,7 @@ if not os.path.exists(CONVERSATIONS_DIR):
 
 
 def getGameSeedListings():
-    game_seed_ids = read_all_game_seed_ids()
-    game_seed_listings = []
-    for game_seed_id in game_seed_ids:
-        game_seed = read_game_seed(game_seed_id)
-        game_seed_listing = {
-            'id': game_seed_id,
-            'name': game_seed['location'],
-            'location': game_seed['location'],
-            'description': game_seed['description'],
-            'created_at': game_seed['created_at'],
-            'last_updated': game_seed['last_updated'],
-            'message_count': len(game_seed['messages'])
-        }
-        game_seed_listings.append(game_seed_listing)
-    return game_seed_listings
+    return read_game_seed_listings()
 
 
 def saveConversation(conversation):
@@ -52,21 +45,21 @@ def saveConversation(conversation):
 def getConversation(conversation_id):
     return read_conversation(conversation_id)
 
-def getConversationListings():
-    conversation_ids = read_all_conversation_ids()
-    conversation_listings = []
-    for conversation_id in conversation_ids:
-        conversation = read_conversation(conversation_id)
-        conversation_listing = {
-            'conversation_id': conversation_id,
-            'name': conversation['name'],
-            'last_updated': conversation['last_updated'],
-            'created_at': conversation['created_at'],
-            'location': conversation['location'],
-            'message_count': len(conversation['messages'])
-        };
-        conversation_listings.append(conversation_listing)
-    return sorted(conversation_listings, key=lambda x: x['last_updated'], reverse=True)
+def conversationExists(conversation_id):
+    return conversation_exists(conversation_id)
+
+CONVERSATION_LISTING_SORT_KEYS = ('last_updated', 'created_at', 'name', 'message_count')
+
+def getConversationListings(sort_by='last_updated', descending=True, offset=0, limit=None):
+    """
+    Returns one page of conversation listings, sorted server-side, along with the total number of conversations.
+    """
+    if sort_by not in CONVERSATION_LISTING_SORT_KEYS:
+        raise ValueError(f"Cannot sort conversation listings by {sort_by}")
+    conversation_listings = read_conversation_listings()
+    conversation_listings.sort(key=lambda x: x[sort_by], reverse=descending)
+    end = None if limit is None else offset + limit
+    return conversation_listings[offset:end], len(conversation_listings)
 
 def generateConversationID():
     return dt.now().strftime("%Y%m%d%H%M%S")
@@ -158,20 +151,11 @@ def createConversationFromSeed(seed_id):
 def updateConversationCachePoints(conversation):
     log_with_category(LogCategory.CACHING, logging.DEBUG, f"Updating cache points for conversation {conversation['conversation_id']}")
     log_with_category(LogCategory.CACHING, logging.DEBUG, f"Current permanent_cache_index: {conversation.get('permanent_cache_index')}")
-    log_with_category(LogCategory.CACHING, logging.DEBUG, f"Current dynamic_cache_index: {conversation.get('dynamic_cache_index')}")
+    log_with_category(LogCategory.CACHING, logging.DEBUG, f"Current cache_points: {conversation.get('cache_points')}")
 
     num_boot_sequence_messages = conversation.get('boot_sequence_end_index', -1) + 1
     num_messages = len(conversation['messages'])
 
-    if num_messages > CACHE_EVERY_N_MESSAGES:
-        dynamic_cache_index = num_messages - (num_messages % CACHE_EVERY_N_MESSAGES) - 1
-        log_with_category(LogCategory.CACHING, logging.INFO, f"...Dynamic cache index set to {dynamic_cache_index}..." + "(out of " + str(num_messages) + " messages)")
-    else:
-        log_with_category(LogCategory.CACHING, logging.INFO, "Not enough messages for dynamic cache")
-        dynamic_cache_index = None
-
-    conversation['dynamic_cache_index'] = dynamic_cache_index
-
     # Initialize permanent_cache_index if it doesn't exist
     if conversation.get('permanent_cache_index') is None:
         if num_messages > num_boot_sequence_messages + MESSAGES_TO_PRESERVE_AFTER_BOOT_SEQUENCE:
@@ -185,24 +169,36 @@ def updateConversationCachePoints(conversation):
     else:
         log_with_category(LogCategory.CACHING, logging.DEBUG, "Permanent cache index already set")
 
-    log_with_category(LogCategory.CACHING, logging.DEBUG, f"Final cache indices - permanent: {conversation.get('permanent_cache_index')}, dynamic: {conversation.get('dynamic_cache_index')}")
+    # The permanent point (or failing that, the end of the boot sequence) is the prefix that survives summarization
+    pinned_cache_point = conversation['permanent_cache_index'] if conversation.get('permanent_cache_index') is not None else conversation.get('boot_sequence_end_index')
+    conversation['cache_points'] = plan_cache_points(conversation['messages'], conversation.get('cache_points', []), pinned=[pinned_cache_point])
+
+    log_with_category(LogCategory.CACHING, logging.DEBUG, f"Final cache points - permanent: {conversation.get('permanent_cache_index')}, all: {conversation['cache_points']}")
     return conversation
 
 
-def advanceConversation(user_message, conversation, should_create_generated_plot_info):
+def advanceConversation(user_message, conversation, should_create_generated_plot_info, on_text_delta=None, on_response_end=None):
+    return run_coroutine(advanceConversationAsync(user_message, conversation, should_create_generated_plot_info, on_text_delta, on_response_end))
+
+async def advanceConversationAsync(user_message, conversation, should_create_generated_plot_info, on_text_delta=None, on_response_end=None):
+    """
+    Runs one turn (or the world generation sequence) on the shared event loop, so the process can have
+    many turns waiting on the LLM at once. Returns the updated conversation and the new messages.
+    """
     new_messages = []
 
     if should_create_generated_plot_info:
         log_with_category([LogCategory.WORLD_GEN, LogCategory.ADVANCE_CONVERSATION_LOGIC], logging.INFO, "Initiating world generation sequence")
         logger.debug("...Request to run boot sequence identified...")
         # First create the generated plot info
-        plot_messages = createDynamicWorldGenDataMessages(conversation['messages'], conversation['game_setup_system_prompt'])
+        # Checkpointed under the conversation's id, so a retry resumes instead of starting over
+        plot_messages = await createDynamicWorldGenDataMessagesAsync(conversation['messages'], conversation['game_setup_system_prompt'], job_id=conversation['conversation_id'])
         conversation['messages'].extend(plot_messages)
         new_messages.extend(plot_messages)
         
         # Then execute the final startup instruction
         log_with_category([LogCategory.WORLD_GEN, LogCategory.ADVANCE_CONVERSATION_LOGIC], logging.DEBUG, "Executing final startup instruction")
-        conversation, final_messages = executeFinalStartupInstruction(conversation)
+        conversation, final_messages = await executeFinalStartupInstructionAsync(conversation)
         new_messages.extend(final_messages)
         
         # Update cache points after boot sequence is complete
@@ -211,6 +207,7 @@ def advanceConversation(user_message, conversation, should_create_generated_plot
         
         log_with_category([LogCategory.WORLD_GEN, LogCategory.ADVANCE_CONVERSATION_LOGIC], logging.DEBUG, "Boot sequence and cache point setup completed successfully")
         log_with_category([LogCategory.WORLD_GEN, LogCategory.ADVANCE_CONVERSATION_LOGIC], logging.INFO, "World generation sequence completed successfully")
+        note_conversation_activity(conversation['conversation_id'])
         return conversation, new_messages
         # Check if we need to inject the begin game message
 
@@ -222,29 +219,40 @@ def advanceConversation(user_message, conversation, should_create_generated_plot
         
         # Add timestamp to user message
         user_message['timestamp'] = dt.now().isoformat()
+        if PRE_ROLL_DICE:
+            # Lets the GM resolve any roll in this same response, instead of calling a roll tool and needing a second call
+            user_message['pre_rolled_dice'] = roll_pre_rolled_dice()
         conversation['messages'].append(user_message)
+        updateConversationCachePoints(conversation)
         
         # Get and save gm response with timestamp
-        gm_response_json, usage_data = getNextGMResponse(conversation['messages'], conversation['gameplay_system_prompt'], temperature=0.5, permanent_cache_index=conversation.get('permanent_cache_index', None), dynamic_cache_index=conversation.get('dynamic_cache_index', None))
+        gm_response_json, usage_data = await getNextGMResponseAsync(conversation['messages'], conversation['gameplay_system_prompt'], temperature=0.5, cache_points=conversation['cache_points'], on_text_delta=on_text_delta, on_response_end=on_response_end)
         gm_response_json['timestamp'] = dt.now().isoformat()
         conversation['messages'].append(gm_response_json)
         new_messages = [gm_response_json]
 
-        if (isToolUseRequest(gm_response_json)):
-            log_with_category(LogCategory.ADVANCE_CONVERSATION_LOGIC, logging.DEBUG, "tool use request detected")
-            # Generate and save tool result with timestamp
-            tool_result_json = generate_tool_result(gm_response_json)
+        # Answer the GM's tool calls (all of them at once) until it responds without one
+        tool_rounds = 0
+        latest_gm_response_json = gm_response_json
+        while isToolUseRequest(latest_gm_response_json) and tool_rounds < MAX_TOOL_ROUNDS_PER_TURN:
+            tool_rounds += 1
+            log_with_category(LogCategory.ADVANCE_CONVERSATION_LOGIC, logging.DEBUG, f"tool use request detected (round {tool_rounds})")
+            # Generate and save tool results with timestamp
+            tool_result_json = await generate_tool_result_async(latest_gm_response_json, user_message.get('pre_rolled_dice'))
             tool_result_json['timestamp'] = dt.now().isoformat()
             conversation['messages'].append(tool_result_json)
             new_messages.append(tool_result_json)
+            updateConversationCachePoints(conversation)
 
             # Get and save gm response to tool result with timestamp
-            tool_use_response_json, usage_data = getNextGMResponse(conversation['messages'], conversation['gameplay_system_prompt'], temperature=0.8, permanent_cache_index=conversation.get('permanent_cache_index', None), dynamic_cache_index=conversation.get('dynamic_cache_index', None))
-            tool_use_response_json['timestamp'] = dt.now().isoformat()
-            conversation['messages'].append(tool_use_response_json)
-            new_messages.append(tool_use_response_json)
-        else:
+            latest_gm_response_json, usage_data = await getNextGMResponseAsync(conversation['messages'], conversation['gameplay_system_prompt'], temperature=0.8, cache_points=conversation['cache_points'], on_text_delta=on_text_delta, on_response_end=on_response_end)
+            latest_gm_response_json['timestamp'] = dt.now().isoformat()
+            conversation['messages'].append(latest_gm_response_json)
+            new_messages.append(latest_gm_response_json)
+        if tool_rounds == 0:
             log_with_category(LogCategory.ADVANCE_CONVERSATION_LOGIC, logging.DEBUG, "no tool use request detected")
+        elif isToolUseRequest(latest_gm_response_json):
+            log_with_category(LogCategory.ADVANCE_CONVERSATION_LOGIC, logging.WARNING, f"GM was still calling tools after {MAX_TOOL_ROUNDS_PER_TURN} rounds, ending the turn")
 
 
         # Get coaching feedback if we have enough messages since boot
@@ -263,13 +271,7 @@ def advanceConversation(user_message, conversation, should_create_generated_plot
                 log_with_category([LogCategory.COACHING, LogCategory.ADVANCE_CONVERSATION_LOGIC], logging.DEBUG, "post boot messages found")
                 log_with_category([LogCategory.COACHING, LogCategory.ADVANCE_CONVERSATION_LOGIC], logging.DEBUG, f"Getting coaching feedback on {len(post_boot_messages)} messages since boot")
                 messages_to_coach = post_boot_messages[-10:] if len(post_boot_messages) > 10 else post_boot_messages
-                coaching_response, _ = getCoachingMessage(
-                    messages_to_coach, 
-                    conversation['coaching_system_prompt'],
-                    temperature=0.4 
-                )
-                conversation['messages'].append(coaching_response)
-                log_with_category(LogCategory.COACHING, logging.INFO, f"Coaching feedback received: {coaching_response}")
+                scheduleCoaching(conversation, messages_to_coach)
         else:
             log_with_category(LogCategory.COACHING, logging.DEBUG, "game has not begun")
         
@@ -279,79 +281,373 @@ def advanceConversation(user_message, conversation, should_create_generated_plot
         if usage_data['total_input_tokens'] >= MAX_TOTAL_INPUT_TOKENS:
             log_with_category([LogCategory.SUMMARIZATION, LogCategory.ADVANCE_CONVERSATION_LOGIC], logging.INFO, "Identified need to summarize conversation with GM, because total input tokens are at " + str(usage_data['total_input_tokens']) + " (max is " + str(MAX_TOTAL_INPUT_TOKENS) + ")")
             log_with_category([LogCategory.SUMMARIZATION, LogCategory.ADVANCE_CONVERSATION_LOGIC], logging.DEBUG, "...Identified need to summarize conversation with GM...")
-            conversation = summarizeWithGM(conversation)
+            conversation = await summarizeWithGMAsync(conversation)
             log_with_category([LogCategory.SUMMARIZATION, LogCategory.ADVANCE_CONVERSATION_LOGIC], logging.DEBUG, "...Summarization produced (not yet saved)...")
             updateConversationCachePoints(conversation)
-        elif usage_data['uncached_input_tokens'] >= MAX_UNCACHED_INPUT_TOKENS:
-            conversation = updateConversationCachePoints(conversation)
+        else:
+            if usage_data['total_input_tokens'] >= SUMMARIZATION_SOFT_THRESHOLD_TOKENS:
+                # Summarize while the player reads this turn, rather than making a later turn wait for it
+                log_with_category([LogCategory.SUMMARIZATION, LogCategory.ADVANCE_CONVERSATION_LOGIC], logging.INFO, "Scheduling background summarization, because total input tokens are at " + str(usage_data['total_input_tokens']) + " (soft threshold is " + str(SUMMARIZATION_SOFT_THRESHOLD_TOKENS) + ")")
+                scheduleSummarization(conversation)
+            if usage_data['uncached_input_tokens'] >= MAX_UNCACHED_INPUT_TOKENS:
+                # Cache points are planned before every request, so this means the estimates are off
+                log_with_category(LogCategory.CACHING, logging.WARNING, f"Turn sent {usage_data['uncached_input_tokens']} uncached input tokens (target is under {MAX_UNCACHED_INPUT_TOKENS})")
 
         conversation['game_has_begun'] = True
         conversation['game_has_begun_date'] = dt.now().isoformat()
 
+        # Keeps the prompt cache warm while the player reads, if the keepalive is enabled
+        note_conversation_activity(conversation['conversation_id'])
+
         return conversation, new_messages
 
-def createDynamicWorldGenDataMessages(existing_messages, game_setup_system_prompt):
-    logger.debug("Creating dynamic world gen data messages")
+def scheduleCoaching(conversation, messages_to_coach):
+    """
+    Gets coaching on the given messages in the background, so the player doesn't wait for it. The
+    coaching message is attached once it arrives (after the current turn has been saved) and is used
+    by the next turn; a turn that starts before then uses the newest coaching already attached.
+    """
+    requested_at = dt.now().isoformat()
+    return submit_background_task(
+        f"coaching for conversation {conversation['conversation_id']}",
+        _coachConversation,
+        conversation['conversation_id'],
+        list(messages_to_coach),
+        conversation['coaching_system_prompt'],
+        requested_at,
+    )
+
+def _coachConversation(conversation_id, messages_to_coach, coaching_system_prompt, requested_at):
+    coaching_response, _ = getCoachingMessage(
+        messages_to_coach,
+        coaching_system_prompt,
+        temperature=0.4
+    )
+    log_with_category(LogCategory.COACHING, logging.INFO, f"Coaching feedback received: {coaching_response}")
+    coaching_response['coaching_requested_at'] = requested_at
+
+    # Waits for the turn that requested the coaching (or any later one) to be saved first
+    with conversation_lock(conversation_id, blocking=True):
+        conversation = getConversation(conversation_id)
+        if not conversation:
+            log_with_category(LogCategory.COACHING, logging.WARNING, f"Conversation {conversation_id} was deleted before its coaching arrived")
+            return
+        latest_coaching = next((message for message in reversed(conversation['messages']) if message['role'] == 'coach'), None)
+        if latest_coaching is not None and latest_coaching.get('coaching_requested_at', '') >= requested_at:
+            log_with_category(LogCategory.COACHING, logging.INFO, f"Newer coaching is already attached to conversation {conversation_id}, dropping this one")
+            return
+        coaching_response['timestamp'] = dt.now().isoformat()
+        conversation['messages'].append(coaching_response)
+        saveConversation(conversation)
+        log_with_category(LogCategory.COACHING, logging.DEBUG, f"Coaching attached to conversation {conversation_id}")
+
+# Conversations with a background summarization underway, so a burst of turns only starts one
+_conversations_being_summarized = set()
+_conversations_being_summarized_lock = threading.Lock()
+
+def scheduleSummarization(conversation):
+    """
+    Summarizes the conversation in the background. The summarization call runs without holding the
+    conversation lock, so the player can keep playing, and the summary is spliced in afterwards under
+    the lock (keeping any messages added in the meantime), with cache points recomputed and the new
+    prefix written to the cache for the next turn.
+    """
+    conversation_id = conversation['conversation_id']
+    with _conversations_being_summarized_lock:
+        if conversation_id in _conversations_being_summarized:
+            log_with_category(LogCategory.SUMMARIZATION, logging.DEBUG, f"Conversation {conversation_id} is already being summarized")
+            return None
+        _conversations_being_summarized.add(conversation_id)
+    return submit_background_task(f"summarization of conversation {conversation_id}", _summarizeConversationInBackground, conversation_id)
+
+def _summarizeConversationInBackground(conversation_id):
     try:
-        import random
-        import re   
+        # Waits for the turn that scheduled the summarization to be saved
+        with conversation_lock(conversation_id, blocking=True):
+            snapshot = getConversation(conversation_id)
+        if not snapshot:
+            return
+        summarized_message_count = len(snapshot['messages'])
+        history_version = snapshot.get('history_version', 0)
+
+        summarized = summarizeWithGM(snapshot)
+        if summarized.get('history_version', 0) == history_version:
+            log_with_category(LogCategory.SUMMARIZATION, logging.INFO, f"Background summarization of conversation {conversation_id} produced nothing to splice in")
+            return
+
+        with conversation_lock(conversation_id, blocking=True):
+            conversation = getConversation(conversation_id)
+            if not conversation or conversation.get('history_version', 0) != history_version or len(conversation['messages']) < summarized_message_count:
+                log_with_category(LogCategory.SUMMARIZATION, logging.WARNING, f"Conversation {conversation_id} was rewritten during background summarization, discarding the summary")
+                return
+            new_messages = conversation['messages'][summarized_message_count:]
+            conversation['messages'] = summarized['messages'] + new_messages
+            conversation['history_version'] = summarized['history_version']
+            conversation['permanent_cache_index'] = summarized['permanent_cache_index']
+            conversation['cache_points'] = summarized['cache_points']
+            updateConversationCachePoints(conversation)
+            saveConversation(conversation)
+            log_with_category(LogCategory.SUMMARIZATION, logging.INFO, f"Background summary spliced into conversation {conversation_id}, keeping {len(new_messages)} messages added meanwhile")
+
+        # The summary changed the cached prefix, so write the new one to the cache now rather than on the player's next turn
+        try:
+            run_coroutine(refreshPromptCacheAsync(conversation['messages'], conversation['gameplay_system_prompt'], conversation['cache_points']))
+        except Exception as e:
+            log_with_category([LogCategory.SUMMARIZATION, LogCategory.CACHING], logging.WARNING, f"Couldn't warm the cache for summarized conversation {conversation_id}: {e}")
+    finally:
+        with _conversations_being_summarized_lock:
+            _conversations_being_summarized.discard(conversation_id)
+
+# World gen jobs
+#
+# World generation takes minutes, so instead of holding a request open for all of it, it's started
+# as a job on its own thread (startWorldGenJob) and the client polls getWorldGenJobStatus. The job's
+# checkpoints (see createDynamicWorldGenDataMessagesAsync) double as its progress.
+
+# Ids of the world gen jobs running in this process
+_running_world_gen_jobs = set()
+_running_world_gen_jobs_lock = threading.Lock()
+
+def startWorldGenJob(conversation_id):
+    """
+    Starts world generation for a conversation in the background, resuming its last run if that
+    failed, and returns the job's id right away. If the job is already running, nothing new is started.
+    """
+    job_id = conversation_id
+    with _running_world_gen_jobs_lock:
+        if job_id in _running_world_gen_jobs:
+            log_with_category(LogCategory.WORLD_GEN, logging.INFO, f"World gen job {job_id} is already running")
+            return job_id
+        _running_world_gen_jobs.add(job_id)
+    log_with_category(LogCategory.WORLD_GEN, logging.INFO, f"Starting world gen job {job_id}")
+    threading.Thread(target=_runWorldGenJobInBackground, args=(job_id,), daemon=True, name=f"world_gen_{job_id}").start()
+    return job_id
+
+def _runWorldGenJobInBackground(job_id):
+    try:
+        runWorldGenJob(job_id)
+    except ConversationBusyError:
+        # Whoever holds the conversation is running its world gen, and keeps the job up to date
+        log_with_category(LogCategory.WORLD_GEN, logging.WARNING, f"Conversation for world gen job {job_id} is busy, not starting it")
+    except Exception as e:
+        log_with_category(LogCategory.WORLD_GEN, logging.ERROR, f"World gen job {job_id} failed: {e}\n{traceback.format_exc()}")
+        _recordWorldGenJobFailure(job_id, e)
+    finally:
+        with _running_world_gen_jobs_lock:
+            _running_world_gen_jobs.discard(job_id)
+
+def _recordWorldGenJobFailure(job_id, error):
+    # The job may have failed before writing its first checkpoint, or after its last one (e.g. on
+    # the final startup instruction), so it isn't necessarily marked failed yet
+    job = read_world_gen_job(job_id) or {'job_id': job_id, 'created_at': dt.now().isoformat()}
+    job['status'] = 'failed'
+    job['error'] = str(error)
+    if isinstance(error, LLMUnavailableError):
+        job['error_type'] = 'llm_unavailable'
+    else:
+        job['error_type'] = 'internal_error'
+    write_world_gen_job(job)
+
+def runWorldGenJob(job_id):
+    """
+    Runs (or resumes) world generation for the job's conversation and saves it. Returns the
+    conversation, or None if the conversation doesn't exist.
+    """
+    with conversation_lock(job_id, timeout=CONVERSATION_LOCK_TIMEOUT):
+        conversation = getConversation(job_id)
+        if conversation is None:
+            log_with_category(LogCategory.WORLD_GEN, logging.WARNING, f"Conversation for world gen job {job_id} doesn't exist, discarding the job")
+            delete_world_gen_job(job_id)
+            return None
+        conversation, _ = advanceConversation(None, conversation, True)
+        saveConversation(conversation)
+        completeWorldGenJob(job_id)
+    return conversation
+
+def completeWorldGenJob(job_id):
+    """
+    Marks a world gen job done once its conversation has been saved with the results, dropping
+    the checkpoints it no longer needs.
+    """
+    job = read_world_gen_job(job_id)
+    if job is None:
+        return
+    job['status'] = 'completed'
+    job['error'] = None
+    job.pop('steps', None)
+    job.pop('instructions', None)
+    write_world_gen_job(job)
+    log_with_category(LogCategory.WORLD_GEN, logging.INFO, f"World gen job {job_id} completed")
+
+def getWorldGenJobStatus(job_id):
+    """
+    Returns how a world gen job is doing, or None if there's no such job. Status is 'running',
+    'completed', 'failed' or 'interrupted' (it was running when whatever ran it stopped). Starting
+    the job again resumes a failed or interrupted job.
+    """
+    with _running_world_gen_jobs_lock:
+        running_here = job_id in _running_world_gen_jobs
+    job = read_world_gen_job(job_id)
+    if job is None:
+        if not running_here:
+            return None
+        # Started, but hasn't written its first checkpoint yet
+        return {'job_id': job_id, 'status': 'running', 'completed_instructions': 0, 'total_instructions': 0, 'progress_message': "Starting world generation"}
+
+    # Whoever runs a job (a thread here, the blocking /advance_conversation path, resume_world_gen or
+    # another server process) holds its conversation's lock, so a job marked running that nobody
+    # holds the lock for was cut short
+    status = job['status']
+    if status == 'running' and not (running_here or conversation_is_locked(job_id)):
+        status = 'interrupted'
+    elif status == 'failed' and running_here:
+        # Started again, and hasn't written its first checkpoint yet
+        status = 'running'
+
+    completed_instructions = job.get('completed_instructions', 0)
+    total_instructions = job.get('total_instructions', 0)
+    job_status = {
+        'job_id': job_id,
+        'status': status,
+        'completed_instructions': completed_instructions,
+        'total_instructions': total_instructions,
+    }
+    if status == 'running':
+        if completed_instructions < total_instructions:
+            job_status['progress_message'] = f"Processing boot sequence instruction {completed_instructions + 1}/{total_instructions}"
+        else:
+            job_status['progress_message'] = "Executing final startup instruction"
+    elif status == 'failed':
+        job_status['error_type'] = job.get('error_type', 'internal_error')
+    elif status == 'completed':
+        # Everything after the messages the job started from is what it added
+        job_status['prefix_message_count'] = job['prefix_message_count']
+    return job_status
+
+def getWorldGenJobListings():
+    return [listing for listing in read_world_gen_job_listings() if listing['status'] != 'completed']
+
+def resumeWorldGenJob(job_id):
+    """
+    Finishes the world generation a failed or interrupted run left behind (e.g. one cut short by a
+    server restart), and saves its conversation. Returns the conversation, or None if there's no
+    such unfinished job or its conversation is gone.
+    """
+    job = read_world_gen_job(job_id)
+    if job is None or job['status'] == 'completed':
+        return None
+    log_with_category(LogCategory.WORLD_GEN, logging.INFO, f"Resuming world gen job {job_id}")
+    try:
+        return runWorldGenJob(job_id)
+    except ConversationBusyError:
+        raise
+    except Exception as e:
+        _recordWorldGenJobFailure(job_id, e)
+        raise
 
-        # Get pre-parsed instruction sections
-        world_gen_instructions_w_omit_data = get_world_gen_sequence_array()
+async def createDynamicWorldGenDataMessagesAsync(existing_messages, game_setup_system_prompt, job_id=None):
+    """
+    Runs the world gen sequence after existing_messages and returns the messages to keep. With a
+    job_id, every completed instruction is checkpointed as a world gen job, and a job left behind
+    by an earlier run for the same messages is resumed instead of starting over.
+    """
+    logger.debug("Creating dynamic world gen data messages")
+    job = None
+    # Parallel steps finish at their own pace, but the job file is written one checkpoint at a time
+    checkpoint_lock = asyncio.Lock()
+    try:
+        if job_id is not None:
+            job = await asyncio.to_thread(read_world_gen_job, job_id)
+            if job is not None and 'steps' not in job:
+                # Finished, or failed before its first checkpoint, so there's nothing to resume
+                job = None
+            elif job is not None and job['prefix_message_count'] != len(existing_messages):
+                log_with_category(LogCategory.WORLD_GEN, logging.WARNING, f"World gen job {job_id} was started from different messages, starting over")
+                job = None
+
+        if job is not None:
+            # Same instructions (and so the same rolls) as the run being resumed
+            world_gen_instructions_w_omit_data = job['instructions']
+            completed = sum(1 for step in job['steps'] if step is not None)
+            log_with_category(LogCategory.WORLD_GEN, logging.INFO, f"Resuming world gen job {job_id} with {completed}/{len(job['steps'])} instructions already done")
+            job['status'] = 'running'
+            job['error'] = None
+        else:
+            # Get pre-parsed instruction sections
+            world_gen_instructions_w_omit_data = get_world_gen_sequence_array()
+            if job_id is not None:
+                job = {
+                    'job_id': job_id,
+                    'status': 'running',
+                    'created_at': dt.now().isoformat(),
+                    'prefix_message_count': len(existing_messages),
+                    'instructions': world_gen_instructions_w_omit_data,
+                    'steps': [None] * len(world_gen_instructions_w_omit_data),
+                    'game_seed_id': None,
+                    'error': None,
+                }
+        if job is not None:
+            await asyncio.to_thread(write_world_gen_job, job)
         
         temp_conversation = {
             'messages': existing_messages.copy(),
-            'game_setup_system_prompt': game_setup_system_prompt
+            'game_setup_system_prompt': game_setup_system_prompt,
+            'cache_points': [],
         }
 
-        log_with_category(LogCategory.WORLD_GEN, logging.INFO, f"Boot sequence contains {len(world_gen_instructions_w_omit_data)} instructions")
+        num_instructions = len(world_gen_instructions_w_omit_data)
+        log_with_category(LogCategory.WORLD_GEN, logging.INFO, f"Boot sequence contains {num_instructions} instructions")
         
         final_messages = []
-        
-        for i, world_gen_instruction_w_omit_data in enumerate(world_gen_instructions_w_omit_data):
-            try:
-                log_with_category(LogCategory.WORLD_GEN, logging.INFO, f"Processing boot sequence instruction {i+1}/{len(world_gen_instructions_w_omit_data)}")
-                # Convert and add user message with timestamp
-                world_gen_instruction = convert_user_text_to_message(world_gen_instruction_w_omit_data['text'])
-                world_gen_instruction['timestamp'] = dt.now().isoformat()
-                temp_conversation['messages'].append(world_gen_instruction)
-                
-                dynamic_cache_index = (len(temp_conversation['messages']) -1) - (len(temp_conversation['messages']) % 8)
-                permanent_cache_index = (len(temp_conversation['messages']) -1) - (len(temp_conversation['messages']) % 24)
-                
-                gm_response, usage_data = getNextGMResponse(temp_conversation['messages'],temp_conversation['game_setup_system_prompt'], temperature=0.84, dynamic_cache_index=dynamic_cache_index, permanent_cache_index=permanent_cache_index)
-
-                gm_response['timestamp'] = dt.now().isoformat()
-                temp_conversation['messages'].append(gm_response)
-
-                
+        # Caps how many (parallel) instructions are waiting on the GM at once
+        parallel_steps = asyncio.Semaphore(WORLD_GEN_MAX_PARALLEL_STEPS)
+
+        async def run_step(i, world_gen_instruction_w_omit_data, cache_points):
+            async with parallel_steps:
+                step_messages = await _runWorldGenStepAsync(temp_conversation['messages'], cache_points, world_gen_instruction_w_omit_data, game_setup_system_prompt, i, num_instructions)
+            if job is not None:
+                async with checkpoint_lock:
+                    job['steps'][i] = step_messages
+                    await asyncio.to_thread(write_world_gen_job, job)
+            return step_messages
+
+        for group in groupParallelWorldGenInstructions(world_gen_instructions_w_omit_data):
+            # Instructions checkpointed by an earlier run aren't sent again
+            pending = [(i, world_gen_instruction_w_omit_data) for i, world_gen_instruction_w_omit_data in group if job is None or job['steps'][i] is None]
+            cache_points = temp_conversation['cache_points']
+            if len(pending) > 1:
+                first, last = pending[0][0], pending[-1][0]
+                log_with_category(LogCategory.WORLD_GEN, logging.INFO, f"Processing boot sequence instructions {first+1}-{last+1}/{num_instructions} in parallel")
+                cache_points = await _warmWorldGenPrefixAsync(temp_conversation['messages'], cache_points, game_setup_system_prompt)
+
+            # Every step in a group is sent after the same prefix, so none of them sees another's result
+            # If one fails, the rest are still let finish (and checkpointed) before giving up
+            pending_steps = await asyncio.gather(*(run_step(i, world_gen_instruction_w_omit_data, cache_points) for i, world_gen_instruction_w_omit_data in pending), return_exceptions=True)
+            for step in pending_steps:
+                if isinstance(step, BaseException):
+                    raise step
+            steps = dict(zip((i for i, _ in pending), pending_steps))
+            steps = [steps[i] if i in steps else job['steps'][i] for i, _ in group]
+
+            # Splice the steps back in canonical order
+            for (i, world_gen_instruction_w_omit_data), step_messages in zip(group, steps):
+                world_gen_instruction, gm_response = step_messages[0], step_messages[1]
+                temp_conversation['messages'].extend(step_messages)
+
                 # Mark the last GM response of the boot sequence
-                if i == len(world_gen_instructions_w_omit_data) - 1 - 1: # -1 to reveal the final message to user, -1 to adjust for length vs index
+                if i == num_instructions - 1 - 1: # -1 to reveal the final message to user, -1 to adjust for length vs index
                     logger.debug("Marking last GM response as boot sequence end")
                     gm_response['is_boot_sequence_end'] = True
                     # Add the last message to the final messages, as it will inform several messages to come
                     final_messages.append(world_gen_instruction)
-                    
-
 
                 if not world_gen_instruction_w_omit_data['omit_result']:
                     final_messages.append(gm_response)
-                
-                
-                
-                # Handle tool use if requested
-                if isToolUseRequest(gm_response):
-                    logger.debug("Tool use requested during boot sequence")  
-                    tool_result = generate_tool_result(gm_response)
-                    logger.debug(f"Tool result: {tool_result}")
-                    tool_result['timestamp'] = dt.now().isoformat()
-                    temp_conversation['messages'].append(tool_result)
-                    
-                    tool_response, _ = getNextGMResponse(temp_conversation['messages'], game_setup_system_prompt, temperature=0.8)
-                    tool_response['timestamp'] = dt.now().isoformat()
-                    temp_conversation['messages'].append(tool_response)     
-                    
-                    if i == len(world_gen_instructions_w_omit_data) - 1:
+
+                # The GM used a tool, and its response to the result follows
+                if len(step_messages) > 2:
+                    tool_result, tool_response = step_messages[2], step_messages[3]
+                    if i == num_instructions - 1:
                         logger.debug("Moving boot sequence end marker to tool response")
                         gm_response.pop('is_boot_sequence_end', None)
                         tool_response['is_boot_sequence_end'] = True
@@ -359,11 +655,8 @@ def createDynamicWorldGenDataMessages(existing_messages, game_setup_system_promp
                     if not world_gen_instruction_w_omit_data['omit_result']:
                         final_messages.append(tool_result)
                         final_messages.append(tool_response)
-                logger.info(f"...Completed boot sequence instruction {i+1}/{len(world_gen_instructions_w_omit_data)}...")
 
-            except Exception as e:
-                logger.error(f"Error in boot sequence at message '{world_gen_instruction_w_omit_data['text']}': {e}")
-                raise
+            temp_conversation['cache_points'] = plan_cache_points(temp_conversation['messages'], temp_conversation['cache_points'])
 
         # Find the index of the boot sequence end message
         boot_sequence_end_index = -1
@@ -394,16 +687,99 @@ def createDynamicWorldGenDataMessages(existing_messages, game_setup_system_promp
             'game_has_begun': False
         }
         
-        write_game_seed(game_seed)
-        logger.debug(f"Saved game seed with ID: {game_seed['conversation_id']}")
+        # A resumed job may have saved its seed already, before a later step failed
+        if job is not None and job['game_seed_id'] is not None:
+            logger.debug(f"Game seed {job['game_seed_id']} was already saved by world gen job {job_id}")
+        else:
+            await asyncio.to_thread(write_game_seed, game_seed)
+            logger.debug(f"Saved game seed with ID: {game_seed['conversation_id']}")
+            if job is not None:
+                job['game_seed_id'] = game_seed['conversation_id']
+                await asyncio.to_thread(write_world_gen_job, job)
 
         return final_messages
         
     except Exception as e:
         logger.error(f"Error reading boot sequence messages: {e}")
+        if job is not None:
+            job['status'] = 'failed'
+            job['error'] = str(e)
+            try:
+                async with checkpoint_lock:
+                    await asyncio.to_thread(write_world_gen_job, job)
+            except Exception as checkpoint_error:
+                log_with_category(LogCategory.WORLD_GEN, logging.ERROR, f"Couldn't record the failure of world gen job {job_id}: {checkpoint_error}")
+        raise
+
+def groupParallelWorldGenInstructions(world_gen_instructions):
+    """
+    Splits the world gen sequence into the groups it's run in, as lists of (index, instruction).
+    A run of consecutive (parallel) instructions forms one group, every other instruction is a
+    group of its own.
+    """
+    groups = []
+    for i, world_gen_instruction in enumerate(world_gen_instructions):
+        if groups and world_gen_instruction.get('parallel') and groups[-1][-1][1].get('parallel'):
+            groups[-1].append((i, world_gen_instruction))
+        else:
+            groups.append([(i, world_gen_instruction)])
+    return groups
+
+async def _runWorldGenStepAsync(prefix_messages, cache_points, world_gen_instruction_w_omit_data, game_setup_system_prompt, i, num_instructions):
+    """
+    Sends one world gen instruction after prefix_messages, answering the GM's tool use if it asks,
+    and returns the messages the step adds: the instruction and the GM's response, then the tool
+    result and the GM's response to it if a tool was used.
+    """
+    try:
+        log_with_category(LogCategory.WORLD_GEN, logging.INFO, f"Processing boot sequence instruction {i+1}/{num_instructions}")
+        messages = prefix_messages.copy()
+        # Convert and add user message with timestamp
+        world_gen_instruction = convert_user_text_to_message(world_gen_instruction_w_omit_data['text'])
+        world_gen_instruction['timestamp'] = dt.now().isoformat()
+        messages.append(world_gen_instruction)
+
+        cache_points = plan_cache_points(messages, cache_points)
+        gm_response, usage_data = await getNextGMResponseAsync(messages, game_setup_system_prompt, temperature=0.84, cache_points=cache_points, call_type='world_gen')
+        gm_response['timestamp'] = dt.now().isoformat()
+        messages.append(gm_response)
+
+        # Handle tool use if requested
+        if isToolUseRequest(gm_response):
+            logger.debug("Tool use requested during boot sequence")  
+            tool_result = await generate_tool_result_async(gm_response)
+            logger.debug(f"Tool result: {tool_result}")
+            tool_result['timestamp'] = dt.now().isoformat()
+            messages.append(tool_result)
+
+            cache_points = plan_cache_points(messages, cache_points)
+            tool_response, _ = await getNextGMResponseAsync(messages, game_setup_system_prompt, temperature=0.8, cache_points=cache_points, call_type='world_gen')
+            tool_response['timestamp'] = dt.now().isoformat()
+            messages.append(tool_response)
+
+        logger.info(f"...Completed boot sequence instruction {i+1}/{num_instructions}...")
+        return messages[len(prefix_messages):]
+
+    except Exception as e:
+        logger.error(f"Error in boot sequence at message '{world_gen_instruction_w_omit_data['text']}': {e}")
         raise
 
-def executeFinalStartupInstruction(conversation: Dict):
+async def _warmWorldGenPrefixAsync(prefix_messages, cache_points, game_setup_system_prompt):
+    """
+    Caches the prefix a group of parallel world gen instructions share before they're sent, so each
+    reads it from the cache instead of all of them writing it at once. Returns the cache points
+    for the group's requests, with one on the prefix's last message.
+    """
+    # Keep the newest points, leaving one breakpoint for the system prompt
+    shared_cache_points = sorted(set(cache_points) | {len(prefix_messages) - 1})[-(MAX_CACHE_BREAKPOINTS - 1):]
+    try:
+        await refreshPromptCacheAsync(prefix_messages, game_setup_system_prompt, shared_cache_points)
+    except Exception as e:
+        # Only costs the group its cache reads
+        log_with_category([LogCategory.WORLD_GEN, LogCategory.CACHING], logging.WARNING, f"Couldn't warm the cache for parallel world gen instructions: {e}")
+    return shared_cache_points
+
+async def executeFinalStartupInstructionAsync(conversation: Dict):
     """
     Execute the final startup instruction after world generation is complete.
     Returns the updated conversation and any new messages.
@@ -416,10 +792,14 @@ def executeFinalStartupInstruction(conversation: Dict):
         # Convert the instruction to a user message with timestamp
         user_message = convert_user_text_to_message(final_instruction)
         user_message['timestamp'] = dt.now().isoformat()
+        if PRE_ROLL_DICE:
+            # Lets the GM resolve any roll in this same response, instead of calling a roll tool and needing a second call
+            user_message['pre_rolled_dice'] = roll_pre_rolled_dice()
         conversation['messages'].append(user_message)
+        updateConversationCachePoints(conversation)
         
         # Get GM response with timestamp
-        gm_response, usage_data = getNextGMResponse(conversation['messages'], conversation['gameplay_system_prompt'], temperature=0.7)
+        gm_response, usage_data = await getNextGMResponseAsync(conversation['messages'], conversation['gameplay_system_prompt'], temperature=0.7, cache_points=conversation['cache_points'])
         gm_response['timestamp'] = dt.now().isoformat()
         conversation['messages'].append(gm_response)
         new_messages = [gm_response]
@@ -427,12 +807,13 @@ def executeFinalStartupInstruction(conversation: Dict):
         # Handle any tool use if requested
         if isToolUseRequest(gm_response):
             logger.debug("Tool use requested during final startup instruction")
-            tool_result = generate_tool_result(gm_response)
+            tool_result = await generate_tool_result_async(gm_response)
             tool_result['timestamp'] = dt.now().isoformat()
             conversation['messages'].append(tool_result)
             new_messages.append(tool_result)
+            updateConversationCachePoints(conversation)
             
-            tool_response, _ = getNextGMResponse(conversation['messages'], conversation['gameplay_system_prompt'], temperature=0.7)
+            tool_response, _ = await getNextGMResponseAsync(conversation['messages'], conversation['gameplay_system_prompt'], temperature=0.7, cache_points=conversation['cache_points'])
             tool_response['timestamp'] = dt.now().isoformat()
             conversation['messages'].append(tool_response)
             new_messages.append(tool_response)
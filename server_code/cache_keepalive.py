@@ -0,0 +1,127 @@
+import time
+import asyncio
+import logging
+import traceback
+from collections import deque
+
+from .config import (
+    CACHE_KEEPALIVE_ENABLED, CACHE_KEEPALIVE_REFRESH_AFTER_SECONDS, CACHE_KEEPALIVE_MAX_IDLE_SECONDS,
+    CACHE_KEEPALIVE_CHECK_INTERVAL_SECONDS, CACHE_KEEPALIVE_BUDGET_PER_HOUR, CACHE_KEEPALIVE_FIRST_REFRESH_COST_ESTIMATE,
+    INPUT_COST_PER_TOKEN, OUTPUT_COST_PER_TOKEN, CACHE_READ_COST_PER_TOKEN, CACHE_WRITE_COST_PER_TOKEN,
+)
+from .async_runtime import get_event_loop
+from .persistence import read_conversation
+from .llm_communication import refreshPromptCacheAsync
+from .logger_config import LogCategory, log_with_category
+
+logger = logging.getLogger(__name__)
+
+BUDGET_WINDOW_SECONDS = 60 * 60
+
+
+# Prompt cache keepalive
+#
+# The API's prompt cache expires 5 minutes after it was last read, so a player who stops to read a
+# long scene would otherwise pay to write their whole context to the cache again on their next turn.
+# When enabled, every turn marks its conversation as active, and a task on the shared event loop
+# sends a minimal request against the conversation's cached prefix shortly before it would expire.
+# A conversation stops being kept warm once the player has been idle for CACHE_KEEPALIVE_MAX_IDLE_SECONDS,
+# and no refreshes are sent while the last hour's refreshes have used up CACHE_KEEPALIVE_BUDGET_PER_HOUR.
+# A refresh's cost is only known once it's done, so an estimate (its conversation's last refresh cost)
+# is counted against the budget when it's scheduled, and swapped for the real cost when it finishes.
+#
+# All of the state below is only touched from the shared event loop.
+
+# {conversation_id: {'last_activity', 'last_cache_use'}} (time.monotonic() values), plus 'last_refresh_cost' once refreshed
+_active_conversations = {}
+# [time.monotonic(), dollars] for each refresh within the last BUDGET_WINDOW_SECONDS (estimated until it's done)
+_refresh_costs = deque()
+_keepalive_task = None
+
+
+def note_conversation_activity(conversation_id):
+    """
+    Records that the conversation was just played (and its cache just used). Safe to call from any thread.
+    """
+    if not CACHE_KEEPALIVE_ENABLED:
+        return
+    get_event_loop().call_soon_threadsafe(_note_conversation_activity, conversation_id)
+
+
+def _note_conversation_activity(conversation_id):
+    global _keepalive_task
+    now = time.monotonic()
+    # Keeps the conversation's last refresh cost, if it has one
+    _active_conversations.setdefault(conversation_id, {}).update(last_activity=now, last_cache_use=now)
+    if _keepalive_task is None or _keepalive_task.done():
+        log_with_category(LogCategory.CACHING, logging.DEBUG, "Starting cache keepalive")
+        _keepalive_task = asyncio.get_running_loop().create_task(_keep_caches_alive())
+
+
+async def _keep_caches_alive():
+    while _active_conversations:
+        await asyncio.sleep(CACHE_KEEPALIVE_CHECK_INTERVAL_SECONDS)
+        _schedule_due_refreshes(time.monotonic())
+    log_with_category(LogCategory.CACHING, logging.DEBUG, "No active conversations left, stopping cache keepalive")
+
+
+def _schedule_due_refreshes(now):
+    """Starts a refresh for each conversation that's due one, as far as the budget allows. Returns their ids."""
+    scheduled = []
+    for conversation_id in _conversations_due_for_refresh(now):
+        activity = _active_conversations[conversation_id]
+        estimated_cost = activity.get('last_refresh_cost', CACHE_KEEPALIVE_FIRST_REFRESH_COST_ESTIMATE)
+        if _spent_within_budget_window(now) + estimated_cost > CACHE_KEEPALIVE_BUDGET_PER_HOUR:
+            log_with_category(LogCategory.CACHING, logging.WARNING, f"Cache keepalive budget of ${CACHE_KEEPALIVE_BUDGET_PER_HOUR:.2f}/hour is used up, letting caches expire")
+            break
+        activity['last_cache_use'] = now
+        # Reserved now, so the rest of this sweep can't spend it too
+        refresh_cost = [now, estimated_cost]
+        _refresh_costs.append(refresh_cost)
+        asyncio.get_running_loop().create_task(_refresh_conversation_cache(conversation_id, refresh_cost))
+        scheduled.append(conversation_id)
+    return scheduled
+
+
+def _conversations_due_for_refresh(now):
+    """Forgets conversations that have gone idle and returns the ones whose cache is about to expire."""
+    due = []
+    for conversation_id, activity in list(_active_conversations.items()):
+        if now - activity['last_activity'] >= CACHE_KEEPALIVE_MAX_IDLE_SECONDS:
+            log_with_category(LogCategory.CACHING, logging.INFO, f"Conversation {conversation_id} has gone idle, no longer keeping its cache warm")
+            del _active_conversations[conversation_id]
+        elif now - activity['last_cache_use'] >= CACHE_KEEPALIVE_REFRESH_AFTER_SECONDS:
+            due.append(conversation_id)
+    return due
+
+
+def _spent_within_budget_window(now):
+    while _refresh_costs and now - _refresh_costs[0][0] >= BUDGET_WINDOW_SECONDS:
+        _refresh_costs.popleft()
+    return sum(cost for _, cost in _refresh_costs)
+
+
+async def _refresh_conversation_cache(conversation_id, refresh_cost):
+    # The estimate stays reserved while the refresh is in flight, and is released if it doesn't go through
+    cost = 0.0
+    try:
+        conversation = await asyncio.to_thread(read_conversation, conversation_id)
+        if not conversation:
+            _active_conversations.pop(conversation_id, None)
+            return
+        usage = await refreshPromptCacheAsync(conversation['messages'], conversation['gameplay_system_prompt'], conversation.get('cache_points'))
+        if usage is None:
+            return
+        cost = (
+            usage.input_tokens * INPUT_COST_PER_TOKEN +
+            (usage.cache_read_input_tokens or 0) * CACHE_READ_COST_PER_TOKEN +
+            (usage.cache_creation_input_tokens or 0) * CACHE_WRITE_COST_PER_TOKEN +
+            usage.output_tokens * OUTPUT_COST_PER_TOKEN
+        )
+        if conversation_id in _active_conversations:
+            _active_conversations[conversation_id]['last_refresh_cost'] = cost
+        log_with_category(LogCategory.CACHING, logging.INFO, f"Refreshed cache for conversation {conversation_id} for ${cost:.4f}")
+    except Exception as e:
+        log_with_category(LogCategory.CACHING, logging.ERROR, f"Cache refresh for conversation {conversation_id} failed: {e}\n{traceback.format_exc()}")
+    finally:
+        refresh_cost[1] = cost
@@ -0,0 +1,74 @@
+import json
+import logging
+
+from .config import MAX_CACHE_BREAKPOINTS, CACHE_BREAKPOINT_TOKEN_INTERVAL
+from .logger_config import LogCategory, log_with_category
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 3.5  # Rough ratio for English prose; only used to decide where cache points go
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and framing tokens the API adds around each message
+
+
+# Cache planner
+#
+# A conversation's cache points are the indices of the messages whose last content block gets a
+# cache_control breakpoint. Points are only ever added at the end: walking forward from the newest
+# point, a new one is placed as soon as CACHE_BREAKPOINT_TOKEN_INTERVAL estimated tokens have built
+# up, so every turn reads everything up to the newest point from the cache and sends at most about
+# one interval (plus the new messages) uncached. Existing points are never moved, so the prefixes
+# they cached stay valid turn after turn, and pinned points (like the one just before the summary
+# that summarization inserts) are kept in preference to older unpinned ones when trimming to the
+# API's breakpoint limit. Coach messages are never sent to the GM, so they count for nothing and
+# never carry a point.
+
+def estimate_message_tokens(message):
+    """
+    Returns a rough estimate of the input tokens a message costs when sent to the GM.
+    """
+    if message['role'] == 'coach':
+        return 0
+    chars = 0
+    for content in message['content']:
+        if content['type'] == 'text':
+            chars += len(content['text'])
+        elif content['type'] == 'tool_use':
+            chars += len(content['name']) + len(json.dumps(content['input']))
+        elif content['type'] == 'tool_result':
+            chars += len(str(content['content']))
+    return int(chars / CHARS_PER_TOKEN) + MESSAGE_OVERHEAD_TOKENS
+
+
+def plan_cache_points(messages, cache_points=(), pinned=(), max_cache_points=MAX_CACHE_BREAKPOINTS - 1, token_interval=CACHE_BREAKPOINT_TOKEN_INTERVAL):
+    """
+    Returns the sorted message indices that should carry cache breakpoints, extending cache_points
+    (the conversation's current points) so that no more than about token_interval estimated tokens
+    follow the newest one. pinned points are kept if valid. The default max_cache_points leaves one
+    of the API's breakpoints for the cached system prompt.
+    """
+    def is_valid(index):
+        return index is not None and 0 <= index < len(messages) and messages[index]['role'] != 'coach'
+
+    pinned = sorted({index for index in pinned if is_valid(index)})
+    points = sorted({index for index in list(cache_points) + pinned if is_valid(index)})
+
+    uncached_tokens = 0
+    for index in range((points[-1] if points else -1) + 1, len(messages)):
+        uncached_tokens += estimate_message_tokens(messages[index])
+        if uncached_tokens >= token_interval and messages[index]['role'] != 'coach':
+            log_with_category(LogCategory.CACHING, logging.INFO, f"Placing cache point on message {index} after {uncached_tokens} estimated uncached tokens (out of {len(messages)} messages)")
+            points.append(index)
+            uncached_tokens = 0
+
+    if len(points) > max_cache_points:
+        # The newest points cover the longest prefixes; pinned ones survive summarization
+        kept = pinned[-max_cache_points:]
+        for index in reversed(points):
+            if len(kept) >= max_cache_points:
+                break
+            if index not in kept:
+                kept.append(index)
+        log_with_category(LogCategory.CACHING, logging.DEBUG, f"Dropping cache points {sorted(set(points) - set(kept))} to stay within {max_cache_points}")
+        points = sorted(kept)
+
+    return points
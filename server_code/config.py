@@ -3,8 +3,56 @@ import os
 INPUT_COST_PER_TOKEN = 3 / 1_000_000  # $3 per 1 million tokens
 OUTPUT_COST_PER_TOKEN = 15 / 1_000_000  # $15 per 1 million tokens
 MAX_TOTAL_INPUT_TOKENS = 190_000
+SUMMARIZATION_SOFT_THRESHOLD_TOKENS = 150_000  # Past this, summarization starts in the background so turns never reach MAX_TOTAL_INPUT_TOKENS
 MAX_OUTPUT_TOKENS = 5500 # True max allowed by API is 8192
 MAX_UNCACHED_INPUT_TOKENS = 9000
 SUMMARIZATION_BLOCK_SIZE = 25  # Number of messages to summarize at once
 MESSAGES_TO_PRESERVE_AFTER_BOOT_SEQUENCE = 90
-CACHE_EVERY_N_MESSAGES = 25
+MAX_TOOL_ROUNDS_PER_TURN = 3  # Most times a turn answers GM tool calls and asks it to continue
+PRE_ROLL_DICE = True  # Give the GM the turn's dice with the player's message, so roll turns need one GM call instead of two (the roll tools stay as a fallback)
+WORLD_GEN_MAX_PARALLEL_STEPS = 4  # Most (parallel) world gen instructions sent to the GM at once
+MAX_CACHE_BREAKPOINTS = 4  # Most cache_control breakpoints the API accepts in one request, system prompt included
+CACHE_BREAKPOINT_TOKEN_INTERVAL = 6000  # Estimated tokens allowed to build up after the newest cache point before another is placed (see cache_planner.py)
+CONVERSATION_CACHE_MAX_ENTRIES = 32  # Most conversations kept in memory between turns
+CONVERSATION_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Cap on the combined on-disk size of cached conversations
+CONVERSATION_LOCK_TIMEOUT = 2.0  # Seconds a turn waits for a conversation held by a background task before reporting it busy
+BACKGROUND_TASK_WORKERS = 4  # Threads available for work done after a turn returns, like coaching
+
+# Anthropic HTTP connection pool, shared by every LLM call (see anthropic_client.py). Each can be overridden with an environment variable of the same name.
+ANTHROPIC_MAX_CONNECTIONS = int(os.getenv('ANTHROPIC_MAX_CONNECTIONS', 100))  # Most simultaneous connections to the API
+ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS', 20))  # Idle connections kept open for reuse
+ANTHROPIC_KEEPALIVE_EXPIRY = float(os.getenv('ANTHROPIC_KEEPALIVE_EXPIRY', 60.0))  # Seconds an idle connection is kept before closing it
+ANTHROPIC_CONNECT_TIMEOUT = float(os.getenv('ANTHROPIC_CONNECT_TIMEOUT', 5.0))  # Seconds to establish a connection
+ANTHROPIC_READ_TIMEOUT = float(os.getenv('ANTHROPIC_READ_TIMEOUT', 300.0))  # Seconds to wait between bytes of a response (long responses stream for a while)
+ANTHROPIC_HTTP2 = os.getenv('ANTHROPIC_HTTP2', 'true').lower() in ('1', 'true', 'yes')  # Uses the h2 package from requirements.txt; stays on HTTP/1.1 without it
+
+# LLM call resilience (see llm_resilience.py). Call types are 'gm', 'world_gen', 'coaching', 'summarization' and 'cache_refresh'.
+LLM_MAX_ATTEMPTS = 6  # Tries per call, across all models, before giving up
+LLM_BACKOFF_BASE_SECONDS = 1.0  # Backoff before the first retry; doubles per retry, with full jitter
+LLM_BACKOFF_MAX_SECONDS = 30.0  # Longest backoff between retries, unless the API asks for longer with retry-after
+LLM_CALL_DEADLINES = {  # Seconds a call may take in total, retries included
+    'gm': 180,
+    'world_gen': 300,
+    'coaching': 90,
+    'summarization': 300,
+    'cache_refresh': 60,
+}
+LLM_FALLBACK_MODELS = {  # Model to use when the primary is overloaded or its circuit is open
+    'gm': 'claude-3-5-sonnet-20241022',
+    'world_gen': 'claude-3-5-sonnet-20241022',
+    'coaching': 'claude-3-haiku-20240307',
+    'summarization': 'claude-3-5-sonnet-20241022',
+    # No 'cache_refresh' fallback: a cache is per model, so refreshing it on another model is wasted
+}
+LLM_CIRCUIT_BREAKER_FAILURES = 5  # Consecutive retryable failures of a model that open its circuit
+LLM_CIRCUIT_BREAKER_COOLDOWN_SECONDS = 30.0  # How long an open circuit skips the model before letting one call try it again
+
+# Prompt cache keepalive (see cache_keepalive.py). Off unless CACHE_KEEPALIVE_ENABLED is set in the environment.
+CACHE_KEEPALIVE_ENABLED = os.getenv('CACHE_KEEPALIVE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+CACHE_KEEPALIVE_REFRESH_AFTER_SECONDS = 270  # Refresh a conversation's cache this long after it was last used (it expires after 5 minutes)
+CACHE_KEEPALIVE_MAX_IDLE_SECONDS = 20 * 60  # Stop keeping a conversation warm once the player has been idle this long
+CACHE_KEEPALIVE_CHECK_INTERVAL_SECONDS = 15  # How often the keepalive looks for conversations due a refresh
+CACHE_KEEPALIVE_BUDGET_PER_HOUR = float(os.getenv('CACHE_KEEPALIVE_BUDGET_PER_HOUR', 1.00))  # Dollars all refreshes together may spend in any hour
+CACHE_KEEPALIVE_FIRST_REFRESH_COST_ESTIMATE = 0.06  # Dollars set aside for a conversation's first refresh, before its real cost is known (about a full context read from the cache)
+CACHE_READ_COST_PER_TOKEN = INPUT_COST_PER_TOKEN * 0.1  # Cached input tokens cost a tenth of uncached ones
+CACHE_WRITE_COST_PER_TOKEN = INPUT_COST_PER_TOKEN * 1.25  # Writing to the cache costs a quarter more than uncached input
@@ -1,12 +1,13 @@
 import os
 from .config import *
 from datetime import datetime
-from anthropic import Anthropic
-from dotenv import load_dotenv
 from .tool_utils import *
 import json
 from typing import List, Dict
 from .route_utils import * 
+from .async_runtime import run_coroutine
+from .anthropic_client import get_async_anthropic_client
+from .llm_resilience import send_with_resilience, circuit_is_open, LLMUnavailableError
 
 from .logger_config import LogCategory, log_with_category, preview
 
@@ -16,13 +17,6 @@ logger = logging.getLogger(__name__)
   
 
 
-load_dotenv()
-api_key = os.getenv('ANTHROPIC_API_KEY')
-
-client = Anthropic(
-    api_key=api_key
-)
-
 # Update the logger configuration
 logger = logging.getLogger(__name__)
 
@@ -46,6 +40,14 @@ with open(tools_path, 'r') as file:
 
 
 def getCoachingMessage(messages, system_prompt, temperature=0.4, permanent_cache_index=None, dynamic_cache_index=None):
+    return run_coroutine(getCoachingMessageAsync(messages, system_prompt, temperature, permanent_cache_index, dynamic_cache_index))
+
+async def getCoachingMessageAsync(messages, system_prompt, temperature=0.4, permanent_cache_index=None, dynamic_cache_index=None):
+    request = _build_coaching_request(messages, system_prompt, temperature)
+    response = await send_with_resilience('coaching', request, _create_message)
+    return _process_coaching_response(response)
+
+def _build_coaching_request(messages, system_prompt, temperature):
     # Convert messages into a single string
     messages_string = "The following is the last few messages between a player and the GM of the game. This is the subject that you are expected to provided coaching around. This conversation data is provided to you as a single message from an apparent user, but in its original form it is a conventional sequence of messages back and forth between a player and the GM of the game (with other messages including tool use and results, and the like.) The following is the content of those messages: \n\n\n\n"
 
@@ -71,7 +73,7 @@ def getCoachingMessage(messages, system_prompt, temperature=0.4, permanent_cache
 
     log_with_category(LogCategory.USAGE, logging.INFO, "** SENDING ** : " + preview(messages_string, 50))
 
-    response = client.messages.create(
+    return dict(
         model="claude-3-5-haiku-20241022",
         messages=messages_for_api,  # Pass the list of messages
         system=system_prompt,  
@@ -79,6 +81,7 @@ def getCoachingMessage(messages, system_prompt, temperature=0.4, permanent_cache
         temperature=temperature,
     )
 
+def _process_coaching_response(response):
     logger.info(f"...received response from GM...")
 
     _log_response_if_able(response, [LogCategory.LLM, LogCategory.COACHING])
@@ -110,38 +113,69 @@ def getCoachingMessage(messages, system_prompt, temperature=0.4, permanent_cache
         
     return response_json, usage_data
 
-def getNextGMResponse(messages, system_prompt, temperature=0.7, permanent_cache_index=None, dynamic_cache_index=None):
+async def getNextGMResponseAsync(messages, system_prompt, temperature=0.7, cache_points=None, on_text_delta=None, call_type='gm', on_response_end=None):
+    """
+    Gets the GM's next response to the conversation. If on_text_delta is given, the response is
+    streamed and on_text_delta is called with each piece of text as it arrives (on the shared event loop's thread),
+    then on_response_end (if given) is called once the response is complete.
+    cache_points are the indices of the messages to put cache breakpoints on (see cache_planner), and
+    call_type picks the deadline and fallback model used if the API is struggling (see llm_resilience).
+    """
+    request = _build_gm_request(messages, system_prompt, temperature, cache_points)
+    if on_text_delta is None:
+        response = await send_with_resilience(call_type, request, _create_message)
+    else:
+        streamed_text = False
+
+        async def stream_message(request):
+            nonlocal streamed_text
+            async with get_async_anthropic_client().messages.stream(**request) as stream:
+                async for text in stream.text_stream:
+                    streamed_text = True
+                    on_text_delta(text)
+                return await stream.get_final_message()
+
+        # Once text has reached the player, a retry would show them a second, different response
+        response = await send_with_resilience(call_type, request, stream_message, can_retry=lambda: not streamed_text)
+        if on_response_end is not None:
+            on_response_end()
+    logger.info(f"...received response from GM...")
+
+    _log_response_if_able(response, [LogCategory.LLM])
+
+    logger.info(f"response.usage: {response.usage}")
+
+    response_json, usage_data = _process_response(response)
+
+    log_with_category(LogCategory.USAGE, logging.INFO, usage_data)
+
+    return response_json, usage_data
+
+def _build_gm_request(messages, system_prompt, temperature, cache_points, include_coaching=True):
     # Add debug logging for most recent user message
     for msg in reversed(messages):
         if msg['role'] == 'user':
             break
 
-    # Add validation for cache indices
-    if permanent_cache_index is not None and (permanent_cache_index < 0 or permanent_cache_index >= len(messages)):
-        permanent_cache_index = None
-    
-    if dynamic_cache_index is not None and (dynamic_cache_index < 0 or dynamic_cache_index >= len(messages)):
-        logger.warning(f"Invalid dynamic_cache_index: {dynamic_cache_index}")
-        dynamic_cache_index = None
-
-    # Filter out coaching messages and keep track of the last one
+    # Filter out coaching messages and keep track of the last one. Cache points are indices into
+    # messages, so they're translated to positions among the messages actually sent.
     filtered_messages = []
+    cache_point_positions = []
     last_coaching_message = None
-    for msg in messages:
+    for index, msg in enumerate(messages):
         if msg['role'] == 'coach':
             last_coaching_message = msg  # This will keep getting updated until we find the last one
         else:
+            if cache_points and index in cache_points:
+                cache_point_positions.append(len(filtered_messages))
             filtered_messages.append(msg)
 
-    # Modify system prompt with only the last coaching message if one exists
-    modified_system_prompt = system_prompt
-    if last_coaching_message:
-        coaching_text = ""
-        for content in last_coaching_message['content']:
-            if content['type'] == 'text':
-                logger.debug(f"Adding coaching text to system prompt: {content['text']}")
-                coaching_text += content['text'] + "\n"
-        modified_system_prompt = f"{system_prompt}\n\n{coaching_text}"
+    # The system prompt's breakpoints count towards the API's limit too
+    system_breakpoints = sum(1 for block in system_prompt if isinstance(block, dict) and 'cache_control' in block) if isinstance(system_prompt, list) else 0
+    allowed_breakpoints = max(MAX_CACHE_BREAKPOINTS - system_breakpoints, 0)
+    if len(cache_point_positions) > allowed_breakpoints:
+        logger.warning(f"Only {allowed_breakpoints} cache points fit alongside the system prompt, dropping the oldest of {len(cache_point_positions)}")
+        cache_point_positions = cache_point_positions[len(cache_point_positions) - allowed_breakpoints:]
 
     # Clean messages for API consumption
     cleaned_messages = []
@@ -168,20 +202,24 @@ def getNextGMResponse(messages, system_prompt, temperature=0.7, permanent_cache_
                     "tool_use_id": content['tool_use_id'],
                     "content": content['content']
                 }
+                if content.get('is_error'):
+                    clean_content['is_error'] = True
             else:
                 logger.warning(f"Unknown content type: {content['type']}")
                 continue
 
-            if i == permanent_cache_index:
-                logger.info("Adding permanent cache control at index: " + str(i))
-                clean_content['cache_control'] = {"type": "ephemeral"}
-                log_with_category(LogCategory.CACHING, logging.INFO, "Placing permanent cache point on message " + str(i))
-            elif i == dynamic_cache_index:
-                logger.info("Adding dynamic cache control at index: " + str(i))
-                clean_content['cache_control'] = {"type": "ephemeral"}
-                logger.info(f"clean_content: {clean_content}")
-                log_with_category(LogCategory.CACHING, logging.INFO, "Placing dynamic cache point on message " + str(i) + " (out of " + str(len(filtered_messages)) + " messages)")
             cleaned_content.append(clean_content)
+
+        if msg.get('pre_rolled_dice'):
+            cleaned_content.append({
+                "type": "text",
+                "text": format_pre_rolled_dice_note(msg['pre_rolled_dice'])
+            })
+
+        # One breakpoint per cache point, on the message's last block, so it covers the whole message
+        if i in cache_point_positions and cleaned_content:
+            cleaned_content[-1]['cache_control'] = {"type": "ephemeral"}
+            log_with_category(LogCategory.CACHING, logging.INFO, "Placing cache point on message " + str(i) + " (out of " + str(len(filtered_messages)) + " messages)")
             
         cleaned_messages.append({
             "role": msg['role'],
@@ -206,27 +244,61 @@ def getNextGMResponse(messages, system_prompt, temperature=0.7, permanent_cache_
     else:
         logger.info("No messages found in cleaned_messages")
 
-    response = client.messages.create(
+    # Only the last coaching message is used, and it goes at the very end of the request, after every
+    # cache breakpoint, so that new coaching each turn doesn't invalidate the cached system prompt and history
+    if last_coaching_message and include_coaching:
+        coaching_text = ""
+        for content in last_coaching_message['content']:
+            if content['type'] == 'text':
+                logger.debug(f"Adding coaching text to last user message: {content['text']}")
+                coaching_text += content['text'] + "\n"
+        if coaching_text and cleaned_messages and cleaned_messages[-1]['role'] == 'user':
+            cleaned_messages[-1]['content'].append({
+                "type": "text",
+                "text": coaching_text
+            })
+        elif coaching_text:
+            logger.warning("Last message isn't from the user, so coaching was left out of the request")
+
+    return dict(
         model="claude-3-7-sonnet-20250219",
         messages=cleaned_messages,
-        system=modified_system_prompt,  # Use the modified system prompt with only the last coaching message
+        system=system_prompt,
         max_tokens=MAX_OUTPUT_TOKENS,
         temperature=temperature,
         tools=tools,
     )
-    logger.info(f"...received response from GM...")
-
-    _log_response_if_able(response, [LogCategory.LLM])
 
-    logger.info(f"response.usage: {response.usage}")
-
-    response_json, usage_data = _process_response(response)
-
-    log_with_category(LogCategory.USAGE, logging.INFO, usage_data)
+async def refreshPromptCacheAsync(messages, system_prompt, cache_points):
+    """
+    Sends a minimal request with the same prefix as the conversation's next turn, up to its newest
+    cache point, so the cached prefix doesn't expire while the player is reading. Returns the
+    response's usage, or None if the conversation has no cache points to keep warm or the model's
+    circuit breaker is open.
+    """
+    if not cache_points:
+        return None
+    request = _build_gm_request(messages[:max(cache_points) + 1], system_prompt, 0, cache_points, include_coaching=False)
+    # Whatever follows the last breakpoint isn't part of the cached prefix, it just makes the request valid
+    refresh_note = {"type": "text", "text": "(Cache refresh. No reply is needed.)"}
+    if request['messages'][-1]['role'] == 'user':
+        request['messages'][-1]['content'].append(refresh_note)
+    else:
+        request['messages'].append({"role": "user", "content": [refresh_note]})
+    request['max_tokens'] = 1
 
-    return response_json, usage_data
+    if circuit_is_open(request['model']):
+        # A refresh is optional, so leave the breaker's trial call to a player's turn
+        log_with_category([LogCategory.LLM, LogCategory.CACHING], logging.WARNING, f"Skipping cache refresh while the circuit for {request['model']} is open")
+        return None
+    response = await send_with_resilience('cache_refresh', request, _create_message)
+    log_with_category([LogCategory.LLM, LogCategory.CACHING], logging.INFO, f"Cache refresh usage: {response.usage}")
+    return response.usage
 
 def summarizeWithGM(conversation):
+    return run_coroutine(summarizeWithGMAsync(conversation))
+
+async def summarizeWithGMAsync(conversation):
     log_with_category(LogCategory.SUMMARIZATION, logging.INFO, f"Starting summarization for conversation {conversation['conversation_id']}")
     
     permanent_cache_index = conversation.get('permanent_cache_index')
@@ -313,7 +385,7 @@ def summarizeWithGM(conversation):
             log_with_category(LogCategory.SUMMARIZATION, logging.DEBUG, "Calling Claude API for summarization...")
 
             log_with_category([LogCategory.LLM, LogCategory.SUMMARIZATION], logging.INFO, "** SENDING ** : " + preview(formatted_messages, 50))
-            response = client.messages.create(
+            response = await send_with_resilience('summarization', dict(
                 model="claude-3-7-sonnet-20250219",
                 messages=[{
                     "role": "user",
@@ -325,7 +397,7 @@ def summarizeWithGM(conversation):
                 system=system_prompt,  # Now using the corrected system prompt
                 max_tokens=MAX_OUTPUT_TOKENS,
                 temperature=0.6,
-            )
+            ), _create_message)
 
             log_with_category([LogCategory.LLM, LogCategory.SUMMARIZATION], logging.INFO, "** RECEIVED ** : " + preview(response.content[0].text, 50))
 
@@ -368,17 +440,20 @@ def summarizeWithGM(conversation):
                 [summary_message] +
                 remaining_messages
             )
+            # Earlier messages were replaced, so persistence can't just append to what it saved before
+            conversation['history_version'] = conversation.get('history_version', 0) + 1
             
             # Update permanent cache index to be after the summary message
             conversation['permanent_cache_index'] = start_index + 1
             
-            # Should also update dynamic cache if it would overlap
-            if conversation.get('dynamic_cache_index') is not None:
-                if conversation['dynamic_cache_index'] <= conversation['permanent_cache_index']:
-                    conversation['dynamic_cache_index'] = None
-            
-            # Clear dynamic cache index as it needs to be recalculated
-            conversation['dynamic_cache_index'] = None
+            # Cache points before the summary still cover an unchanged prefix, so they stay where they
+            # are to keep their cache hits; later ones move with their messages
+            shift = (start_index + 2) - (end_index + 1)
+            conversation['cache_points'] = (
+                [index for index in conversation.get('cache_points', []) if index <= start_index] +
+                [conversation['permanent_cache_index']] +
+                [index + shift for index in conversation.get('cache_points', []) if index > end_index]
+            )
             
             new_length = len(conversation['messages'])
             log_with_category(LogCategory.SUMMARIZATION, logging.INFO, f"Conversation length changed from {original_length} to {new_length} messages")
@@ -395,6 +470,9 @@ def summarizeWithGM(conversation):
 
     return conversation
 
+async def _create_message(request):
+    return await get_async_anthropic_client().messages.create(**request)
+
 def format_message_content(content):
     """Helper function to format message content based on its type."""
     if not isinstance(content, list):
@@ -0,0 +1,164 @@
+import time
+import random
+import asyncio
+import logging
+
+from anthropic import APIConnectionError, APIStatusError
+
+from .config import (
+    LLM_MAX_ATTEMPTS, LLM_BACKOFF_BASE_SECONDS, LLM_BACKOFF_MAX_SECONDS, LLM_CALL_DEADLINES,
+    LLM_FALLBACK_MODELS, LLM_CIRCUIT_BREAKER_FAILURES, LLM_CIRCUIT_BREAKER_COOLDOWN_SECONDS,
+)
+from .logger_config import LogCategory, log_with_category
+
+logger = logging.getLogger(__name__)
+
+
+# LLM call resilience
+#
+# Every LLM request is sent through send_with_resilience, which retries rate limits, overloads,
+# server errors and connection failures with jittered exponential backoff (or as long as the API's
+# retry-after asks), within a deadline per call type. Each model has a circuit breaker: after
+# LLM_CIRCUIT_BREAKER_FAILURES consecutive failures it is skipped for a cooldown, so calls go straight
+# to the call type's fallback model (or fail fast) instead of each waiting out the incident. An
+# overloaded primary also sends the rest of that call to the fallback model.
+#
+# The breaker state is only touched from the shared event loop (see async_runtime), so it needs no lock.
+
+class LLMUnavailableError(Exception):
+    """Raised when an LLM call can't be completed within its attempts and deadline."""
+
+    def __init__(self, call_type, message):
+        super().__init__(message)
+        self.call_type = call_type
+
+
+# {model: {'failures', 'opened_at'}}
+_circuits = {}
+
+
+async def send_with_resilience(call_type, request, send, can_retry=None):
+    """
+    Returns await send(request), retrying retryable failures. request['model'] may be swapped for the
+    call type's fallback model. can_retry, if given, is checked before each retry (e.g. a streamed
+    response that has already reached the player can't be retried).
+    """
+    deadline = time.monotonic() + LLM_CALL_DEADLINES[call_type]
+    models = [request['model']]
+    if LLM_FALLBACK_MODELS.get(call_type) and LLM_FALLBACK_MODELS[call_type] != request['model']:
+        models.append(LLM_FALLBACK_MODELS[call_type])
+    preferred = 0
+    last_error = None
+
+    for attempt in range(LLM_MAX_ATTEMPTS):
+        model = _choose_model(models, preferred)
+        if model is None:
+            raise LLMUnavailableError(call_type, f"Every model for {call_type} calls is failing, not calling the API") from last_error
+        if model != request['model']:
+            log_with_category(LogCategory.LLM, logging.WARNING, f"Falling back from {request['model']} to {model} for {call_type} call")
+
+        remaining = deadline - time.monotonic()
+        try:
+            response = await asyncio.wait_for(send({**request, 'model': model}), remaining)
+        except asyncio.TimeoutError as e:
+            _record_failure(model)
+            raise LLMUnavailableError(call_type, f"{call_type} call missed its {LLM_CALL_DEADLINES[call_type]}s deadline") from e
+        except (APIStatusError, APIConnectionError) as e:
+            if not _is_retryable(e):
+                raise
+            _record_failure(model)
+            last_error = e
+            if _is_overloaded(e) and model == models[0] and len(models) > 1:
+                preferred = 1
+            if can_retry is not None and not can_retry():
+                raise LLMUnavailableError(call_type, f"{call_type} call failed partway through and can't be retried: {e}") from e
+
+            delay = _retry_delay(e, attempt)
+            if attempt + 1 == LLM_MAX_ATTEMPTS or time.monotonic() + delay >= deadline:
+                break
+            log_with_category(LogCategory.LLM, logging.WARNING, f"{call_type} call to {model} failed ({e}), retrying in {delay:.1f}s (attempt {attempt + 1}/{LLM_MAX_ATTEMPTS})")
+            await asyncio.sleep(delay)
+            continue
+
+        _record_success(model)
+        return response
+
+    raise LLMUnavailableError(call_type, f"{call_type} call failed after retrying: {last_error}") from last_error
+
+
+def circuit_is_open(model):
+    """
+    Returns whether calls to the model are currently being held off by its circuit breaker, for
+    optional calls that would rather be skipped than spend the breaker's trial call.
+    """
+    circuit = _circuits.get(model)
+    return circuit is not None and circuit['failures'] >= LLM_CIRCUIT_BREAKER_FAILURES
+
+
+def _is_retryable(error):
+    if isinstance(error, APIConnectionError):  # Includes timeouts
+        return True
+    return error.status_code in (408, 409, 429) or error.status_code >= 500 or _is_overloaded(error)
+
+
+def _is_overloaded(error):
+    if not isinstance(error, APIStatusError):
+        return False
+    # Overloads that happen mid-stream arrive as an error event on a 200 response
+    body = error.body if isinstance(error.body, dict) else {}
+    error_type = body.get('error', {}).get('type') if isinstance(body.get('error'), dict) else body.get('type')
+    return error.status_code == 529 or error_type == 'overloaded_error'
+
+
+def _retry_delay(error, attempt):
+    backoff = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+    retry_after = _retry_after(error)
+    if retry_after is None:
+        return backoff
+    return retry_after + random.uniform(0, LLM_BACKOFF_BASE_SECONDS)
+
+
+def _retry_after(error):
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        if 'retry-after-ms' in response.headers:
+            return float(response.headers['retry-after-ms']) / 1000
+        if 'retry-after' in response.headers:
+            return float(response.headers['retry-after'])
+    except ValueError:
+        pass  # e.g. an HTTP date, which the API doesn't send
+    return None
+
+
+def _choose_model(models, preferred):
+    for model in models[preferred:] + models[:preferred]:
+        if _circuit_allows(model):
+            return model
+    return None
+
+
+def _circuit_allows(model):
+    circuit = _circuits.get(model)
+    if circuit is None or circuit['failures'] < LLM_CIRCUIT_BREAKER_FAILURES:
+        return True
+    if time.monotonic() - circuit['opened_at'] >= LLM_CIRCUIT_BREAKER_COOLDOWN_SECONDS:
+        # Half open: let this call try the model, and hold off others for another cooldown
+        circuit['opened_at'] = time.monotonic()
+        return True
+    return False
+
+
+def _record_failure(model):
+    circuit = _circuits.setdefault(model, {'failures': 0, 'opened_at': 0.0})
+    circuit['failures'] += 1
+    if circuit['failures'] == LLM_CIRCUIT_BREAKER_FAILURES:
+        circuit['opened_at'] = time.monotonic()
+        log_with_category(LogCategory.LLM, logging.ERROR, f"Circuit opened for {model} after {circuit['failures']} consecutive failures")
+
+
+def _record_success(model):
+    circuit = _circuits.pop(model, None)
+    if circuit is not None and circuit['failures'] >= LLM_CIRCUIT_BREAKER_FAILURES:
+        log_with_category(LogCategory.LLM, logging.INFO, f"Circuit closed for {model}")
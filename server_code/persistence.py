@@ -1,110 +1,179 @@
 import os
 import json
+import copy
+import hashlib
+import threading
+import time
+from itertools import islice
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
 CONVERSATIONS_DIR = "persistent/conversations"
-LLM_INSTRUCTIONS_DIR = "LLM_instructions"
 GAME_SEEDS_DIR = "persistent/game_seeds"
+CONVERSATION_LISTINGS_PATH = "persistent/conversation_listings.json"
+GAME_SEED_CATALOG_PATH = "persistent/game_seed_catalog.json"
+PROMPT_STORE_DIR = "persistent/prompt_store"
+GAME_SEED_ARCHIVE_DIRS = ["persistent/game_seeds_archive", "game_seeds_archive"]
+CONVERSATION_LOCKS_DIR = "persistent/locks"
+WORLD_GEN_JOBS_DIR = "persistent/world_gen_jobs"
+CONVERSATION_LOCK_POLL_INTERVAL = 0.05  # Seconds between attempts when waiting for a conversation lock
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 if not os.path.exists(CONVERSATIONS_DIR):
     os.makedirs(CONVERSATIONS_DIR)
 
 from .logger_config import LogCategory, log_with_category, preview
+from .prompt_registry import LLM_INSTRUCTIONS_DIR, get_instructions, get_system_prompt_blocks, get_compiled_world_gen_sequence, render_world_gen_instruction
+from .config import CONVERSATION_CACHE_MAX_ENTRIES, CONVERSATION_CACHE_MAX_BYTES
+
+MESSAGES_INFIX = ".messages."
+JOURNAL_SUFFIX = ".journal.jsonl"  # Only found next to conversations saved in the older snapshot + journal layout
+
+# Files at the current schema version already have every field the rest of the code expects, so
+# reads skip migration entirely. Bump these (and add a step to _CONVERSATION_MIGRATION_STEPS or
+# _GAME_SEED_MIGRATION_STEPS) when the layout changes.
+CONVERSATION_SCHEMA_VERSION = 3
+GAME_SEED_SCHEMA_VERSION = 1
+
+# System prompts are stored once in the prompt store and referenced from conversations and seeds
+PROMPT_KEYS = ('gameplay_system_prompt', 'game_setup_system_prompt', 'summarizer_system_prompt', 'coaching_system_prompt')
+PROMPT_REF_SUFFIX = "_ref"
+PROMPT_STORE_VERSION = 1
+
+# {prompt hash: system prompt blocks}
+_prompt_store_cache = {}
+# {id(system prompt blocks): (system prompt blocks, prompt ref)}
+_prompt_refs_by_identity = {}
+
+# What this process last saw on disk for each conversation, so saves can append only the new messages.
+# {conversation_id: {'message_store', 'history_version', 'signature'}}
+_message_store_state = {}
+
+# Guards read-modify-write of the listing index files
+_index_lock = threading.Lock()
+
+# Recently used conversations, least recently used first: {conversation_id: {'conversation', 'signature', 'size'}}
+_conversation_cache = OrderedDict()
+_conversation_cache_lock = threading.Lock()
 
 
 # Conversation functions
 
 def read_conversation(conversation_id):
     log_with_category([LogCategory.PERSISTENCE, LogCategory.ADVANCE_CONVERSATION_LOGIC], logging.DEBUG, f"Reading conversation {conversation_id}")
-    file_path = os.path.join(CONVERSATIONS_DIR, f"{conversation_id}.json")
-    if os.path.exists(file_path):
-        with open(file_path, 'r') as f:
-            conversation_data = json.load(f)
-            
-            # Add boot_sequence_end_index if missing
-            if 'conversation_id' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No conversation_id found in file. Setting conversation_id to: " + conversation_id)
-                conversation_data['conversation_id'] = conversation_id
-            if 'boot_sequence_end_index' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, "No boot_sequence_end_index found, scanning messages for marker")
-                boot_sequence_end_index = -1
-                for i, message in enumerate(conversation_data.get('messages', [])):
-                    if message.get('is_boot_sequence_end'):
-                        boot_sequence_end_index = i
-                        break
-                if boot_sequence_end_index != -1:
-                    log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Found boot sequence end marker at index {boot_sequence_end_index}")
-                    conversation_data['boot_sequence_end_index'] = boot_sequence_end_index
-                else:
-                    log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, "No boot sequence end marker found in messages")
-            
-            if 'location' not in conversation_data:
-                conversation_data['location'] = 'Untitled location'
-            if 'created_at' not in conversation_data:
-                # Use 1970-01-01 as the "beginning of time" default date
-                conversation_data['created_at'] = '1970-01-01T00:00:00'
-            if 'intro_blurb' not in conversation_data:
-                conversation_data['intro_blurb'] = get_intro_blurb_string()
-                conversation_data['intro_blurb_date'] = datetime.now().isoformat()
-            if 'gameplay_system_prompt' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No gameplay_system_prompt found in file. Setting gameplay_system_prompt to default: " + conversation_id)
-                conversation_data['gameplay_system_prompt'] = get_gameplay_system_prompt()
-                conversation_data['gameplay_system_prompt_date'] = datetime.now().isoformat()
-            if 'game_setup_system_prompt' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No game_setup_system_prompt found in file. Setting game_setup_system_prompt to default: " + conversation_id)
-                conversation_data['game_setup_system_prompt'] = get_game_setup_system_prompt()
-                conversation_data['game_setup_system_prompt_date'] = datetime.now().isoformat()
-            if 'summarizer_system_prompt' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No summarizer_system_prompt found in file. Setting summarizer_system_prompt to default: " + conversation_id)
-                conversation_data['summarizer_system_prompt'] = get_summarizer_system_prompt()
-                conversation_data['summarizer_system_prompt_date'] = datetime.now().isoformat()
-            if 'game_setup_system_prompt_date' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No game_setup_system_prompt_date found in file. Setting game_setup_system_prompt_date to now: " + conversation_id)
-                conversation_data['game_setup_system_prompt_date'] = datetime.now().isoformat()
-            if 'gameplay_system_prompt_date' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No gameplay_system_prompt_date found in file. Setting gameplay_system_prompt_date to now: " + conversation_id)
-                conversation_data['gameplay_system_prompt_date'] = datetime.now().isoformat()
-            if 'intro_blurb_date' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No intro_blurb_date found in file. Setting intro_blurb_date to now: " + conversation_id)
-                conversation_data['intro_blurb_date'] = datetime.now().isoformat()
-            if 'summarizer_system_prompt_date' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No summarizer_system_prompt_date found in file. Setting summarizer_system_prompt_date to now: " + conversation_id)
-                conversation_data['summarizer_system_prompt_date'] = datetime.now().isoformat()
-            if 'intro_blurb' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No intro_blurb found in file. Setting intro_blurb to default: " + conversation_id)
-                conversation_data['intro_blurb'] = get_intro_blurb_string()
-                conversation_data['intro_blurb_date'] = datetime.now().isoformat()
-            if 'intro_blurb_date' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No intro_blurb_date found in file. Setting intro_blurb_date to now: " + conversation_id)
-                conversation_data['intro_blurb_date'] = datetime.now().isoformat()
-            if 'game_has_begun' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No game_has_begun found in file. Setting game_has_begun to False: " + conversation_id)
-                conversation_data['game_has_begun'] = True
-                conversation_data['game_has_begun_date'] = datetime.now().isoformat()
-            if 'game_has_begun_date' not in conversation_data and conversation_data['game_has_begun']:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No game_has_begun_date found in file, even though game_has_begun is True. Setting game_has_begun_date to now: " + conversation_id)
-                conversation_data['game_has_begun_date'] = datetime.now().isoformat()
-            
-            # Always use latest summarizer system prompt
-            conversation_data['summarizer_system_prompt'] = get_summarizer_system_prompt()
-            conversation_data['summarizer_system_prompt_date'] = datetime.now().isoformat()
-
-            # Always use latest game manual
-            conversation_data['gameplay_system_prompt'] = get_gameplay_system_prompt()
-            conversation_data['gameplay_system_prompt_date'] = datetime.now().isoformat()
-            conversation_data['game_setup_system_prompt'] = get_game_setup_system_prompt()
-            conversation_data['game_setup_system_prompt_date'] = datetime.now().isoformat()
-
-            # Always use latest coach system prompt
-            conversation_data['coaching_system_prompt'] = get_coach_system_prompt()
-            conversation_data['coaching_system_prompt_date'] = datetime.now().isoformat()
-            
-            log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Conversation {conversation_id} loaded successfully")
-            return conversation_data
-    return None
+    conversation_data = _get_cached_conversation(conversation_id)
+    if conversation_data is None:
+        signature = _conversation_file_signature(conversation_id)
+        conversation_data = _load_conversation_data(conversation_id, signature=signature)
+        if conversation_data is None:
+            return None
+        _migrate_conversation_data(conversation_data, conversation_id)
+        _cache_conversation(conversation_data, signature)
+    
+    # Always use latest summarizer system prompt
+    conversation_data['summarizer_system_prompt'] = get_summarizer_system_prompt()
+    conversation_data['summarizer_system_prompt_date'] = datetime.now().isoformat()
+
+    # Always use latest game manual
+    conversation_data['gameplay_system_prompt'] = get_gameplay_system_prompt()
+    conversation_data['gameplay_system_prompt_date'] = datetime.now().isoformat()
+    conversation_data['game_setup_system_prompt'] = get_game_setup_system_prompt()
+    conversation_data['game_setup_system_prompt_date'] = datetime.now().isoformat()
+
+    # Always use latest coach system prompt
+    conversation_data['coaching_system_prompt'] = get_coach_system_prompt()
+    conversation_data['coaching_system_prompt_date'] = datetime.now().isoformat()
+    
+    log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Conversation {conversation_id} loaded successfully")
+    return conversation_data
+
+def _migrate_conversation_data(conversation_data, conversation_id):
+    """Upgrades a conversation from the schema version it was saved at, one migration step at a time."""
+    schema_version = conversation_data.get('schema_version', 0)
+    if schema_version == CONVERSATION_SCHEMA_VERSION:
+        return conversation_data
+    log_with_category(LogCategory.PERSISTENCE, logging.INFO, f"Migrating conversation {conversation_id} from schema version {schema_version} to {CONVERSATION_SCHEMA_VERSION}")
+    for step_version, migration_step in _CONVERSATION_MIGRATION_STEPS:
+        if schema_version < step_version:
+            migration_step(conversation_data, conversation_id)
+    conversation_data['schema_version'] = CONVERSATION_SCHEMA_VERSION
+    return conversation_data
+
+def _migrate_conversation_to_v1(conversation_data, conversation_id):
+    """Backfills fields that conversations saved before schema versioning may be missing."""
+    if 'conversation_id' not in conversation_data:
+        log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No conversation_id found in file. Setting conversation_id to: " + conversation_id)
+        conversation_data['conversation_id'] = conversation_id
+    _backfill_boot_sequence_end_index(conversation_data)
+    if 'location' not in conversation_data:
+        conversation_data['location'] = 'Untitled location'
+    if 'created_at' not in conversation_data:
+        # Use 1970-01-01 as the "beginning of time" default date
+        conversation_data['created_at'] = '1970-01-01T00:00:00'
+    _backfill_prompts_and_dates(conversation_data, conversation_id)
+    if 'game_has_begun' not in conversation_data:
+        log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No game_has_begun found in file. Setting game_has_begun to True: " + conversation_id)
+        conversation_data['game_has_begun'] = True
+        conversation_data['game_has_begun_date'] = datetime.now().isoformat()
+    if 'game_has_begun_date' not in conversation_data and conversation_data['game_has_begun']:
+        log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No game_has_begun_date found in file, even though game_has_begun is True. Setting game_has_begun_date to now: " + conversation_id)
+        conversation_data['game_has_begun_date'] = datetime.now().isoformat()
+
+def _migrate_conversation_to_v3(conversation_data, conversation_id):
+    """Replaces the single dynamic_cache_index with the planned cache_points."""
+    conversation_data.pop('dynamic_cache_index', None)
+    if 'cache_points' not in conversation_data:
+        conversation_data['cache_points'] = []
+
+# (schema version, step that upgrades a conversation to it), oldest first. Version 2 moved messages
+# into the message store, which _load_conversation_data reads in either layout, so it has no step.
+_CONVERSATION_MIGRATION_STEPS = [
+    (1, _migrate_conversation_to_v1),
+    (3, _migrate_conversation_to_v3),
+]
+
+def _backfill_boot_sequence_end_index(conversation_data):
+    if 'boot_sequence_end_index' in conversation_data:
+        return
+    log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, "No boot_sequence_end_index found, scanning messages for marker")
+    for i, message in enumerate(conversation_data.get('messages', [])):
+        if message.get('is_boot_sequence_end'):
+            log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Found boot sequence end marker at index {i}")
+            conversation_data['boot_sequence_end_index'] = i
+            return
+    log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, "No boot sequence end marker found in messages")
+
+def _backfill_prompts_and_dates(conversation_data, conversation_id):
+    """Backfills the system prompts and intro blurb, and the dates they were set, shared by conversations and game seeds."""
+    if 'intro_blurb' not in conversation_data:
+        log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No intro_blurb found in file. Setting intro_blurb to default: " + conversation_id)
+        conversation_data['intro_blurb'] = get_intro_blurb_string()
+        conversation_data['intro_blurb_date'] = datetime.now().isoformat()
+    if 'gameplay_system_prompt' not in conversation_data:
+        log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No gameplay_system_prompt found in file. Setting gameplay_system_prompt to default: " + conversation_id)
+        conversation_data['gameplay_system_prompt'] = get_gameplay_system_prompt()
+        conversation_data['gameplay_system_prompt_date'] = datetime.now().isoformat()
+    if 'game_setup_system_prompt' not in conversation_data:
+        log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No game_setup_system_prompt found in file. Setting game_setup_system_prompt to default: " + conversation_id)
+        conversation_data['game_setup_system_prompt'] = get_game_setup_system_prompt()
+        conversation_data['game_setup_system_prompt_date'] = datetime.now().isoformat()
+    if 'summarizer_system_prompt' not in conversation_data:
+        log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No summarizer_system_prompt found in file. Setting summarizer_system_prompt to default: " + conversation_id)
+        conversation_data['summarizer_system_prompt'] = get_summarizer_system_prompt()
+        conversation_data['summarizer_system_prompt_date'] = datetime.now().isoformat()
+    for date_key in ('game_setup_system_prompt_date', 'gameplay_system_prompt_date', 'intro_blurb_date', 'summarizer_system_prompt_date'):
+        if date_key not in conversation_data:
+            log_with_category(LogCategory.PERSISTENCE, logging.WARNING, f"No {date_key} found in file. Setting {date_key} to now: " + conversation_id)
+            conversation_data[date_key] = datetime.now().isoformat()
 
 # Conversation functions
 
@@ -119,34 +188,327 @@ def _validate_cache_indices(conversation):
             log_with_category([LogCategory.PERSISTENCE, LogCategory.CACHING], logging.WARNING, f"Invalid permanent_cache_index: {conversation['permanent_cache_index']}")
             conversation['permanent_cache_index'] = None
             
-    # Validate dynamic cache index
-    if conversation.get('dynamic_cache_index') is not None:
-        if conversation['dynamic_cache_index'] < 0 or conversation['dynamic_cache_index'] >= num_messages:
-            log_with_category([LogCategory.PERSISTENCE, LogCategory.CACHING], logging.WARNING, f"Invalid dynamic_cache_index: {conversation['dynamic_cache_index']}")
-            conversation['dynamic_cache_index'] = None
-        elif conversation.get('permanent_cache_index') is not None:
-            if conversation['dynamic_cache_index'] <= conversation['permanent_cache_index']:
-                log_with_category([LogCategory.PERSISTENCE, LogCategory.CACHING], logging.WARNING, "Dynamic cache index overlaps with permanent cache index")
-                conversation['dynamic_cache_index'] = None
+    # Validate cache points
+    cache_points = conversation.get('cache_points') or []
+    valid_cache_points = [index for index in cache_points if 0 <= index < num_messages]
+    if len(valid_cache_points) != len(cache_points):
+        log_with_category([LogCategory.PERSISTENCE, LogCategory.CACHING], logging.WARNING, f"Dropping invalid cache points: {sorted(set(cache_points) - set(valid_cache_points))}")
+    conversation['cache_points'] = valid_cache_points
                 
     return conversation
 
 def write_conversation(conversation):
     conversation = _validate_cache_indices(conversation)
     log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Saving conversation {conversation['conversation_id']}")
-    conversation_id = conversation['conversation_id']
     conversation['last_updated'] = datetime.now().isoformat()
-    file_path = os.path.join(CONVERSATIONS_DIR, f"{conversation_id}.json")
-    with open(file_path, 'w') as f:
-        json.dump(conversation, f, indent=2)
+    _write_conversation_files(conversation)
+    _update_conversation_listing(conversation)
+    _cache_conversation(conversation)
 
 def delete_conversation(conversation_id):
-    file_path = os.path.join(CONVERSATIONS_DIR, f"{conversation_id}.json")
+    file_path = _conversation_header_path(conversation_id)
+    _message_store_state.pop(conversation_id, None)
+    _evict_cached_conversation(conversation_id)
+    _remove_conversation_listing(conversation_id)
+    for path in _conversation_message_paths(conversation_id) + [_conversation_journal_path(conversation_id)]:
+        if os.path.exists(path):
+            os.remove(path)
     if os.path.exists(file_path):
         os.remove(file_path)
         return True
     return False
 
+def conversation_exists(conversation_id):
+    return os.path.exists(_conversation_header_path(conversation_id))
+
+def read_conversation_header(conversation_id):
+    """
+    Returns everything about a conversation except its messages (prompts are left as prompt store
+    references), with message_count taken from the message store. Message bodies are not read.
+    """
+    header = _read_conversation_header_file(conversation_id)
+    if header is None:
+        return None
+    if 'messages' in header:
+        # Older layout, where the messages live in the same file
+        header = _load_conversation_data(conversation_id, hydrate=False)
+        header['message_count'] = len(header.pop('messages'))
+        return header
+    header['message_count'] = header.pop('message_store')['count']
+    return header
+
+def read_conversation_messages(conversation_id, start=0, end=None):
+    """
+    Returns messages[start:end] of a conversation, or None if it doesn't exist. Only the requested
+    lines of the message store are parsed.
+    """
+    header = _read_conversation_header_file(conversation_id)
+    if header is None:
+        return None
+    if 'messages' in header:
+        return _load_conversation_data(conversation_id, hydrate=False)['messages'][start:end]
+    return _read_messages(conversation_id, header['message_store'], start, end)
+
+# Conversation lock functions
+#
+# Advancing a conversation means reading it, spending several seconds on LLM calls and writing it
+# back. Two requests doing that at once for the same conversation both pay for the LLM and the later
+# write drops the other's turn, so each advance holds an OS file lock on persistent/locks/<id>.lock.
+# File locks work across server processes and are released by the OS if a process dies mid-turn.
+
+class ConversationBusyError(Exception):
+    """Raised when a conversation is already locked by another request."""
+    pass
+
+@contextmanager
+def conversation_lock(conversation_id, blocking=False, timeout=0):
+    """
+    Holds the cross-process lock for a conversation for the duration of the with block.
+    If it is already held, waits up to timeout seconds for it to be released and then raises
+    ConversationBusyError, unless blocking is True (in which case it waits as long as it takes).
+    """
+    os.makedirs(CONVERSATION_LOCKS_DIR, exist_ok=True)
+    lock_path = os.path.join(CONVERSATION_LOCKS_DIR, f"{conversation_id}.lock")
+    deadline = time.monotonic() + timeout
+    with open(lock_path, 'a+') as lock_file:
+        while True:
+            try:
+                _lock_file(lock_file, blocking)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    log_with_category(LogCategory.PERSISTENCE, logging.INFO, f"Conversation {conversation_id} is locked by another request")
+                    raise ConversationBusyError(f"Conversation {conversation_id} is already being advanced")
+                time.sleep(CONVERSATION_LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            _unlock_file(lock_file)
+
+def conversation_is_locked(conversation_id):
+    """Returns whether any request or process holds the conversation's lock right now, without waiting for it."""
+    lock_path = os.path.join(CONVERSATION_LOCKS_DIR, f"{conversation_id}.lock")
+    if not os.path.exists(lock_path):
+        return False
+    with open(lock_path, 'a+') as lock_file:
+        try:
+            _lock_file(lock_file, False)
+        except OSError:
+            return True
+        _unlock_file(lock_file)
+        return False
+
+def _lock_file(lock_file, blocking):
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+
+def _unlock_file(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+# Conversation storage functions
+#
+# A conversation on disk is a small header document (<id>.json: ids, dates, flags, cache indices,
+# prompt references and a 'message_store' pointer) plus a message store (<id>.messages.<generation>.jsonl)
+# holding one message per line. A save appends only the new messages to the store and then atomically
+# replaces the header, whose message_store count and size say how much of the store is valid, so a crash
+# between the two leaves at most some ignored trailing lines. When history is rewritten (e.g. by
+# summarization) the messages go to a store with a new generation, and the old one is removed once the
+# header points at the new one. Metadata-only reads just parse the header.
+#
+# Conversations saved in the older layout (every message in <id>.json, plus an optional
+# <id>.journal.jsonl of appended saves) are still read, and move to the new layout on their next save.
+
+def _load_conversation_data(conversation_id, hydrate=True, signature=None):
+    """
+    Loads the raw conversation from disk, with its messages. signature is the conversation's file
+    signature from before the read, if the caller already took it.
+    """
+    # Taken before reading, as not every reader holds the conversation lock: a save landing mid-read
+    # must not have its signature recorded against the older content
+    if signature is None:
+        signature = _conversation_file_signature(conversation_id)
+    conversation_data = _read_conversation_header_file(conversation_id)
+    if conversation_data is None:
+        return None
+
+    if 'messages' in conversation_data:
+        _replay_legacy_journal(conversation_data, conversation_id)
+        conversation_data.pop('journal_generation', None)
+        # Nothing to append to, so the next save writes a fresh message store
+        _message_store_state.pop(conversation_id, None)
+    else:
+        message_store = conversation_data.pop('message_store')
+        conversation_data['messages'] = _read_messages(conversation_id, message_store)
+        if _conversation_file_signature(conversation_id) == signature:
+            _remember_message_store_state(conversation_data, conversation_id, message_store, signature)
+        else:
+            log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Conversation {conversation_id} was saved while it was being read, not remembering its message store")
+    return _hydrate_prompts(conversation_data) if hydrate else conversation_data
+
+def _write_conversation_files(conversation):
+    """Writes a conversation's new messages and its header, appending to the message store where possible."""
+    conversation_id = conversation['conversation_id']
+    messages = conversation['messages']
+    state = _message_store_state.get(conversation_id)
+    stale_paths = []
+    if _can_append_messages(conversation, state):
+        message_store = _append_messages(conversation_id, state['message_store'], messages[state['message_store']['count']:])
+    else:
+        stale_paths = _conversation_message_paths(conversation_id) + [_conversation_journal_path(conversation_id)]
+        message_store = _write_message_store(conversation_id, messages, _next_message_store_generation(conversation_id))
+
+    header = _dehydrate_prompts(_conversation_header(conversation))
+    header['message_count'] = message_store['count']
+    header['message_store'] = message_store
+    file_path = _conversation_header_path(conversation_id)
+    temp_path = file_path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(header, f, indent=2)
+    os.replace(temp_path, file_path)
+
+    # Only safe to drop the old message store now that the header no longer points at it
+    for path in stale_paths:
+        if os.path.exists(path):
+            os.remove(path)
+    _remember_message_store_state(conversation, conversation_id, message_store)
+
+def _can_append_messages(conversation, state):
+    conversation_id = conversation['conversation_id']
+    if state is None:
+        return False
+    if state['signature'] != _conversation_file_signature(conversation_id):
+        log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Conversation {conversation_id} changed on disk since it was read, rewriting its messages")
+        return False
+    if conversation.get('history_version', 0) != state['history_version'] or len(conversation['messages']) < state['message_store']['count']:
+        log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Message history of conversation {conversation_id} was rewritten, rewriting its messages")
+        return False
+    message_store_signature = _file_signature(_conversation_messages_path(conversation_id, state['message_store']['generation']))
+    if message_store_signature is None or message_store_signature[1] < state['message_store']['size']:
+        log_with_category(LogCategory.PERSISTENCE, logging.WARNING, f"Message store of conversation {conversation_id} is shorter than expected, rewriting its messages")
+        return False
+    return True
+
+def _append_messages(conversation_id, message_store, new_messages):
+    path = _conversation_messages_path(conversation_id, message_store['generation'])
+    data = "".join(json.dumps(message) + "\n" for message in new_messages).encode('utf-8')
+    with open(path, 'r+b') as f:
+        # Drop anything past the end the header knows about, e.g. lines from a save that crashed
+        f.truncate(message_store['size'])
+        f.seek(message_store['size'])
+        f.write(data)
+    log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Appended {len(new_messages)} messages to conversation {conversation_id}")
+    return {
+        'generation': message_store['generation'],
+        'count': message_store['count'] + len(new_messages),
+        'size': message_store['size'] + len(data),
+    }
+
+def _write_message_store(conversation_id, messages, generation):
+    path = _conversation_messages_path(conversation_id, generation)
+    data = "".join(json.dumps(message) + "\n" for message in messages).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(data)
+    log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Wrote {len(messages)} messages to message store generation {generation} of conversation {conversation_id}")
+    return {'generation': generation, 'count': len(messages), 'size': len(data)}
+
+def _read_messages(conversation_id, message_store, start=0, end=None):
+    count = message_store['count']
+    end = count if end is None else min(end, count)
+    if start >= end:
+        return []
+    messages = []
+    with open(_conversation_messages_path(conversation_id, message_store['generation']), 'rb') as f:
+        for line in islice(f, start, end):
+            messages.append(json.loads(line))
+    if len(messages) != end - start:
+        log_with_category(LogCategory.PERSISTENCE, logging.WARNING, f"Message store of conversation {conversation_id} has fewer messages than its header says")
+    return messages
+
+def _replay_legacy_journal(conversation_data, conversation_id):
+    journal_path = _conversation_journal_path(conversation_id)
+    if not os.path.exists(journal_path):
+        return
+    generation = conversation_data.get('journal_generation', 0)
+    entries = 0
+    with open(journal_path, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn final line from an interrupted save; everything before it is intact
+                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, f"Ignoring incomplete journal entry for conversation {conversation_id}")
+                break
+            if entry.get('generation') != generation:
+                continue
+            if entry['base_message_count'] != len(conversation_data['messages']):
+                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, f"Journal entry for conversation {conversation_id} does not line up with snapshot, ignoring the rest of the journal")
+                break
+            conversation_data['messages'].extend(entry['messages'])
+            conversation_data.update(entry['header'])
+            for key in entry.get('removed', []):
+                conversation_data.pop(key, None)
+            entries += 1
+    log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Replayed {entries} journal entries for conversation {conversation_id}")
+
+def _remember_message_store_state(conversation, conversation_id, message_store, signature=None):
+    _message_store_state[conversation_id] = {
+        'message_store': message_store,
+        'history_version': conversation.get('history_version', 0),
+        'signature': _conversation_file_signature(conversation_id) if signature is None else signature,
+    }
+
+def _read_conversation_header_file(conversation_id):
+    file_path = _conversation_header_path(conversation_id)
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, 'r') as f:
+        return json.load(f)
+
+def _next_message_store_generation(conversation_id):
+    generations = [int(path.rsplit('.', 2)[-2]) for path in _conversation_message_paths(conversation_id)]
+    return max(generations, default=0) + 1
+
+def _conversation_header(conversation):
+    return {key: value for key, value in conversation.items() if key != 'messages'}
+
+def _conversation_header_path(conversation_id):
+    return os.path.join(CONVERSATIONS_DIR, f"{conversation_id}.json")
+
+def _conversation_journal_path(conversation_id):
+    return os.path.join(CONVERSATIONS_DIR, f"{conversation_id}{JOURNAL_SUFFIX}")
+
+def _conversation_messages_path(conversation_id, generation):
+    return os.path.join(CONVERSATIONS_DIR, f"{conversation_id}{MESSAGES_INFIX}{generation}.jsonl")
+
+def _conversation_message_paths(conversation_id):
+    prefix = f"{conversation_id}{MESSAGES_INFIX}"
+    return [os.path.join(CONVERSATIONS_DIR, filename) for filename in os.listdir(CONVERSATIONS_DIR)
+            if filename.startswith(prefix) and filename.endswith(".jsonl") and filename[len(prefix):-6].isdigit()]
+
+def _conversation_file_signature(conversation_id):
+    """
+    Cheap fingerprint of the files backing a conversation, used to notice writes from elsewhere.
+    Every save replaces the header, so its signature changes whenever the messages do.
+    """
+    return [
+        _file_signature(_conversation_header_path(conversation_id)),
+        _file_signature(_conversation_journal_path(conversation_id)),
+    ]
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+        return [stat.st_mtime_ns, stat.st_size]
+    except FileNotFoundError:
+        return None
+
 def read_all_conversation_ids():
     conversation_ids = []
     for filename in os.listdir(CONVERSATIONS_DIR):
@@ -155,6 +517,135 @@ def read_all_conversation_ids():
             conversation_ids.append(conversation_id)
     return conversation_ids
   
+# Conversation cache functions
+#
+# Most reads are of a conversation this process saved a few seconds earlier, so loaded and written
+# conversations are kept in a bounded LRU cache. An entry is only used while the conversation's files
+# still have the mtime and size they had when it was cached, so writes from another process (or by
+# hand) are picked up. Callers get their own shallow copy of the conversation and of its messages
+# list, which is enough isolation for the way conversations are modified (appending messages and
+# assigning header fields); messages themselves are shared and must not be edited in place.
+
+def _get_cached_conversation(conversation_id):
+    with _conversation_cache_lock:
+        entry = _conversation_cache.get(conversation_id)
+        if entry is None:
+            return None
+        if entry['signature'] != _conversation_file_signature(conversation_id):
+            log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Cached conversation {conversation_id} is out of date, reloading it")
+            del _conversation_cache[conversation_id]
+            return None
+        _conversation_cache.move_to_end(conversation_id)
+        log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Conversation {conversation_id} served from cache")
+        return _copy_conversation(entry['conversation'])
+
+def _cache_conversation(conversation, signature=None):
+    """
+    Caches a conversation under the signature of its files. When it was just read, signature is the
+    one taken before the read, and it is only cached if the read was unchanged by any save.
+    """
+    conversation_id = conversation['conversation_id']
+    state = _message_store_state.get(conversation_id)
+    if state is None or (signature is not None and state['signature'] != signature):
+        return
+    signature = state['signature']
+    size = sum(file_signature[1] for file_signature in signature if file_signature is not None) + state['message_store']['size']
+    with _conversation_cache_lock:
+        _conversation_cache[conversation_id] = {
+            'conversation': _copy_conversation(conversation),
+            'signature': signature,
+            'size': size,
+        }
+        _conversation_cache.move_to_end(conversation_id)
+        total_size = sum(entry['size'] for entry in _conversation_cache.values())
+        while len(_conversation_cache) > CONVERSATION_CACHE_MAX_ENTRIES or (total_size > CONVERSATION_CACHE_MAX_BYTES and len(_conversation_cache) > 1):
+            _, evicted = _conversation_cache.popitem(last=False)
+            total_size -= evicted['size']
+
+def _evict_cached_conversation(conversation_id):
+    with _conversation_cache_lock:
+        _conversation_cache.pop(conversation_id, None)
+
+def _copy_conversation(conversation):
+    conversation_copy = dict(conversation)
+    conversation_copy['messages'] = list(conversation['messages'])
+    return conversation_copy
+
+# Conversation listing index functions
+#
+# The load game screen only needs a handful of header fields per conversation, so they are kept in a
+# small index file that is updated on every write and delete. Entries remember the file signature they
+# were built from, and any entry that is missing or stale (e.g. a file copied in by hand) is rebuilt
+# from the conversation itself the next time listings are requested.
+
+def read_conversation_listings():
+    """Returns a listing for every stored conversation, refreshing any index entries that are stale."""
+    with _index_lock:
+        index = _read_json_index(CONVERSATION_LISTINGS_PATH)
+        listings = []
+        index_changed = False
+        conversation_ids = read_all_conversation_ids()
+        for conversation_id in conversation_ids:
+            entry = index.get(conversation_id)
+            signature = _conversation_file_signature(conversation_id)
+            if entry is None or entry['signature'] != signature:
+                log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Listing for conversation {conversation_id} is missing or stale, rebuilding it")
+                header = read_conversation_header(conversation_id)
+                if header is None:
+                    continue
+                header.setdefault('conversation_id', conversation_id)
+                entry = _conversation_listing(header, header['message_count'], signature)
+                index[conversation_id] = entry
+                index_changed = True
+            listings.append({key: value for key, value in entry.items() if key != 'signature'})
+
+        for conversation_id in set(index) - set(conversation_ids):
+            del index[conversation_id]
+            index_changed = True
+        if index_changed:
+            _write_json_index(CONVERSATION_LISTINGS_PATH, index)
+    return listings
+
+def _update_conversation_listing(conversation):
+    conversation_id = conversation['conversation_id']
+    with _index_lock:
+        index = _read_json_index(CONVERSATION_LISTINGS_PATH)
+        index[conversation_id] = _conversation_listing(conversation, len(conversation['messages']), _conversation_file_signature(conversation_id))
+        _write_json_index(CONVERSATION_LISTINGS_PATH, index)
+
+def _remove_conversation_listing(conversation_id):
+    with _index_lock:
+        index = _read_json_index(CONVERSATION_LISTINGS_PATH)
+        if index.pop(conversation_id, None) is not None:
+            _write_json_index(CONVERSATION_LISTINGS_PATH, index)
+
+def _conversation_listing(conversation, message_count, signature):
+    return {
+        'conversation_id': conversation['conversation_id'],
+        'name': conversation.get('name', conversation['conversation_id']),
+        'last_updated': conversation.get('last_updated', '1970-01-01T00:00:00'),
+        'created_at': conversation.get('created_at', '1970-01-01T00:00:00'),
+        'location': conversation.get('location', 'Untitled location'),
+        'message_count': message_count,
+        'signature': signature,
+    }
+
+def _read_json_index(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        log_with_category(LogCategory.PERSISTENCE, logging.WARNING, f"Index file {path} is unreadable, rebuilding it")
+        return {}
+
+def _write_json_index(path, index):
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(temp_path, path)
+
 # Game seed functions
 
 def read_game_seed(conversation_id):
@@ -162,92 +653,66 @@ def read_game_seed(conversation_id):
     file_path = os.path.join(GAME_SEEDS_DIR, f"{conversation_id}.json")
     if os.path.exists(file_path):
         with open(file_path, 'r') as f:
-            conversation_data = json.load(f)
-            
-            # Add boot_sequence_end_index if missing
-            if 'boot_sequence_end_index' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, "No boot_sequence_end_index found, scanning messages for marker")
-                boot_sequence_end_index = -1
-                for i, message in enumerate(conversation_data.get('messages', [])):
-                    if message.get('is_boot_sequence_end'):
-                        boot_sequence_end_index = i
-                        break
-                if boot_sequence_end_index != -1:
-                    log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Found boot sequence end marker at index {boot_sequence_end_index}")
-                    conversation_data['boot_sequence_end_index'] = boot_sequence_end_index
-                else:
-                    log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, "No boot sequence end marker found in messages")
-            
-            if 'conversation_id' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No ID found in file. Setting game seed id to: " + conversation_id)
-                conversation_data['conversation_id'] = conversation_id
-            if 'location' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No location found in file. Setting location to 'No location': " + conversation_id)
-                conversation_data['location'] = 'No location'
-            if 'description' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No description found in file. Setting description to 'No description': " + conversation_id)
-                conversation_data['description'] = 'No description'
-            if 'created_at' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No created_at found in file. Setting created_at to '1970-01-01T00:00:00': " + conversation_id)
-                # Use 1970-01-01 as the "beginning of time" default date
-                conversation_data['created_at'] = '1970-01-01T00:00:00'
-            if 'intro_blurb' not in conversation_data:
-                conversation_data['intro_blurb'] = get_intro_blurb_string()
-                conversation_data['intro_blurb_date'] = datetime.now().isoformat()
-            if 'gameplay_system_prompt' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No gameplay_system_prompt found in file. Setting gameplay_system_prompt to default: " + conversation_id)
-                conversation_data['gameplay_system_prompt'] = get_gameplay_system_prompt()
-                conversation_data['gameplay_system_prompt_date'] = datetime.now().isoformat()
-            if 'game_setup_system_prompt' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No game_setup_system_prompt found in file. Setting game_setup_system_prompt to default: " + conversation_id)
-                conversation_data['game_setup_system_prompt'] = get_game_setup_system_prompt()
-                conversation_data['game_setup_system_prompt_date'] = datetime.now().isoformat()
-            if 'summarizer_system_prompt' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No summarizer_system_prompt found in file. Setting summarizer_system_prompt to default: " + conversation_id)
-                conversation_data['summarizer_system_prompt'] = get_summarizer_system_prompt()
-                conversation_data['summarizer_system_prompt_date'] = datetime.now().isoformat()
-            if 'game_setup_system_prompt_date' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No game_setup_system_prompt_date found in file. Setting game_setup_system_prompt_date to now: " + conversation_id)
-                conversation_data['game_setup_system_prompt_date'] = datetime.now().isoformat()
-            if 'gameplay_system_prompt_date' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No gameplay_system_prompt_date found in file. Setting gameplay_system_prompt_date to now: " + conversation_id)
-                conversation_data['gameplay_system_prompt_date'] = datetime.now().isoformat()
-            if 'intro_blurb_date' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No intro_blurb_date found in file. Setting intro_blurb_date to now: " + conversation_id)
-                conversation_data['intro_blurb_date'] = datetime.now().isoformat()
-            if 'summarizer_system_prompt_date' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No summarizer_system_prompt_date found in file. Setting summarizer_system_prompt_date to now: " + conversation_id)
-                conversation_data['summarizer_system_prompt_date'] = datetime.now().isoformat()
-            if 'intro_blurb' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No intro_blurb found in file. Setting intro_blurb to default: " + conversation_id)
-                conversation_data['intro_blurb'] = get_intro_blurb_string()
-                conversation_data['intro_blurb_date'] = datetime.now().isoformat()
-            if 'intro_blurb_date' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No intro_blurb_date found in file. Setting intro_blurb_date to now: " + conversation_id)
-                conversation_data['intro_blurb_date'] = datetime.now().isoformat()
-            if 'game_has_begun' not in conversation_data:
-                log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No game_has_begun found in file. Setting game_has_begun to False: " + conversation_id)
-                conversation_data['game_has_begun'] = False
-                conversation_data['game_has_begun_date'] = datetime.now().isoformat()        
-            
-            # Always use latest summarizer system prompt
-            conversation_data['summarizer_system_prompt'] = get_summarizer_system_prompt()
-            conversation_data['summarizer_system_prompt_date'] = datetime.now().isoformat()
-
-            # Always use latest game manual
-            conversation_data['gameplay_system_prompt'] = get_gameplay_system_prompt()
-            conversation_data['gameplay_system_prompt_date'] = datetime.now().isoformat()
-            conversation_data['game_setup_system_prompt'] = get_game_setup_system_prompt()
-            conversation_data['game_setup_system_prompt_date'] = datetime.now().isoformat()
-
-            # Always use latest coach system prompt
-            conversation_data['coaching_system_prompt'] = get_coach_system_prompt()
-            conversation_data['coaching_system_prompt_date'] = datetime.now().isoformat()
+            conversation_data = _hydrate_prompts(json.load(f))
+        _migrate_game_seed_data(conversation_data, conversation_id)
             
-            return conversation_data
+        # Always use latest summarizer system prompt
+        conversation_data['summarizer_system_prompt'] = get_summarizer_system_prompt()
+        conversation_data['summarizer_system_prompt_date'] = datetime.now().isoformat()
+
+        # Always use latest game manual
+        conversation_data['gameplay_system_prompt'] = get_gameplay_system_prompt()
+        conversation_data['gameplay_system_prompt_date'] = datetime.now().isoformat()
+        conversation_data['game_setup_system_prompt'] = get_game_setup_system_prompt()
+        conversation_data['game_setup_system_prompt_date'] = datetime.now().isoformat()
+
+        # Always use latest coach system prompt
+        conversation_data['coaching_system_prompt'] = get_coach_system_prompt()
+        conversation_data['coaching_system_prompt_date'] = datetime.now().isoformat()
+        
+        return conversation_data
     log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "Game seed not found: " + conversation_id)
     return None
 
+def _migrate_game_seed_data(conversation_data, conversation_id):
+    """Upgrades a game seed from the schema version it was saved at, one migration step at a time."""
+    schema_version = conversation_data.get('schema_version', 0)
+    if schema_version == GAME_SEED_SCHEMA_VERSION:
+        return conversation_data
+    log_with_category(LogCategory.PERSISTENCE, logging.INFO, f"Migrating game seed {conversation_id} from schema version {schema_version} to {GAME_SEED_SCHEMA_VERSION}")
+    for step_version, migration_step in _GAME_SEED_MIGRATION_STEPS:
+        if schema_version < step_version:
+            migration_step(conversation_data, conversation_id)
+    conversation_data['schema_version'] = GAME_SEED_SCHEMA_VERSION
+    return conversation_data
+
+def _migrate_game_seed_to_v1(conversation_data, conversation_id):
+    """Backfills fields that game seeds saved before schema versioning may be missing."""
+    _backfill_boot_sequence_end_index(conversation_data)
+    if 'conversation_id' not in conversation_data:
+        log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No ID found in file. Setting game seed id to: " + conversation_id)
+        conversation_data['conversation_id'] = conversation_id
+    if 'location' not in conversation_data:
+        log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No location found in file. Setting location to 'No location': " + conversation_id)
+        conversation_data['location'] = 'No location'
+    if 'description' not in conversation_data:
+        log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No description found in file. Setting description to 'No description': " + conversation_id)
+        conversation_data['description'] = 'No description'
+    if 'created_at' not in conversation_data:
+        log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No created_at found in file. Setting created_at to '1970-01-01T00:00:00': " + conversation_id)
+        # Use 1970-01-01 as the "beginning of time" default date
+        conversation_data['created_at'] = '1970-01-01T00:00:00'
+    _backfill_prompts_and_dates(conversation_data, conversation_id)
+    if 'game_has_begun' not in conversation_data:
+        log_with_category(LogCategory.PERSISTENCE, logging.WARNING, "No game_has_begun found in file. Setting game_has_begun to False: " + conversation_id)
+        conversation_data['game_has_begun'] = False
+        conversation_data['game_has_begun_date'] = datetime.now().isoformat()
+
+# (schema version, step that upgrades a game seed to it), oldest first
+_GAME_SEED_MIGRATION_STEPS = [
+    (1, _migrate_game_seed_to_v1),
+]
+
 
 def write_game_seed(game_seed):
     log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Saving game seed {game_seed['conversation_id']}")
@@ -255,15 +720,67 @@ def write_game_seed(game_seed):
     game_seed['last_updated'] = datetime.now().isoformat()
     file_path = os.path.join(GAME_SEEDS_DIR, f"{conversation_id}.json")
     with open(file_path, 'w') as f:
-        json.dump(game_seed, f, indent=2)
+        json.dump(_dehydrate_prompts(game_seed), f, indent=2)
+    with _index_lock:
+        catalog = _read_json_index(GAME_SEED_CATALOG_PATH)
+        catalog[conversation_id] = _game_seed_listing(game_seed, conversation_id, _file_signature(file_path))
+        _write_json_index(GAME_SEED_CATALOG_PATH, catalog)
 
 def delete_game_seed(conversation_id):
     file_path = os.path.join(GAME_SEEDS_DIR, f"{conversation_id}.json")
+    with _index_lock:
+        catalog = _read_json_index(GAME_SEED_CATALOG_PATH)
+        if catalog.pop(conversation_id, None) is not None:
+            _write_json_index(GAME_SEED_CATALOG_PATH, catalog)
     if os.path.exists(file_path):
         os.remove(file_path)
         return True
     return False
 
+def read_game_seed_listings():
+    """
+    Returns a listing for every game seed from the seed catalog, without opening any seed whose
+    catalog entry still matches the file's mtime and size. Seeds that were added or changed
+    outside of write_game_seed (e.g. promoted back in from an archive) are re-read once.
+    """
+    with _index_lock:
+        catalog = _read_json_index(GAME_SEED_CATALOG_PATH)
+        listings = []
+        catalog_changed = False
+        game_seed_ids = read_all_game_seed_ids()
+        for game_seed_id in game_seed_ids:
+            file_path = os.path.join(GAME_SEEDS_DIR, f"{game_seed_id}.json")
+            entry = catalog.get(game_seed_id)
+            signature = _file_signature(file_path)
+            if entry is None or entry['signature'] != signature:
+                log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Catalog entry for game seed {game_seed_id} is missing or stale, rebuilding it")
+                with open(file_path, 'r') as f:
+                    game_seed = json.load(f)
+                entry = _game_seed_listing(game_seed, game_seed_id, signature)
+                catalog[game_seed_id] = entry
+                catalog_changed = True
+            listings.append({key: value for key, value in entry.items() if key != 'signature'})
+
+        for game_seed_id in set(catalog) - set(game_seed_ids):
+            del catalog[game_seed_id]
+            catalog_changed = True
+        if catalog_changed:
+            _write_json_index(GAME_SEED_CATALOG_PATH, catalog)
+    return listings
+
+def _game_seed_listing(game_seed, game_seed_id, signature):
+    created_at = game_seed.get('created_at', '1970-01-01T00:00:00')
+    return {
+        'id': game_seed_id,
+        'name': game_seed.get('location', 'No location'),
+        'location': game_seed.get('location', 'No location'),
+        'description': game_seed.get('description', 'No description'),
+        'created_at': created_at,
+        'last_updated': game_seed.get('last_updated', created_at),
+        'message_count': len(game_seed.get('messages', [])),
+        'signature': signature,
+    }
+
 def read_all_game_seed_ids():
     conversation_ids = []
     for filename in os.listdir(GAME_SEEDS_DIR):
@@ -272,116 +789,231 @@ def read_all_game_seed_ids():
             conversation_ids.append(conversation_id)
     return conversation_ids
 
+# World gen job functions
+#
+# A world gen job checkpoints a conversation's world generation after every instruction, along with
+# the rendered instructions themselves, so a run that fails or is interrupted can pick up where it
+# left off with the same rolls. A conversation has at most one job, so a job's id is its conversation's id.
+# Once the conversation is saved the checkpoints are dropped, and only the job's outcome is kept.
+
+def read_world_gen_job(job_id):
+    file_path = os.path.join(WORLD_GEN_JOBS_DIR, f"{job_id}.json")
+    if not os.path.exists(file_path):
+        return None
+    try:
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        log_with_category([LogCategory.PERSISTENCE, LogCategory.WORLD_GEN], logging.WARNING, f"World gen job {job_id} is unreadable, ignoring it")
+        return None
+
+def write_world_gen_job(job):
+    log_with_category([LogCategory.PERSISTENCE, LogCategory.WORLD_GEN], logging.DEBUG, f"Saving world gen job {job['job_id']}")
+    job['updated_at'] = datetime.now().isoformat()
+    if 'steps' in job:
+        job['completed_instructions'] = sum(1 for step in job['steps'] if step is not None)
+        job['total_instructions'] = len(job['steps'])
+    os.makedirs(WORLD_GEN_JOBS_DIR, exist_ok=True)
+    file_path = os.path.join(WORLD_GEN_JOBS_DIR, f"{job['job_id']}.json")
+    temp_path = file_path + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(job, f)
+    os.replace(temp_path, file_path)
+
+def delete_world_gen_job(job_id):
+    file_path = os.path.join(WORLD_GEN_JOBS_DIR, f"{job_id}.json")
+    if os.path.exists(file_path):
+        os.remove(file_path)
+        return True
+    return False
+
+def read_world_gen_job_listings():
+    """
+    Returns a short listing of every world gen job on disk, oldest first.
+    """
+    if not os.path.exists(WORLD_GEN_JOBS_DIR):
+        return []
+    listings = []
+    for filename in os.listdir(WORLD_GEN_JOBS_DIR):
+        if not filename.endswith(".json"):
+            continue
+        job = read_world_gen_job(filename[:-5])
+        if job is None:
+            continue
+        listings.append({
+            'job_id': job['job_id'],
+            'status': job['status'],
+            'completed_instructions': job.get('completed_instructions', 0),
+            'total_instructions': job.get('total_instructions', 0),
+            'created_at': job['created_at'],
+            'updated_at': job['updated_at'],
+            'error': job.get('error'),
+        })
+    return sorted(listings, key=lambda listing: listing['created_at'])
+
+# Schema migration functions
+
+def migrate_storage(dry_run=False):
+    """
+    Upgrades every conversation, game seed and archived game seed on disk to the current schema
+    version, so that later reads take the fast path. Conversations are rewritten as a header and
+    message store; last_updated is left alone. Returns a dict of counts for each kind of file.
+    """
+    summary = {'conversations': 0, 'game_seeds': 0, 'already_current': 0}
+    for conversation_id in read_all_conversation_ids():
+        if read_conversation_header(conversation_id).get('schema_version') == CONVERSATION_SCHEMA_VERSION:
+            summary['already_current'] += 1
+            continue
+        summary['conversations'] += 1
+        if dry_run:
+            continue
+        conversation_data = _load_conversation_data(conversation_id)
+        _migrate_conversation_data(conversation_data, conversation_id)
+        _write_conversation_files(conversation_data)
+        _evict_cached_conversation(conversation_id)
+        _update_conversation_listing(conversation_data)
+
+    for seeds_dir in [GAME_SEEDS_DIR] + GAME_SEED_ARCHIVE_DIRS:
+        if not os.path.isdir(seeds_dir):
+            continue
+        for filename in sorted(os.listdir(seeds_dir)):
+            if not filename.endswith(".json"):
+                continue
+            file_path = os.path.join(seeds_dir, filename)
+            with open(file_path, 'r') as f:
+                game_seed = _hydrate_prompts(json.load(f))
+            if game_seed.get('schema_version') == GAME_SEED_SCHEMA_VERSION:
+                summary['already_current'] += 1
+                continue
+            summary['game_seeds'] += 1
+            if dry_run:
+                continue
+            _migrate_game_seed_data(game_seed, filename[:-5])
+            temp_path = file_path + ".tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(_dehydrate_prompts(game_seed), f, indent=2)
+            os.replace(temp_path, file_path)
+
+    log_with_category(LogCategory.PERSISTENCE, logging.INFO, f"Schema migration {'(dry run) ' if dry_run else ''}finished: {summary}")
+    return summary
+
+# Prompt store functions
+#
+# Every conversation and seed used to carry its own copy of each system prompt (several hundred KB
+# per file). Prompts are now written once to PROMPT_STORE_DIR, named by the hash of their content,
+# and files only hold a small {"hash", "version"} reference next to the usual *_date field.
+# Files that still embed their prompts are read as before and switch to references on their next write.
+
+def store_prompt(prompt_blocks):
+    """Stores system prompt blocks in the prompt store (if not already there) and returns a reference to them."""
+    # The prompt registry hands out the same block list until a prompt file changes, so skip re-hashing it
+    known_ref = _prompt_refs_by_identity.get(id(prompt_blocks))
+    if known_ref is not None and known_ref[0] is prompt_blocks:
+        return known_ref[1]
+    serialized = json.dumps(prompt_blocks, sort_keys=True)
+    prompt_hash = hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+    if prompt_hash not in _prompt_store_cache:
+        file_path = os.path.join(PROMPT_STORE_DIR, f"{prompt_hash}.json")
+        if not os.path.exists(file_path):
+            os.makedirs(PROMPT_STORE_DIR, exist_ok=True)
+            log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Adding prompt {prompt_hash} to prompt store")
+            temp_path = file_path + ".tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({'hash': prompt_hash, 'version': PROMPT_STORE_VERSION, 'blocks': prompt_blocks}, f)
+            os.replace(temp_path, file_path)
+        _prompt_store_cache[prompt_hash] = prompt_blocks
+    prompt_ref = {'hash': prompt_hash, 'version': PROMPT_STORE_VERSION}
+    _prompt_refs_by_identity[id(prompt_blocks)] = (prompt_blocks, prompt_ref)
+    return prompt_ref
+
+def load_prompt(prompt_ref):
+    """Resolves a prompt store reference to its system prompt blocks, or None if it can't be found."""
+    prompt_hash = prompt_ref['hash']
+    if prompt_hash not in _prompt_store_cache:
+        file_path = os.path.join(PROMPT_STORE_DIR, f"{prompt_hash}.json")
+        if not os.path.exists(file_path):
+            log_with_category(LogCategory.PERSISTENCE, logging.WARNING, f"Prompt {prompt_hash} not found in prompt store")
+            return None
+        with open(file_path, 'r') as f:
+            stored_prompt = json.load(f)
+        if stored_prompt.get('version') != prompt_ref.get('version', PROMPT_STORE_VERSION):
+            log_with_category(LogCategory.PERSISTENCE, logging.WARNING, f"Prompt {prompt_hash} has unexpected prompt store version {stored_prompt.get('version')}")
+        _prompt_store_cache[prompt_hash] = stored_prompt['blocks']
+    return _prompt_store_cache[prompt_hash]
+
+def _dehydrate_prompts(data):
+    """Returns a shallow copy of a conversation or seed with embedded prompts swapped for prompt store references."""
+    stored_data = dict(data)
+    for key in PROMPT_KEYS:
+        if isinstance(stored_data.get(key), list):
+            stored_data[key + PROMPT_REF_SUFFIX] = store_prompt(stored_data.pop(key))
+    return stored_data
+
+def _hydrate_prompts(data):
+    """Resolves prompt store references in a conversation or seed back into embedded prompts, in place."""
+    for key in PROMPT_KEYS:
+        prompt_ref = data.pop(key + PROMPT_REF_SUFFIX, None)
+        if prompt_ref is not None and key not in data:
+            prompt_blocks = load_prompt(prompt_ref)
+            if prompt_blocks is not None:
+                data[key] = prompt_blocks
+    return data
+
 # LLM instructions functions
 
 def get_game_setup_system_prompt():
     """
     Returns the combined core lore and generative primer instructions as a formatted system prompt.
     """
-    core_lore = _get_llm_instructions('core_lore')
-    generative_primer = _get_llm_instructions('generative_primer')
-
     log_with_category(LogCategory.CACHING, logging.DEBUG, "Retrieving game system prompt, which includes a cache point")
-
-    return [{
-        "type": "text",
-        "text": core_lore + "\n\n" + generative_primer,
-        "cache_control": {"type": "ephemeral"}
-    }]
+    return get_system_prompt_blocks('core_lore', 'generative_primer')
     
 def get_gameplay_system_prompt():
     """
     Returns the combined core lore and game manual instructions as a formatted system prompt.
     """
-    core_lore = _get_llm_instructions('core_lore')
-    game_manual = _get_llm_instructions('game_manual')
-
     log_with_category(LogCategory.CACHING, logging.DEBUG, "Retrieving gameplay prompt, which includes a cache point")
-
-
-    return [{
-        "type": "text",
-        "text": core_lore + "\n\n" + game_manual,
-        "cache_control": {"type": "ephemeral"}
-    }]
+    return get_system_prompt_blocks('core_lore', 'game_manual')
 
 def get_summarizer_system_prompt():
     """
     Returns the summarizer instructions as a formatted system prompt.
     """
-    summarizer = _get_llm_instructions('summarizer')
-
     log_with_category(LogCategory.CACHING, logging.DEBUG, "Retrieving summarizer prompt, which includes a cache point")
-
-    return [{
-        "type": "text",
-        "text": summarizer,
-        "cache_control": {"type": "ephemeral"}
-    }]
+    return get_system_prompt_blocks('summarizer')
 
 def get_coach_system_prompt():
     """
     Returns the coach instructions as a formatted system prompt.
     """
-    coach_part = _get_llm_instructions('coach_instruction')
-    core_lore = _get_llm_instructions('core_lore')
-    game_manual = _get_llm_instructions('game_manual')
-
     log_with_category(LogCategory.CACHING, logging.DEBUG, "Retrieving coach prompt, which includes a cache point")
-
-    return [{
-        "type": "text",
-        "text": coach_part + "\n\n" + core_lore + "\n\n" + game_manual,
-        "cache_control": {"type": "ephemeral"}
-    }]
+    return get_system_prompt_blocks('coach_instruction', 'core_lore', 'game_manual')
 
 
 def get_world_gen_sequence_array():
     """
     Returns the world gen sequence as an array of instructions, with metadata about which
-    instructions should be omitted from the final conversation.
+    instructions should be omitted from the final conversation. Every call rolls fresh
+    values for the <<<N>>> placeholders.
     
     Returns:
         List of dicts, each containing:
-            - instruction: str - The instruction text
+            - text: str - The instruction text
             - omit_result: bool - Whether this instruction's result should be omitted
+            - parallel: bool - Whether this instruction depends only on the instructions before its
+              run of consecutive parallel instructions, so it can be sent alongside them
     """
-    import re
-    content = _get_llm_instructions('world_gen_sequence')
-    
-    import random
-    # Split content into sections and parse metadata
-    sections = []
-    raw_sections = content.split("# Instruction")
-    
-    for section in raw_sections[1:]:  # Skip first empty section
-        section = section.strip()
-        omit_result = False
-        
-        if section.startswith("(omit result later)"):
-            omit_result = True
-            # Remove the marker
-            section = section.replace("(omit result later)", "", 1).strip()
-            
-        if section:  # Skip empty sections
-            sections.append({
-                "instruction": section,
-                "omit_result": omit_result
-            })
-
-    world_gen_instructions_w_omit_data = []
-    for world_gen_instruction in sections:
-        processed_section = re.sub(
-            r'<<<(\d+)>>>', 
-            lambda m: str(random.randint(1, int(m.group(1)))), 
-            world_gen_instruction['instruction']
-        )
-        world_gen_instructions_w_omit_data.append({
-            "text": processed_section,
-            "omit_result": world_gen_instruction['omit_result']
-        })
-    
-    return world_gen_instructions_w_omit_data
+    return [{
+        "text": render_world_gen_instruction(compiled_instruction),
+        "omit_result": compiled_instruction['omit_result'],
+        "parallel": compiled_instruction['parallel'],
+    } for compiled_instruction in get_compiled_world_gen_sequence()]
+
+def get_world_gen_sequence_omit_flags():
+    """
+    Returns whether each world gen instruction's result should be omitted, without rendering the sequence.
+    """
+    return [compiled_instruction['omit_result'] for compiled_instruction in get_compiled_world_gen_sequence()]
 
 def get_intro_blurb_string():
     """
@@ -399,14 +1031,4 @@ def get_final_startup_instruction_string():
 
 def _get_llm_instructions(name):
     log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Getting LLM instructions for {name}")
-    # Print the current working directory
-    log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Current working directory: {os.getcwd()}")
-    # Get the absolute path of the 'LLM_instructions' directory
-    llm_instructions_dir = os.path.abspath('LLM_instructions')
-    # Print the list of files in the 'LLM_instructions' directory
-    log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Files in LLM_instructions directory: {os.listdir(llm_instructions_dir)}")
-    file_path = os.path.join(llm_instructions_dir, f"{name}.MD")
-    log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"LLM instructions directory: {llm_instructions_dir}")
-    with open(file_path, 'r') as f:
-        log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"LLM instructions for {name} found")
-        return f.read()
\ No newline at end of file
+    return get_instructions(name)
@@ -0,0 +1,176 @@
+import os
+import re
+import time
+import random
+import threading
+import logging
+
+from .logger_config import LogCategory, log_with_category
+
+logger = logging.getLogger(__name__)
+
+LLM_INSTRUCTIONS_DIR = "LLM_instructions"
+WORLD_GEN_SEQUENCE_NAME = "world_gen_sequence"
+PROMPT_RELOAD_CHECK_INTERVAL = 1.0  # Seconds between checks of LLM_instructions for edited files
+
+
+# Prompt registry
+#
+# The files in LLM_instructions are read once and served from memory. At most once every
+# PROMPT_RELOAD_CHECK_INTERVAL seconds the directory is listed and each file is stat'ed; any file
+# whose mtime changed is re-read, so prompt edits still take effect without a restart. Instruction
+# names are matched case-insensitively, so 'coach_instruction' finds coach_instruction.md as well.
+
+# {lowercase name: {'path', 'mtime_ns', 'text'}}
+_instructions = {}
+# {(name, name, ...): {'versions', 'blocks'}}
+_system_prompts = {}
+# {name: {'version', 'instructions'}}
+_world_gen_sequences = {}
+_last_check = None
+_registry_lock = threading.RLock()
+
+
+def get_instructions(name):
+    """
+    Returns the text of LLM_instructions/<name>.MD.
+    """
+    with _registry_lock:
+        _refresh_if_due()
+        instruction = _instructions.get(name.lower())
+        if instruction is None:
+            raise FileNotFoundError(f"No LLM instructions named {name} in {os.path.abspath(LLM_INSTRUCTIONS_DIR)}")
+        return instruction['text']
+
+
+def get_instructions_version(name):
+    """
+    Returns a value that changes whenever LLM_instructions/<name>.MD is edited.
+    """
+    with _registry_lock:
+        get_instructions(name)
+        return _instructions[name.lower()]['mtime_ns']
+
+
+def get_system_prompt_blocks(*names):
+    """
+    Returns the named instructions joined into a single cached system prompt block.
+
+    The same list is returned for as long as none of the source files change, so callers
+    must treat it as read-only.
+    """
+    with _registry_lock:
+        versions = tuple(get_instructions_version(name) for name in names)
+        system_prompt = _system_prompts.get(names)
+        if system_prompt is None or system_prompt['versions'] != versions:
+            log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Building system prompt from {', '.join(names)}")
+            system_prompt = {
+                'versions': versions,
+                'blocks': [{
+                    "type": "text",
+                    "text": "\n\n".join(get_instructions(name) for name in names),
+                    "cache_control": {"type": "ephemeral"}
+                }],
+            }
+            _system_prompts[names] = system_prompt
+        return system_prompt['blocks']
+
+
+# World gen sequence
+#
+# world_gen_sequence.MD is a series of '# Instruction' sections, optionally marked
+# '(omit result later)' and/or '(parallel)', whose text may contain <<<N>>> placeholders that are replaced with a random
+# number from 1 to N every time a world is generated. The file is compiled once (per edit) into
+# static text segments and placeholder slots, so rendering a fresh sequence is just a join.
+
+def get_compiled_world_gen_sequence(name=WORLD_GEN_SEQUENCE_NAME):
+    """
+    Returns the compiled world gen sequence, as a list of dicts each containing:
+        - segments: list[str] - Static text around the placeholders (one more than there are slots)
+        - slots: list[int] - The N of each <<<N>>> placeholder, in order
+        - omit_result: bool - Whether this instruction's result should be omitted
+        - parallel: bool - Whether this instruction may be sent alongside the (parallel) instructions next to it
+    """
+    with _registry_lock:
+        version = get_instructions_version(name)
+        compiled = _world_gen_sequences.get(name)
+        if compiled is None or compiled['version'] != version:
+            log_with_category(LogCategory.WORLD_GEN, logging.DEBUG, f"Compiling world gen sequence from {name}")
+            compiled = {
+                'version': version,
+                'instructions': _compile_world_gen_sequence(get_instructions(name)),
+            }
+            _world_gen_sequences[name] = compiled
+        return compiled['instructions']
+
+
+def render_world_gen_instruction(compiled_instruction):
+    """
+    Returns the text of a compiled instruction with every placeholder replaced by a fresh random roll.
+    """
+    segments = compiled_instruction['segments']
+    slots = compiled_instruction['slots']
+    parts = [segments[0]]
+    for slot, segment in zip(slots, segments[1:]):
+        parts.append(str(random.randint(1, slot)))
+        parts.append(segment)
+    return "".join(parts)
+
+
+def _compile_world_gen_sequence(content):
+    compiled_instructions = []
+    raw_sections = content.split("# Instruction")
+
+    for section in raw_sections[1:]:  # Skip first empty section
+        section = section.strip()
+        omit_result = False
+        parallel = False
+
+        # Header markers may come in any order, e.g. "# Instruction (parallel) (omit result later)"
+        while True:
+            if section.startswith("(omit result later)"):
+                omit_result = True
+                section = section[len("(omit result later)"):].strip()
+            elif section.startswith("(parallel)"):
+                parallel = True
+                section = section[len("(parallel)"):].strip()
+            else:
+                break
+
+        if section:  # Skip empty sections
+            pieces = re.split(r'<<<(\d+)>>>', section)
+            compiled_instructions.append({
+                "segments": pieces[0::2],
+                "slots": [int(slot) for slot in pieces[1::2]],
+                "omit_result": omit_result,
+                "parallel": parallel,
+            })
+
+    return compiled_instructions
+
+
+def _refresh_if_due():
+    global _last_check
+    now = time.monotonic()
+    if _last_check is not None and now - _last_check < PROMPT_RELOAD_CHECK_INTERVAL:
+        return
+    _last_check = now
+
+    seen = set()
+    for filename in os.listdir(LLM_INSTRUCTIONS_DIR):
+        stem, extension = os.path.splitext(filename)
+        if extension.lower() != '.md':
+            continue
+        name = stem.lower()
+        path = os.path.join(LLM_INSTRUCTIONS_DIR, filename)
+        mtime_ns = os.stat(path).st_mtime_ns
+        seen.add(name)
+        instruction = _instructions.get(name)
+        if instruction is None or instruction['mtime_ns'] != mtime_ns or instruction['path'] != path:
+            log_with_category(LogCategory.PERSISTENCE, logging.DEBUG, f"Loading LLM instructions for {name} from {path}")
+            with open(path, 'r') as f:
+                _instructions[name] = {'path': path, 'mtime_ns': mtime_ns, 'text': f.read()}
+
+    for name in set(_instructions) - seen:
+        log_with_category(LogCategory.PERSISTENCE, logging.WARNING, f"LLM instructions for {name} were removed")
+        del _instructions[name]
@@ -1,3 +1,4 @@
+import json
 import logging
 import traceback
 
@@ -5,6 +6,15 @@ logger = logging.getLogger(__name__)
 
 from .logger_config import LogCategory, LogLevel, log_with_category, preview
 
+# Conversation object types that are never sent to the player
+HIDDEN_CO_TYPES = {
+    'world_gen_data',  # Filter out map generation data
+    'world_reveal_roll',  # Filter out world reveal roll
+    'world_reveal_analysis',  # Filter out world reveal analysis
+    'world_reveal_level',  # Filter out world reveal level
+    'tracked_operations',  # Filter out tracked operations
+}
+
 def convert_user_text_to_message(user_text):
     return {
         "role": "user",
@@ -14,6 +24,9 @@ def convert_user_text_to_message(user_text):
         }]
     }
 
+def format_server_sent_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 def convert_messages_to_cos(messages):
     
     if not isinstance(messages, (list, tuple)):
@@ -59,27 +72,13 @@ def convert_messages_to_cos(messages):
                                     if i == 0:
                                         continue # discard first section, which should be empty string
                                     if 'difficulty roll' in c_header:
-                                        try:
-                                            integer = int(body)
-                                            if integer < 1 or integer > 100:
-                                                log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.WARNING, f"Invalid negative difficulty target: {integer}")
-                                                continue
-                                            cos.append({'type': 'difficulty_roll', 'integer': integer})
-                                            log_with_category(LogCategory.DIFFICULTY_ROLL, LogLevel.INFO, f"Difficulty roll: {integer}")
-                                        except ValueError:
-                                            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.ERROR, f"Invalid difficulty roll value: {body}")
-                                            continue
+                                        co = _roll_to_co('difficulty_roll', body)
+                                        if co is not None:
+                                            cos.append(co)
                                     elif 'world roll' in c_header or 'reveal' in c_header:
-                                        try:
-                                            integer = int(body)
-                                            if integer < 1 or integer > 100:
-                                                log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.WARNING, f"Invalid negative reveal roll: {integer}")
-                                                continue
-                                            cos.append({'type': 'world_reveal_roll', 'integer': integer})
-                                            log_with_category(LogCategory.REVEAL_ROLL, LogLevel.INFO, f"Reveal roll: {integer}")
-                                        except ValueError:
-                                            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.ERROR, f"Invalid world reveal roll value: {body}")
-                                            continue
+                                        co = _roll_to_co('world_reveal_roll', body)
+                                        if co is not None:
+                                            cos.append(co)
                                     else:
                                         log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.WARNING, f"Unrecognized tool use section: {header}")
                                         continue
@@ -111,62 +110,9 @@ def convert_messages_to_cos(messages):
                             del text  # Free up memory after splitting
                             
                             for i, section in enumerate(sections):
-                                try:
-                                    header, _, body = section.partition('\n')
-                                    c_header = header.strip().lower()
-                                    body = body.strip()
-
-                                    if i == 0:
-                                        if section.strip():
-                                            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.WARNING, f"Out of section text: {body[:50]}...")
-                                            cos.append({'type': 'out_of_section_text', 'text': body})
-                                    else:
-                                        if 'ooc message' in c_header:
-                                            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"OOC message: {body}")
-                                            cos.append({'type': 'ooc_message', 'text': body})
-                                        elif 'map' in c_header or 'zone' in c_header or 'quad' in c_header or 'world gen data' in c_header:
-                                            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"header: {c_header}")
-                                            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"Map data: {body}")
-                                            cos.append({'type': 'world_gen_data', 'text': body})
-                                        elif 'difficulty analysis' in c_header:
-                                            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"Difficulty analysis: {body}")
-                                            log_with_category(LogCategory.DIFFICULTY_ANALYSIS, LogLevel.INFO, f"Difficulty analysis: {preview(body, 500)}")
-                                            cos.append({'type': 'difficulty_analysis', 'text': body})
-                                        elif 'difficulty target' in c_header:
-                                            try:
-                                                integer = int(body)
-                                                if integer < 1 or integer > 100:
-                                                    log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.WARNING, f"Invalid negative difficulty target: {integer}")
-                                                    continue
-                                                cos.append({'type': 'difficulty_target', 'text': integer})
-                                                log_with_category(LogCategory.DIFFICULTY_TARGET, LogLevel.INFO, f"Difficulty target: {integer}")   
-                                            except ValueError:
-                                                # This is to handle the case when it is 'Trivial' but we might want to validate more here.
-                                                cos.append({'type': 'difficulty_target', 'text': body})
-                                        elif 'reveal analysis' in c_header:
-                                            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"reveal analysis: {body}")
-                                            cos.append({'type': 'world_reveal_analysis', 'text': body})
-                                            log_with_category(LogCategory.REVEAL_ANALYSIS, LogLevel.INFO, f"Reveal analysis: {preview(body, 500)}")
-                                        elif 'reveal level' in c_header:
-                                            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"reveal level: {body}")
-                                            cos.append({'type': 'world_reveal_level', 'text': body})
-                                            log_with_category(LogCategory.REVEAL_LEVEL, LogLevel.INFO, f"Reveal level: {body}")
-                                        elif 'resulting scene' in c_header:
-                                            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"Resulting scene description: {body}")
-                                            cos.append({'type': 'resulting_scene_description', 'text': body})
-                                        elif 'tracked operations' in c_header:
-                                            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"Tracked operations: {body}")
-                                            log_with_category(LogCategory.TRACKED_OPERATIONS, LogLevel.INFO, f"Tracked operations: {preview(body, 500)}")
-                                            cos.append({'type': 'tracked_operations', 'text': body})
-                                        elif 'condition' in c_header:
-                                            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"Condition table: {body}")
-                                            cos.append({'type': 'condition_table', 'text': body})
-                                        else:
-                                            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.WARNING, f"Unrecognized section: {header}")
-                                            cos.append({'type': 'unrecognized_section', 'header_text': header.strip(), 'body_text': body})
-                                except Exception as e:
-                                    log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.ERROR, f"Error processing section '{header[:50]}...': {str(e)}\n{traceback.format_exc()}")
-                                    continue
+                                co = _assistant_section_to_co(section, i == 0)
+                                if co is not None:
+                                    cos.append(co)
                         elif item_type == 'tool_use':
                             name = item['name']
                             cos.append({'type': 'tool_use', 'function_name': name})
@@ -190,6 +136,131 @@ def convert_messages_to_cos(messages):
     logger.debug(f"First cleaned message: {cos[0] if cos else 'No messages'}")
     return cos
 
+def _assistant_section_to_co(section, is_first_section):
+    """
+    Converts one '#'-delimited section of GM text into a conversation object, or returns None if it
+    yields nothing (e.g. empty leading text, or an invalid difficulty target).
+    """
+    header = ''
+    try:
+        header, _, body = section.partition('\n')
+        c_header = header.strip().lower()
+        body = body.strip()
+
+        if is_first_section:
+            if section.strip():
+                log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.WARNING, f"Out of section text: {body[:50]}...")
+                return {'type': 'out_of_section_text', 'text': body}
+            return None
+        if 'ooc message' in c_header:
+            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"OOC message: {body}")
+            return {'type': 'ooc_message', 'text': body}
+        elif 'map' in c_header or 'zone' in c_header or 'quad' in c_header or 'world gen data' in c_header:
+            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"header: {c_header}")
+            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"Map data: {body}")
+            return {'type': 'world_gen_data', 'text': body}
+        elif 'difficulty analysis' in c_header:
+            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"Difficulty analysis: {body}")
+            log_with_category(LogCategory.DIFFICULTY_ANALYSIS, LogLevel.INFO, f"Difficulty analysis: {preview(body, 500)}")
+            return {'type': 'difficulty_analysis', 'text': body}
+        elif 'difficulty target' in c_header:
+            try:
+                integer = int(body)
+                if integer < 1 or integer > 100:
+                    log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.WARNING, f"Invalid negative difficulty target: {integer}")
+                    return None
+                log_with_category(LogCategory.DIFFICULTY_TARGET, LogLevel.INFO, f"Difficulty target: {integer}")
+                return {'type': 'difficulty_target', 'text': integer}
+            except ValueError:
+                # This is to handle the case when it is 'Trivial' but we might want to validate more here.
+                return {'type': 'difficulty_target', 'text': body}
+        elif 'reveal analysis' in c_header:
+            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"reveal analysis: {body}")
+            log_with_category(LogCategory.REVEAL_ANALYSIS, LogLevel.INFO, f"Reveal analysis: {preview(body, 500)}")
+            return {'type': 'world_reveal_analysis', 'text': body}
+        elif 'reveal level' in c_header:
+            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"reveal level: {body}")
+            log_with_category(LogCategory.REVEAL_LEVEL, LogLevel.INFO, f"Reveal level: {body}")
+            return {'type': 'world_reveal_level', 'text': body}
+        elif 'difficulty roll' in c_header:
+            # Written by the GM itself when it uses the player's pre-rolled dice
+            return _roll_to_co('difficulty_roll', body)
+        elif 'reveal roll' in c_header or 'world roll' in c_header:
+            return _roll_to_co('world_reveal_roll', body)
+        elif 'resulting scene' in c_header:
+            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"Resulting scene description: {body}")
+            return {'type': 'resulting_scene_description', 'text': body}
+        elif 'tracked operations' in c_header:
+            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"Tracked operations: {body}")
+            log_with_category(LogCategory.TRACKED_OPERATIONS, LogLevel.INFO, f"Tracked operations: {preview(body, 500)}")
+            return {'type': 'tracked_operations', 'text': body}
+        elif 'condition' in c_header:
+            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.VERBOSE_DEBUG, f"Condition table: {body}")
+            return {'type': 'condition_table', 'text': body}
+        else:
+            log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.WARNING, f"Unrecognized section: {header}")
+            return {'type': 'unrecognized_section', 'header_text': header.strip(), 'body_text': body}
+    except Exception as e:
+        log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.ERROR, f"Error processing section '{header[:50]}...': {str(e)}\n{traceback.format_exc()}")
+        return None
+
+
+def _roll_to_co(co_type, body):
+    """
+    Converts the body of a difficulty or world reveal roll section into a conversation object, or returns None if it isn't a valid roll.
+    """
+    try:
+        integer = int(body)
+    except ValueError:
+        log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.ERROR, f"Invalid {co_type} value: {body}")
+        return None
+    if integer < 1 or integer > 100:
+        log_with_category(LogCategory.CONVERT_MESSAGES_TO_COS, LogLevel.WARNING, f"Out of range {co_type}: {integer}")
+        return None
+    if co_type == 'difficulty_roll':
+        log_with_category(LogCategory.DIFFICULTY_ROLL, LogLevel.INFO, f"Difficulty roll: {integer}")
+    else:
+        log_with_category(LogCategory.REVEAL_ROLL, LogLevel.INFO, f"Reveal roll: {integer}")
+    return {'type': co_type, 'integer': integer}
+
+
+class StreamingConversationObjectParser:
+    """
+    Parses GM text into conversation objects while it is still being generated.
+
+    Text deltas are passed to feed(), which returns the conversation objects for any sections that
+    were completed by that delta (a section is complete once the next '#' arrives). finish() returns
+    whatever is left once the response is done. The results match convert_messages_to_cos on the
+    full text, with the types that filter_conversation_objects hides left out.
+    """
+
+    def __init__(self):
+        self._section_chunks = []
+        self._is_first_section = True
+
+    def feed(self, text_delta):
+        pieces = text_delta.split('#')
+        self._section_chunks.append(pieces[0])
+        completed_cos = []
+        for piece in pieces[1:]:
+            self._add_section("".join(self._section_chunks), completed_cos)
+            self._section_chunks = [piece]
+        return completed_cos
+
+    def finish(self):
+        completed_cos = []
+        self._add_section("".join(self._section_chunks), completed_cos)
+        self._section_chunks = []
+        self._is_first_section = True
+        return completed_cos
+
+    def _add_section(self, section, completed_cos):
+        co = _assistant_section_to_co(section, self._is_first_section)
+        self._is_first_section = False
+        if co is not None and co['type'] not in HIDDEN_CO_TYPES:
+            completed_cos.append(co)
+
+
 def filter_conversation_objects(conversation_objects):
     log_with_category(LogCategory.MESSAGE_FILTERING, logging.INFO, "Filtering conversation objects: " + str(len(conversation_objects)))
     """
@@ -205,13 +276,7 @@ def filter_conversation_objects(conversation_objects):
         log_with_category(LogCategory.MESSAGE_FILTERING, logging.WARNING, "No conversation objects to filter. Returning empty list.")
         return []
         
-    filtered_types = {
-        'world_gen_data',  # Filter out map generation data
-        'world_reveal_roll',  # Filter out world reveal roll
-        'world_reveal_analysis',  # Filter out world reveal analysis
-        'world_reveal_level',  # Filter out world reveal level
-        'tracked_operations',  # Filter out tracked operations
-    }
+    filtered_types = HIDDEN_CO_TYPES
     
     # Find the index of boot_sequence_end if it exists
     boot_end_index = next(
@@ -1,8 +1,10 @@
-from flask import Blueprint, request, jsonify, redirect, url_for
+from flask import Blueprint, request, jsonify, redirect, url_for, Response
 from flask import render_template, request, jsonify, session
 from .business_logic import *
 from .route_utils import *
 import traceback
+import queue
+import threading
 
 import logging
 logger = logging.getLogger(__name__)
@@ -35,8 +37,7 @@ def loadGameRoute():
 def gameRoute(conversation_id):
     logger.info(f"Received request for game with conversation_id: {conversation_id}")
 
-    conversation = getConversation(conversation_id)
-    if not conversation:
+    if not conversationExists(conversation_id):
         logger.warning(f"Conversation not found: {conversation_id}. Redirecting to main menu.")
         return redirect(url_for('routes.index_route'))
     
@@ -66,16 +67,63 @@ def getSeedListingsRoute():
 
 @routes.route('/advance_conversation', methods=['POST'])
 def advanceConversationRoute():
+    logger.info("Received request to advance conversation...")
+    payload, status_code = _advanceConversationTurn(request.get_json())
+    return jsonify(payload), status_code
+
+@routes.route('/advance_conversation_stream', methods=['POST'])
+def advanceConversationStreamRoute():
+    """
+    Same as /advance_conversation, but answers with Server-Sent Events: a 'text_delta' event for each
+    piece of GM text as it is generated, a 'conversation_objects' event for each section as soon as it
+    is complete (hidden types left out), then a single 'turn_result' event holding what
+    /advance_conversation would have returned, plus its http_status.
+    """
+    logger.info("Received request to advance conversation with streaming...")
+    data = request.get_json()
+    events = queue.Queue()
+    parser = StreamingConversationObjectParser()
+
+    def onTextDelta(text):
+        events.put(('text_delta', {'text': text}))
+        completed_conversation_objects = parser.feed(text)
+        if completed_conversation_objects:
+            events.put(('conversation_objects', {'conversation_objects': completed_conversation_objects}))
+
+    # A turn with tool calls streams several GM responses, and each one's last section only ends with the response
+    def onResponseEnd():
+        completed_conversation_objects = parser.finish()
+        if completed_conversation_objects:
+            events.put(('conversation_objects', {'conversation_objects': completed_conversation_objects}))
+
+    # The turn runs on its own thread so that it still completes (and is saved) if the client goes away
+    def runTurn():
+        payload, status_code = _advanceConversationTurn(data, on_text_delta=onTextDelta, on_response_end=onResponseEnd)
+        events.put(('turn_result', dict(payload, http_status=status_code)))
+        events.put(None)
+
+    threading.Thread(target=runTurn, daemon=True).start()
+
+    def generateEvents():
+        while True:
+            event = events.get()
+            if event is None:
+                break
+            yield format_server_sent_event(*event)
+
+    return Response(generateEvents(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _advanceConversationTurn(data, on_text_delta=None, on_response_end=None):
+    """Advances a conversation for an advance request, returning the response payload and HTTP status."""
     user_message_was_persisted = False
+    conversation_id = None
     try:
-        logger.info("Received request to advance conversation...")
-        data = request.get_json()
         conversation_id = data.get('conversation_id')
         
         # Check for valid conversation_id
         if not conversation_id:
             logger.error("...No conversation ID provided. Returning error.")
-            return jsonify({
+            return {
                 'status': 'error',
                 'success_type': 'error',
                 'user_message_was_persisted': user_message_was_persisted,
@@ -83,28 +131,31 @@ def advanceConversationRoute():
                 'error_message': 'No conversation ID provided.',
                 'new_conversation_objects': [],
                 'parsing_errors': [],
-            }), 400
+            }, 400
             
         should_run_boot_sequence = data.get('run_boot_sequence')
         raw_user_message = data.get('user_message')
         user_message_for_server = convert_user_text_to_message(raw_user_message)
 
-        conversation = getConversation(conversation_id)
-        if not conversation:
-            logger.error(f"...Conversation for id: {conversation_id} not found. Returning error.")
-            return jsonify({
-                'status': 'error',
-                'success_type': 'error',
-                'user_message_was_persisted': user_message_was_persisted,
-                'error_type': 'invalid_conversation',
-                'error_message': 'Conversation not found.',
-                'new_conversation_objects': [],
-                'parsing_errors': [],
-            }), 404
-            
-        conversation, new_messages = advanceConversation(user_message_for_server, conversation, should_run_boot_sequence)
-        saveConversation(conversation)
-        user_message_was_persisted = True
+        with conversation_lock(conversation_id, timeout=CONVERSATION_LOCK_TIMEOUT):
+            conversation = getConversation(conversation_id)
+            if not conversation:
+                logger.error(f"...Conversation for id: {conversation_id} not found. Returning error.")
+                return {
+                    'status': 'error',
+                    'success_type': 'error',
+                    'user_message_was_persisted': user_message_was_persisted,
+                    'error_type': 'invalid_conversation',
+                    'error_message': 'Conversation not found.',
+                    'new_conversation_objects': [],
+                    'parsing_errors': [],
+                }, 404
+                
+            conversation, new_messages = advanceConversation(user_message_for_server, conversation, should_run_boot_sequence, on_text_delta, on_response_end)
+            saveConversation(conversation)
+            user_message_was_persisted = True
+            if should_run_boot_sequence:
+                completeWorldGenJob(conversation_id)
 
         logger.info(f"...Conversation with id {conversation_id} advanced from {len(conversation['messages']) - 1} messages to {len(conversation['messages'])} messages and saved...")
 
@@ -112,7 +163,7 @@ def advanceConversationRoute():
         new_conversation_objects = filter_conversation_objects(new_conversation_objects)
 
         logger.info("...Returning new info on advanced conversation")
-        return jsonify({
+        return {
             'status': 'success',
             'success_type': 'full_success',
             'user_message_was_persisted': user_message_was_persisted,
@@ -123,13 +174,37 @@ def advanceConversationRoute():
             'new_conversation_objects': new_conversation_objects,
             'game_has_begun': conversation['game_has_begun'],
             'parsing_errors': [],
-        })
+        }, 200
     
+    except ConversationBusyError:
+        logger.warning(f"...Conversation with id {conversation_id} already has a turn in progress. Returning error.")
+        return {
+            'status': 'error',
+            'success_type': 'error',
+            'user_message_was_persisted': False,
+            'error_type': 'turn_in_progress',
+            'error_message': 'A turn is already in progress for this conversation.',
+            'new_conversation_objects': [],
+            'parsing_errors': [],
+        }, 409
+
+    except LLMUnavailableError as e:
+        logger.error(f"...The LLM is unavailable for conversation with id {conversation_id}: {e}. Returning error.")
+        return {
+            'status': 'error',
+            'success_type': 'error',
+            'user_message_was_persisted': user_message_was_persisted,
+            'error_type': 'llm_unavailable',
+            'error_message': 'The game master is overwhelmed right now. Please try again in a minute.',
+            'new_conversation_objects': [],
+            'parsing_errors': [],
+        }, 503
+
     except Exception as e:
         logger.error(f"Error in chat route: {e}")
         logger.error(f"Stack trace: {traceback.format_exc()}")
         logger.info("...Returning error")
-        return jsonify({
+        return {
             'status': 'error',
             'success_type': 'error',
             'user_message_was_persisted': user_message_was_persisted,
@@ -137,6 +212,66 @@ def advanceConversationRoute():
             'error_message': 'An error occurred while processing your request. Please try again.',
             'new_conversation_objects': [],
             'parsing_errors': [],
+        }, 500
+
+# World gen job routes
+
+@routes.route('/start_world_gen_job', methods=['POST'])
+def startWorldGenJobRoute():
+    """
+    Starts (or resumes) world generation for a conversation in the background and returns its
+    job_id right away. Progress is polled with /get_world_gen_job_status.
+    """
+    data = request.get_json()
+    conversation_id = data.get('conversation_id')
+    logger.info(f"Received request to start world gen job for conversation with id: {conversation_id}")
+
+    if not conversation_id:
+        logger.error("...No conversation ID provided. Returning error.")
+        return jsonify({'status': 'error', 'message': 'No conversation ID provided'}), 400
+    if not conversationExists(conversation_id):
+        logger.error(f"...Conversation with id: {conversation_id} not found. Returning error.")
+        return jsonify({'status': 'error', 'message': 'Conversation not found'}), 404
+
+    job_id = startWorldGenJob(conversation_id)
+    logger.info(f"...World gen job {job_id} started")
+    return jsonify({'status': 'success', 'job_id': job_id}), 202
+
+@routes.route('/get_world_gen_job_status', methods=['GET'])
+def getWorldGenJobStatusRoute():
+    """
+    Reports a world gen job's status and progress. Once it's completed, the conversation objects
+    it added to the conversation are included as new_conversation_objects.
+    """
+    job_id = request.args.get('job_id')
+    logger.debug(f"Received request for status of world gen job {job_id}")
+    try:
+        job_status = getWorldGenJobStatus(job_id) if job_id else None
+        if job_status is None:
+            logger.error(f"...World gen job {job_id} not found. Returning error.")
+            return jsonify({'status': 'error', 'message': 'World gen job not found'}), 404
+
+        if job_status['status'] == 'completed':
+            conversation = getConversation(job_id)
+            if conversation is None:
+                # Completed jobs outlive their conversations if those are deleted later
+                logger.error(f"...Conversation for world gen job {job_id} not found. Returning error.")
+                return jsonify({'status': 'error', 'message': 'Conversation not found'}), 404
+            new_messages = conversation['messages'][job_status.pop('prefix_message_count'):]
+            job_status['new_conversation_objects'] = filter_conversation_objects(convert_messages_to_cos(new_messages))
+            job_status['game_has_begun'] = conversation['game_has_begun']
+            logger.info(f"...World gen job {job_id} completed, returning {len(job_status['new_conversation_objects'])} new conversation objects")
+
+        job_status['job_status'] = job_status.pop('status')
+        return jsonify(dict(job_status, status='success'))
+
+    except Exception as e:
+        logger.error(f"Error getting status of world gen job {job_id}: {e}")
+        logger.error(f"Stack trace: {traceback.format_exc()}")
+        logger.info("...Returning error")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
         }), 500
 
 @routes.route('/create_conversation_from_seed', methods=['POST'])
@@ -218,9 +353,22 @@ def deleteConversationRoute():
 @routes.route('/get_conversation_listings', methods=['GET'])
 def getConversationListingsRoute():
     logger.info("Received request for conversation listings...")
-    conversation_listings = getConversationListings()
+    try:
+        sort_by = request.args.get('sort_by', 'last_updated')
+        descending = request.args.get('order', 'desc') != 'asc'
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = request.args.get('limit')
+        limit = max(int(limit), 0) if limit is not None else None
+        conversation_listings, total_count = getConversationListings(sort_by, descending, offset, limit)
+    except ValueError as e:
+        logger.error(f"...Invalid conversation listings request: {e}. Returning error.")
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     logger.info("...Conversation listings returned")
-    return jsonify({'conversation_listings': conversation_listings})
+    return jsonify({
+        'conversation_listings': conversation_listings,
+        'total_count': total_count,
+        'offset': offset,
+    })
 
 @routes.route('/get_conversation', methods=['POST'])
 def getConversationRoute():
@@ -1,14 +1,7 @@
-import os
-from anthropic import Anthropic
-from dotenv import load_dotenv
+from server_code.anthropic_client import get_anthropic_client
 
-# Load environment variables
-load_dotenv()
-
-# Initialize Anthropic client
-client = Anthropic(
-    api_key=os.getenv('ANTHROPIC_API_KEY')
-)
+# Use the shared Anthropic client
+client = get_anthropic_client()
 
 def get_claude_response(user_message, system_prompt="You are a helpful AI assistant.", temperature=0.7):
     """
@@ -0,0 +1,45 @@
+"""
+Tests for the shared event loop.
+
+This module tests running coroutines from sync code, as defined in async_runtime.py.
+"""
+
+import asyncio
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from .async_runtime import run_coroutine
+
+
+class TestRunCoroutine(unittest.TestCase):
+    """Tests for handing coroutines to the shared event loop."""
+
+    def test_concurrent_callers_share_the_loop(self):
+        async def wait_and_return(value):
+            await asyncio.sleep(0.2)
+            return value
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            results = list(executor.map(lambda value: run_coroutine(wait_and_return(value)), range(10)))
+
+        self.assertEqual(results, list(range(10)))
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_exceptions_reach_the_caller(self):
+        async def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            run_coroutine(fail())
+
+    def test_refuses_to_block_the_loop(self):
+        async def nested():
+            return run_coroutine(asyncio.sleep(0))
+
+        with self.assertRaises(RuntimeError):
+            run_coroutine(nested())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Tests for business logic.
+
+This module tests the work business_logic.py does in the background after a turn: attaching
+coaching that arrives late or out of order, and splicing in a summary made while play went on.
+"""
+
+import copy
+import tempfile
+import unittest
+from unittest import mock
+from . import business_logic, persistence
+
+
+def _message(role, text, **fields):
+    return dict({'role': role, 'content': [{'type': 'text', 'text': text}]}, **fields)
+
+
+class ConversationStoreTestCase(unittest.TestCase):
+    """Keeps conversations in memory, and conversation locks in a temporary directory."""
+
+    def setUp(self):
+        self.conversations = {}
+        locks_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(locks_dir.cleanup)
+        patchers = [
+            mock.patch.object(persistence, 'CONVERSATION_LOCKS_DIR', locks_dir.name),
+            mock.patch.object(business_logic, 'getConversation', side_effect=lambda conversation_id: copy.deepcopy(self.conversations.get(conversation_id))),
+            mock.patch.object(business_logic, 'saveConversation', side_effect=self._save),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _save(self, conversation):
+        self.conversations[conversation['conversation_id']] = copy.deepcopy(conversation)
+
+
+class TestCoaching(ConversationStoreTestCase):
+    """Tests for attaching background coaching to a conversation."""
+
+    def _coach(self, requested_at, text):
+        coaching_response = _message('coach', text)
+        with mock.patch.object(business_logic, 'getCoachingMessage', return_value=(coaching_response, None)):
+            business_logic._coachConversation('conversation', [], 'coaching prompt', requested_at)
+
+    def test_late_coaching_is_attached_after_newer_turns(self):
+        self.conversations['conversation'] = {'conversation_id': 'conversation', 'messages': [
+            _message('user', 'turn one'), _message('assistant', 'reply one'),
+            # The next turn went ahead before the coaching for turn one arrived
+            _message('user', 'turn two'), _message('assistant', 'reply two'),
+        ]}
+
+        self._coach('2026-01-01T00:00:01', 'coaching on turn one')
+
+        messages = self.conversations['conversation']['messages']
+        self.assertEqual(len(messages), 5)
+        self.assertEqual(messages[-1]['role'], 'coach')
+        self.assertEqual(messages[-1]['coaching_requested_at'], '2026-01-01T00:00:01')
+
+    def test_coaching_finishing_out_of_order_is_dropped(self):
+        self.conversations['conversation'] = {'conversation_id': 'conversation', 'messages': [_message('user', 'turn one'), _message('assistant', 'reply one')]}
+
+        # Coaching requested after turn two arrives before the coaching requested after turn one
+        self._coach('2026-01-01T00:00:02', 'coaching on turn two')
+        self._coach('2026-01-01T00:00:01', 'coaching on turn one')
+
+        coaching = [message for message in self.conversations['conversation']['messages'] if message['role'] == 'coach']
+        self.assertEqual([message['content'][0]['text'] for message in coaching], ['coaching on turn two'])
+
+
+class TestBackgroundSummarization(ConversationStoreTestCase):
+    """Tests for splicing a background summary into a conversation that kept going."""
+
+    def test_summary_keeps_messages_added_while_it_ran(self):
+        messages = [_message('user' if i % 2 == 0 else 'assistant', f"message {i}") for i in range(8)]
+        self.conversations['conversation'] = {
+            'conversation_id': 'conversation', 'messages': messages, 'history_version': 0,
+            'gameplay_system_prompt': 'gameplay prompt', 'permanent_cache_index': 1, 'cache_points': [1, 5],
+        }
+
+        def summarize(snapshot):
+            # A turn is played and saved while the summarization call is underway
+            self.conversations['conversation']['messages'] += [_message('user', 'turn during summary'), _message('assistant', 'reply during summary')]
+            # Messages 2-5 become one summary message, so the cache point on message 5 moves to it
+            return dict(snapshot, messages=snapshot['messages'][:2] + [_message('assistant', 'summary')] + snapshot['messages'][6:],
+                        history_version=1, permanent_cache_index=1, cache_points=[1, 2])
+
+        with mock.patch.object(business_logic, 'summarizeWithGM', side_effect=summarize), \
+             mock.patch.object(business_logic, 'refreshPromptCacheAsync', new=mock.AsyncMock()) as refresh:
+            business_logic._summarizeConversationInBackground('conversation')
+
+        conversation = self.conversations['conversation']
+        self.assertEqual([message['content'][0]['text'] for message in conversation['messages']], [
+            'message 0', 'message 1', 'summary', 'message 6', 'message 7', 'turn during summary', 'reply during summary',
+        ])
+        self.assertEqual(conversation['history_version'], 1)
+        self.assertEqual(conversation['cache_points'], [1, 2])
+        # The new prefix is written to the cache before the next turn needs it
+        refresh.assert_awaited_once_with(conversation['messages'], 'gameplay prompt', [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
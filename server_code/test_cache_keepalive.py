@@ -0,0 +1,60 @@
+"""
+Tests for the prompt cache keepalive.
+
+This module tests which conversations cache_keepalive.py refreshes, and its spending limit.
+"""
+
+import asyncio
+import unittest
+from unittest import mock
+from . import cache_keepalive
+from .config import CACHE_KEEPALIVE_REFRESH_AFTER_SECONDS, CACHE_KEEPALIVE_MAX_IDLE_SECONDS
+
+
+class TestCacheKeepalive(unittest.TestCase):
+    def setUp(self):
+        cache_keepalive._active_conversations.clear()
+        cache_keepalive._refresh_costs.clear()
+        self.addCleanup(cache_keepalive._active_conversations.clear)
+        self.addCleanup(cache_keepalive._refresh_costs.clear)
+
+    def test_refreshes_conversations_about_to_expire(self):
+        now = 10_000.0
+        cache_keepalive._active_conversations.update({
+            'fresh': {'last_activity': now - 10, 'last_cache_use': now - 10},
+            'expiring': {'last_activity': now - CACHE_KEEPALIVE_REFRESH_AFTER_SECONDS, 'last_cache_use': now - CACHE_KEEPALIVE_REFRESH_AFTER_SECONDS},
+            'idle': {'last_activity': now - CACHE_KEEPALIVE_MAX_IDLE_SECONDS, 'last_cache_use': now - CACHE_KEEPALIVE_REFRESH_AFTER_SECONDS},
+        })
+
+        self.assertEqual(cache_keepalive._conversations_due_for_refresh(now), ['expiring'])
+        self.assertNotIn('idle', cache_keepalive._active_conversations)
+
+    def test_only_the_last_hour_counts_against_the_budget(self):
+        now = 10_000.0
+        cache_keepalive._refresh_costs.extend([(now - cache_keepalive.BUDGET_WINDOW_SECONDS - 1, 5.0), (now - 60, 0.25), (now - 1, 0.5)])
+
+        self.assertEqual(cache_keepalive._spent_within_budget_window(now), 0.75)
+
+
+    def test_one_sweep_cannot_overspend_the_budget(self):
+        now = 10_000.0
+        due = {'last_activity': now - CACHE_KEEPALIVE_REFRESH_AFTER_SECONDS, 'last_cache_use': now - CACHE_KEEPALIVE_REFRESH_AFTER_SECONDS}
+        cache_keepalive._active_conversations.update({f'conversation {i}': dict(due, last_refresh_cost=0.4) for i in range(5)})
+
+        async def sweep():
+            with mock.patch.object(cache_keepalive, '_refresh_conversation_cache', new=mock.AsyncMock()) as refresh:
+                scheduled = cache_keepalive._schedule_due_refreshes(now)
+                await asyncio.sleep(0)
+            return scheduled, refresh
+
+        with mock.patch.object(cache_keepalive, 'CACHE_KEEPALIVE_BUDGET_PER_HOUR', 1.0):
+            scheduled, refresh = asyncio.run(sweep())
+
+        # Each refresh is expected to cost $0.40, so only two fit in $1.00 even though none has finished yet
+        self.assertEqual(scheduled, ['conversation 0', 'conversation 1'])
+        self.assertEqual(refresh.await_count, 2)
+        self.assertAlmostEqual(cache_keepalive._spent_within_budget_window(now), 0.8)
+
+
+if __name__ == '__main__':
+    unittest.main()
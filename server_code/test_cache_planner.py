@@ -0,0 +1,87 @@
+"""
+Tests for cache point planning.
+
+This module tests where cache breakpoints are placed by cache_planner.py, and how they're applied
+to GM requests in llm_communication.py.
+"""
+
+import json
+import unittest
+from .cache_planner import plan_cache_points, estimate_message_tokens
+from .llm_communication import _build_gm_request
+
+
+def _message(role, text):
+    return {'role': role, 'content': [{'type': 'text', 'text': text}]}
+
+
+def _conversation(num_messages, chars_per_message=350):
+    return [_message('user' if i % 2 == 0 else 'assistant', 'x' * chars_per_message) for i in range(num_messages)]
+
+
+class TestPlanCachePoints(unittest.TestCase):
+    """Tests for placing cache points by estimated token counts."""
+
+    def test_places_points_every_interval(self):
+        messages = _conversation(10)
+        interval = estimate_message_tokens(messages[0]) * 3
+
+        self.assertEqual(plan_cache_points(messages, token_interval=interval), [2, 5, 8])
+
+    def test_points_stay_put_as_the_conversation_grows(self):
+        messages = _conversation(10)
+        interval = estimate_message_tokens(messages[0]) * 3
+        points = plan_cache_points(messages, token_interval=interval, max_cache_points=10)
+
+        messages += _conversation(6)
+        grown_points = plan_cache_points(messages, points, token_interval=interval, max_cache_points=10)
+
+        self.assertEqual(grown_points[:len(points)], points)
+        self.assertEqual(grown_points, [2, 5, 8, 11, 14])
+
+    def test_coach_messages_are_skipped(self):
+        messages = _conversation(3) + [_message('coach', 'x' * 100000)] + _conversation(1)
+        interval = estimate_message_tokens(messages[0]) * 4
+
+        self.assertEqual(plan_cache_points(messages, token_interval=interval), [4])
+
+    def test_trimming_keeps_pinned_and_newest_points(self):
+        messages = _conversation(20)
+        interval = estimate_message_tokens(messages[0]) * 3
+
+        points = plan_cache_points(messages, pinned=[1], token_interval=interval, max_cache_points=3)
+
+        self.assertEqual(points, [1, 16, 19])
+
+
+class TestBuildGMRequest(unittest.TestCase):
+    """Tests for applying cache points to a GM request."""
+
+    def test_cache_points_survive_filtering_coach_messages(self):
+        messages = [_message('user', 'one'), _message('coach', 'advice'), _message('assistant', 'two'), _message('user', 'three')]
+
+        request = _build_gm_request(messages, 'system prompt', 0.5, cache_points=[2])
+
+        cached = [i for i, message in enumerate(request['messages']) if any('cache_control' in block for block in message['content'])]
+        self.assertEqual(cached, [1])
+        self.assertEqual(request['messages'][1]['content'][0]['text'], 'two')
+
+    def test_cached_prefix_is_identical_across_turns(self):
+        system_prompt = [{'type': 'text', 'text': 'rules and lore', 'cache_control': {'type': 'ephemeral'}}]
+        messages = _conversation(6) + [_message('coach', 'first coaching'), _message('user', 'turn one')]
+        messages[4]['pre_rolled_dice'] = {'difficulty_roll': 57, 'world_reveal_roll': 70}
+        first_request = _build_gm_request(messages, system_prompt, 0.5, cache_points=[5])
+
+        messages += [_message('assistant', 'reply one'), _message('coach', 'second coaching'), _message('user', 'turn two')]
+        second_request = _build_gm_request(messages, system_prompt, 0.5, cache_points=[5])
+
+        def cached_prefix(request):
+            return json.dumps([request['tools'], request['system'], request['messages'][:6]], sort_keys=True).encode()
+
+        self.assertEqual(cached_prefix(first_request), cached_prefix(second_request))
+        self.assertIn('first coaching', first_request['messages'][-1]['content'][-1]['text'])
+        self.assertIn('second coaching', second_request['messages'][-1]['content'][-1]['text'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+Tests for LLM call resilience.
+
+This module tests the retry, fallback and circuit breaker behaviour defined in llm_resilience.py.
+"""
+
+import asyncio
+import unittest
+from unittest import mock
+
+import httpx
+from anthropic import RateLimitError, InternalServerError, BadRequestError
+
+from . import llm_resilience, llm_communication
+from .llm_resilience import send_with_resilience, LLMUnavailableError
+
+
+def _status_error(error_class, status_code, headers=None):
+    response = httpx.Response(status_code, headers=headers or {}, request=httpx.Request('POST', 'https://api.anthropic.com/v1/messages'))
+    return error_class(f"HTTP {status_code}", response=response, body=None)
+
+
+class ResilienceTestCase(unittest.TestCase):
+    def setUp(self):
+        llm_resilience._circuits.clear()
+        self.sleeps = []
+
+        async def fake_sleep(delay):
+            self.sleeps.append(delay)
+
+        patcher = mock.patch.object(llm_resilience.asyncio, 'sleep', fake_sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(llm_resilience._circuits.clear)
+
+    def _send(self, outcomes, call_type='gm', **kwargs):
+        """Runs send_with_resilience against a fake API that raises or returns each outcome in turn."""
+        models_called = []
+
+        async def send(request):
+            models_called.append(request['model'])
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        result = asyncio.run(send_with_resilience(call_type, {'model': 'primary-model'}, send, **kwargs))
+        return result, models_called
+
+
+class TestRetries(ResilienceTestCase):
+    def test_rate_limit_is_retried_after_retry_after(self):
+        result, models_called = self._send([_status_error(RateLimitError, 429, {'retry-after': '7'}), 'response'])
+
+        self.assertEqual(result, 'response')
+        self.assertEqual(models_called, ['primary-model', 'primary-model'])
+        self.assertGreaterEqual(self.sleeps[0], 7)
+
+    def test_client_errors_are_not_retried(self):
+        with self.assertRaises(BadRequestError):
+            self._send([_status_error(BadRequestError, 400), 'response'])
+
+    def test_gives_up_when_retry_is_not_allowed(self):
+        with self.assertRaises(LLMUnavailableError):
+            self._send([_status_error(InternalServerError, 500), 'response'], can_retry=lambda: False)
+
+
+class TestFallback(ResilienceTestCase):
+    def test_overloaded_primary_falls_back(self):
+        with mock.patch.dict(llm_resilience.LLM_FALLBACK_MODELS, {'gm': 'fallback-model'}):
+            result, models_called = self._send([_status_error(InternalServerError, 529), 'response'])
+
+        self.assertEqual(result, 'response')
+        self.assertEqual(models_called, ['primary-model', 'fallback-model'])
+
+    def test_open_circuit_skips_model(self):
+        with mock.patch.dict(llm_resilience.LLM_FALLBACK_MODELS, {'gm': None}):
+            failures = [_status_error(InternalServerError, 500)] * llm_resilience.LLM_CIRCUIT_BREAKER_FAILURES
+            with mock.patch.object(llm_resilience, 'LLM_MAX_ATTEMPTS', len(failures)):
+                with self.assertRaises(LLMUnavailableError):
+                    self._send(failures)
+
+            # The circuit is now open, so the next call fails without reaching the API
+            with self.assertRaises(LLMUnavailableError):
+                self._send(['response'])
+        self.assertEqual(llm_resilience._circuits['primary-model']['failures'], llm_resilience.LLM_CIRCUIT_BREAKER_FAILURES)
+
+
+
+class TestCacheRefresh(ResilienceTestCase):
+    def test_refresh_is_skipped_while_the_circuit_is_open(self):
+        messages = [{'role': 'user', 'content': [{'type': 'text', 'text': 'hello'}]}]
+        model = llm_communication._build_gm_request(messages, 'system prompt', 0, [0])['model']
+        llm_resilience._circuits[model] = {'failures': llm_resilience.LLM_CIRCUIT_BREAKER_FAILURES, 'opened_at': 0.0}
+
+        with mock.patch.object(llm_communication, '_create_message') as create_message:
+            usage = asyncio.run(llm_communication.refreshPromptCacheAsync(messages, 'system prompt', [0]))
+
+        self.assertIsNone(usage)
+        create_message.assert_not_called()
+        # Not even the half open trial call was spent on it
+        self.assertEqual(llm_resilience._circuits[model]['opened_at'], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
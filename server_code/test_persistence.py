@@ -0,0 +1,372 @@
+"""
+Tests for conversation persistence.
+
+This module tests the conversation storage, listing index, conversation cache, prompt store,
+conversation lock, schema migration and game seed catalog defined in persistence.py.
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from . import persistence
+
+
+def _message(role, text):
+    return {"role": role, "content": [{"type": "text", "text": text}]}
+
+
+class PersistenceTestCase(unittest.TestCase):
+    """Points persistence at a temporary directory for the duration of each test."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.seeds_dir = os.path.join(self.temp_dir, 'game_seeds')
+        os.makedirs(self.seeds_dir)
+        self.patches = [
+            mock.patch.object(persistence, 'CONVERSATIONS_DIR', self.temp_dir),
+            mock.patch.object(persistence, 'GAME_SEEDS_DIR', self.seeds_dir),
+            mock.patch.object(persistence, 'CONVERSATION_LISTINGS_PATH', os.path.join(self.temp_dir, 'listings.idx')),
+            mock.patch.object(persistence, 'GAME_SEED_CATALOG_PATH', os.path.join(self.temp_dir, 'catalog.idx')),
+            mock.patch.object(persistence, 'PROMPT_STORE_DIR', os.path.join(self.temp_dir, 'prompt_store')),
+            mock.patch.object(persistence, 'GAME_SEED_ARCHIVE_DIRS', []),
+            mock.patch.object(persistence, 'CONVERSATION_LOCKS_DIR', os.path.join(self.temp_dir, 'locks')),
+            mock.patch.dict(persistence._message_store_state, clear=True),
+            mock.patch.dict(persistence._prompt_store_cache, clear=True),
+            mock.patch.dict(persistence._prompt_refs_by_identity, clear=True),
+            mock.patch.object(persistence, '_conversation_cache', persistence.OrderedDict()),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        shutil.rmtree(self.temp_dir)
+
+
+class TestConversationStorage(PersistenceTestCase):
+    """Tests for the header + message store conversation layout."""
+
+    def _new_conversation(self):
+        conversation = {
+            'conversation_id': 'test_conversation',
+            'name': 'Test',
+            'messages': [_message("assistant", "# World Gen Data\nA valley.")],
+            'game_has_begun': False,
+        }
+        persistence.write_conversation(conversation)
+        return conversation
+
+    def _header(self):
+        with open(os.path.join(self.temp_dir, 'test_conversation.json')) as f:
+            return json.load(f)
+
+    def _message_store_path(self):
+        return os.path.join(self.temp_dir, f"test_conversation.messages.{self._header()['message_store']['generation']}.jsonl")
+
+    def _message_store_files(self):
+        return [filename for filename in os.listdir(self.temp_dir) if '.messages.' in filename]
+
+    def test_saves_append_to_message_store(self):
+        """Test that a save after a read only appends the new messages."""
+        self._new_conversation()
+        self.assertNotIn('messages', self._header())
+
+        conversation = persistence.read_conversation('test_conversation')
+        conversation['messages'].append(_message("user", "I look around."))
+        conversation['messages'].append(_message("assistant", "# Resulting Scene\nFog."))
+        conversation['game_has_begun'] = True
+        persistence.write_conversation(conversation)
+
+        header = self._header()
+        self.assertEqual(header['message_store']['generation'], 1)
+        self.assertEqual(header['message_count'], 3)
+        self.assertTrue(header['game_has_begun'])
+        with open(self._message_store_path()) as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+        persistence._conversation_cache.clear()
+        reloaded = persistence.read_conversation('test_conversation')
+        self.assertEqual(reloaded['messages'], conversation['messages'])
+        self.assertTrue(reloaded['game_has_begun'])
+
+    def test_history_rewrite_writes_new_message_store(self):
+        """Test that rewriting earlier messages moves to a new message store generation."""
+        self._new_conversation()
+        conversation = persistence.read_conversation('test_conversation')
+        conversation['messages'].append(_message("user", "I look around."))
+        persistence.write_conversation(conversation)
+
+        conversation['messages'] = [_message("assistant", "[SUMMARY OF PREVIOUS CONVERSATION]")]
+        conversation['history_version'] = 1
+        persistence.write_conversation(conversation)
+
+        self.assertEqual(self._message_store_files(), ['test_conversation.messages.2.jsonl'])
+        persistence._conversation_cache.clear()
+        self.assertEqual(persistence.read_conversation('test_conversation')['messages'], conversation['messages'])
+
+    def test_lines_past_the_header_are_ignored(self):
+        """Test that messages from a save that crashed before updating the header are dropped."""
+        self._new_conversation()
+        conversation = persistence.read_conversation('test_conversation')
+        with open(self._message_store_path(), 'a') as f:
+            f.write(json.dumps(_message("user", "Never saved.")) + "\n" + '{"role": "assis')
+
+        persistence._conversation_cache.clear()
+        self.assertEqual(len(persistence.read_conversation('test_conversation')['messages']), 1)
+
+        conversation['messages'].append(_message("user", "I look around."))
+        persistence.write_conversation(conversation)
+        persistence._conversation_cache.clear()
+        self.assertEqual(persistence.read_conversation('test_conversation')['messages'], conversation['messages'])
+
+    def test_metadata_reads_skip_messages(self):
+        """Test that header and range reads only parse what they need."""
+        conversation = self._new_conversation()
+        conversation['messages'].append(_message("user", "I look around."))
+        conversation['messages'].append(_message("assistant", "# Resulting Scene\nFog."))
+        persistence.write_conversation(conversation)
+
+        self.assertTrue(persistence.conversation_exists('test_conversation'))
+        self.assertFalse(persistence.conversation_exists('missing'))
+        with mock.patch.object(persistence, '_read_messages') as read_messages:
+            header = persistence.read_conversation_header('test_conversation')
+        read_messages.assert_not_called()
+        self.assertEqual(header['message_count'], 3)
+        self.assertNotIn('messages', header)
+        self.assertEqual(persistence.read_conversation_messages('test_conversation', 1, 2), [conversation['messages'][1]])
+
+    def test_legacy_snapshot_and_journal_are_read_and_converted(self):
+        """Test that conversations in the old single file + journal layout still load, and convert on save."""
+        legacy_messages = [_message("assistant", "# World Gen Data\nA valley.")]
+        with open(os.path.join(self.temp_dir, 'test_conversation.json'), 'w') as f:
+            json.dump({'conversation_id': 'test_conversation', 'name': 'Test', 'messages': legacy_messages, 'journal_generation': 1}, f)
+        with open(os.path.join(self.temp_dir, 'test_conversation' + persistence.JOURNAL_SUFFIX), 'w') as f:
+            f.write(json.dumps({'generation': 1, 'base_message_count': 1, 'messages': [_message("user", "Hi")], 'header': {'game_has_begun': True}, 'removed': []}) + "\n")
+
+        conversation = persistence.read_conversation('test_conversation')
+        self.assertEqual(len(conversation['messages']), 2)
+        self.assertTrue(conversation['game_has_begun'])
+
+        persistence.write_conversation(conversation)
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'test_conversation' + persistence.JOURNAL_SUFFIX)))
+        self.assertEqual(self._header()['message_count'], 2)
+        self.assertNotIn('journal_generation', self._header())
+
+
+class TestConversationListings(PersistenceTestCase):
+    """Tests for the conversation listing index."""
+
+    def test_listings_follow_writes_and_deletes(self):
+        """Test that the index is maintained by write_conversation and delete_conversation."""
+        for conversation_id in ('first', 'second'):
+            persistence.write_conversation({'conversation_id': conversation_id, 'name': conversation_id, 'messages': []})
+        persistence.delete_conversation('first')
+
+        listings = persistence.read_conversation_listings()
+        self.assertEqual([listing['conversation_id'] for listing in listings], ['second'])
+        self.assertEqual(listings[0]['message_count'], 0)
+
+    def test_stale_listing_is_rebuilt(self):
+        """Test that a conversation changed outside of write_conversation is re-read."""
+        persistence.write_conversation({'conversation_id': 'first', 'name': 'first', 'messages': []})
+        with open(os.path.join(self.temp_dir, 'first.json'), 'w') as f:
+            json.dump({'conversation_id': 'first', 'name': 'Renamed', 'messages': [_message("user", "Hi")]}, f)
+
+        listing = persistence.read_conversation_listings()[0]
+        self.assertEqual(listing['name'], 'Renamed')
+        self.assertEqual(listing['message_count'], 1)
+
+
+class TestGameSeedCatalog(PersistenceTestCase):
+    """Tests for the game seed catalog."""
+
+    def _write_seed_file(self, game_seed_id, location, messages=()):
+        with open(os.path.join(self.seeds_dir, f"{game_seed_id}.json"), 'w') as f:
+            json.dump({'conversation_id': game_seed_id, 'location': location, 'messages': list(messages)}, f)
+
+    def _catalog(self):
+        with open(os.path.join(self.temp_dir, 'catalog.idx')) as f:
+            return json.load(f)
+
+    def test_seed_added_outside_write_game_seed_is_catalogued(self):
+        """Test that a seed file dropped into the seeds directory gets a catalog entry."""
+        persistence.write_game_seed({'conversation_id': 'first', 'location': 'Valley', 'messages': []})
+        self._write_seed_file('second', 'Coast', [_message("assistant", "The tide.")])
+
+        listings = {listing['id']: listing for listing in persistence.read_game_seed_listings()}
+        self.assertEqual(set(listings), {'first', 'second'})
+        self.assertEqual(listings['second']['location'], 'Coast')
+        self.assertEqual(listings['second']['message_count'], 1)
+        self.assertIn('second', self._catalog())
+
+    def test_changed_seed_is_re_read(self):
+        """Test that a seed whose file signature no longer matches its catalog entry is re-read."""
+        persistence.write_game_seed({'conversation_id': 'first', 'location': 'Valley', 'messages': []})
+        self._write_seed_file('first', 'Flooded valley', [_message("assistant", "The dam broke.")])
+
+        listing = persistence.read_game_seed_listings()[0]
+        self.assertEqual(listing['location'], 'Flooded valley')
+        self.assertEqual(listing['message_count'], 1)
+        self.assertEqual(self._catalog()['first']['location'], 'Flooded valley')
+
+    def test_removed_seed_is_dropped_from_the_catalog(self):
+        """Test that a catalog entry whose seed file is gone is removed."""
+        for game_seed_id in ('first', 'second'):
+            persistence.write_game_seed({'conversation_id': game_seed_id, 'location': game_seed_id, 'messages': []})
+        os.remove(os.path.join(self.seeds_dir, 'first.json'))
+
+        self.assertEqual([listing['id'] for listing in persistence.read_game_seed_listings()], ['second'])
+        self.assertEqual(list(self._catalog()), ['second'])
+
+    def test_corrupt_or_missing_catalog_is_rebuilt(self):
+        """Test that listings are rebuilt from the seed files when the catalog can't be used."""
+        persistence.write_game_seed({'conversation_id': 'first', 'location': 'Valley', 'messages': []})
+        catalog_path = os.path.join(self.temp_dir, 'catalog.idx')
+
+        with open(catalog_path, 'w') as f:
+            f.write('{"first": {"id": ')
+        self.assertEqual([listing['id'] for listing in persistence.read_game_seed_listings()], ['first'])
+        self.assertEqual(list(self._catalog()), ['first'])
+
+        os.remove(catalog_path)
+        self.assertEqual([listing['id'] for listing in persistence.read_game_seed_listings()], ['first'])
+        self.assertEqual(list(self._catalog()), ['first'])
+
+
+class TestConversationCache(PersistenceTestCase):
+    """Tests for the in-process conversation cache."""
+
+    def test_reads_are_served_from_cache_and_isolated(self):
+        """Test that a written conversation is read back without touching disk, as an independent copy."""
+        persistence.write_conversation({'conversation_id': 'first', 'name': 'first', 'messages': []})
+
+        with mock.patch.object(persistence, '_load_conversation_data') as load:
+            conversation = persistence.read_conversation('first')
+            conversation['messages'].append(_message("user", "Unsaved."))
+            conversation['name'] = 'Unsaved'
+            reread = persistence.read_conversation('first')
+        load.assert_not_called()
+        self.assertEqual(reread['messages'], [])
+        self.assertEqual(reread['name'], 'first')
+
+    def test_cache_is_invalidated_by_outside_writes(self):
+        """Test that a file changed behind the cache's back is re-read."""
+        persistence.write_conversation({'conversation_id': 'first', 'name': 'first', 'messages': []})
+        with open(os.path.join(self.temp_dir, 'first.json'), 'w') as f:
+            json.dump({'conversation_id': 'first', 'name': 'Renamed elsewhere', 'messages': []}, f)
+
+        self.assertEqual(persistence.read_conversation('first')['name'], 'Renamed elsewhere')
+
+    def test_save_during_read_is_not_cached_as_stale(self):
+        """Test that a read overtaken by a save doesn't cache what it read under the saved files' signature."""
+        persistence.write_conversation({'conversation_id': 'first', 'name': 'first', 'messages': []})
+        persistence._conversation_cache.clear()
+        read_messages = persistence._read_messages
+
+        def read_then_save(*args, **kwargs):
+            messages = read_messages(*args, **kwargs)
+            # A writer holding the conversation lock saves a turn while this unlocked read is underway
+            persistence.write_conversation({'conversation_id': 'first', 'name': 'Saved mid-read', 'messages': [_message("user", "Hi")]})
+            return messages
+
+        with mock.patch.object(persistence, '_read_messages', side_effect=read_then_save):
+            self.assertEqual(persistence.read_conversation('first')['messages'], [])
+
+        reread = persistence.read_conversation('first')
+        self.assertEqual(reread['name'], 'Saved mid-read')
+        self.assertEqual(len(reread['messages']), 1)
+
+    def test_cache_is_bounded(self):
+        """Test that the least recently used conversation is evicted."""
+        with mock.patch.object(persistence, 'CONVERSATION_CACHE_MAX_ENTRIES', 2):
+            for conversation_id in ('first', 'second', 'third'):
+                persistence.write_conversation({'conversation_id': conversation_id, 'messages': []})
+        self.assertEqual(list(persistence._conversation_cache), ['second', 'third'])
+
+
+class TestPromptStore(PersistenceTestCase):
+    """Tests for storing system prompts by reference."""
+
+    def test_prompts_are_stored_by_reference(self):
+        """Test that conversations hold prompt references that are resolved on load."""
+        gameplay_prompt = [{"type": "text", "text": "Lore and manual.", "cache_control": {"type": "ephemeral"}}]
+        for conversation_id in ('first', 'second'):
+            persistence.write_conversation({'conversation_id': conversation_id, 'messages': [], 'gameplay_system_prompt': gameplay_prompt})
+
+        with open(os.path.join(self.temp_dir, 'first.json')) as f:
+            stored = json.load(f)
+        self.assertNotIn('gameplay_system_prompt', stored)
+        self.assertEqual(stored['gameplay_system_prompt_ref']['version'], persistence.PROMPT_STORE_VERSION)
+        self.assertEqual(len(os.listdir(os.path.join(self.temp_dir, 'prompt_store'))), 1)
+
+        persistence._prompt_store_cache.clear()
+        loaded = persistence._load_conversation_data('second')
+        self.assertEqual(loaded['gameplay_system_prompt'], gameplay_prompt)
+        self.assertNotIn('gameplay_system_prompt_ref', loaded)
+
+
+class TestConversationLock(PersistenceTestCase):
+    """Tests for the per-conversation lock."""
+
+    def test_second_holder_is_turned_away(self):
+        """Test that a locked conversation can't be locked again until it is released."""
+        with persistence.conversation_lock('first'):
+            with self.assertRaises(persistence.ConversationBusyError):
+                with persistence.conversation_lock('first'):
+                    pass
+            with persistence.conversation_lock('second'):
+                pass
+        with persistence.conversation_lock('first'):
+            pass
+
+
+class TestSchemaMigration(PersistenceTestCase):
+    """Tests for the schema_version fast path and the bulk migration."""
+
+    def _write_legacy_conversation(self):
+        with open(os.path.join(self.temp_dir, 'legacy.json'), 'w') as f:
+            json.dump({'name': 'Legacy', 'messages': [], 'game_has_begun': False,
+                       'gameplay_system_prompt': [], 'game_setup_system_prompt': [], 'summarizer_system_prompt': [],
+                       'intro_blurb': 'Blurb.'}, f)
+
+    def test_current_schema_skips_backfill(self):
+        """Test that files already at the current schema version are not re-checked."""
+        conversation = {'conversation_id': 'current', 'schema_version': persistence.CONVERSATION_SCHEMA_VERSION, 'messages': []}
+        self.assertIs(persistence._migrate_conversation_data(conversation, 'current'), conversation)
+        self.assertNotIn('location', conversation)
+
+    def test_only_later_steps_run(self):
+        """Test that a file saved at an older schema version only gets the steps after its version."""
+        conversation = {'conversation_id': 'older', 'schema_version': 2, 'messages': [], 'dynamic_cache_index': 4}
+
+        persistence._migrate_conversation_data(conversation, 'older')
+
+        self.assertEqual(conversation['cache_points'], [])
+        self.assertNotIn('dynamic_cache_index', conversation)
+        self.assertNotIn('location', conversation)
+        self.assertEqual(conversation['schema_version'], persistence.CONVERSATION_SCHEMA_VERSION)
+
+    def test_migrate_storage_upgrades_files_once(self):
+        """Test that the bulk migration stamps legacy files and leaves last_updated alone."""
+        self._write_legacy_conversation()
+
+        self.assertEqual(persistence.migrate_storage(dry_run=True)['conversations'], 1)
+        with open(os.path.join(self.temp_dir, 'legacy.json')) as f:
+            self.assertNotIn('schema_version', json.load(f))
+
+        self.assertEqual(persistence.migrate_storage()['conversations'], 1)
+        with open(os.path.join(self.temp_dir, 'legacy.json')) as f:
+            stored = json.load(f)
+        self.assertEqual(stored['schema_version'], persistence.CONVERSATION_SCHEMA_VERSION)
+        self.assertEqual(stored['conversation_id'], 'legacy')
+        self.assertNotIn('last_updated', stored)
+        self.assertEqual(persistence.migrate_storage()['conversations'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
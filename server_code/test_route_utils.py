@@ -0,0 +1,90 @@
+"""
+Tests for route utilities.
+
+This module tests the conversion of messages to conversation objects defined in route_utils.py.
+"""
+
+import unittest
+from .route_utils import (
+    StreamingConversationObjectParser, convert_messages_to_cos, filter_conversation_objects
+)
+
+
+GM_RESPONSE = (
+    "# Difficulty Analysis\nThe lock is rusted, but you have a crowbar.\n\n"
+    "# Difficulty Target\n35\n\n"
+    "# Reveal Analysis\nThe building has been picked over.\n\n"
+    "# Reveal Level\nLow\n\n"
+    "# Resulting Scene\nThe door groans open onto a dark stairwell.\n\n"
+    "# Tracked Operations\nDay 3, 14:00\n\n"
+    "# Condition Table\n| Health | Fine |\n"
+)
+
+
+class TestStreamingConversationObjectParser(unittest.TestCase):
+    """Tests for parsing GM text into conversation objects as it streams in."""
+
+    def _stream(self, text, chunk_size):
+        parser = StreamingConversationObjectParser()
+        streamed_cos = []
+        for start in range(0, len(text), chunk_size):
+            streamed_cos.extend(parser.feed(text[start:start + chunk_size]))
+        return streamed_cos + parser.finish()
+
+    def test_matches_batch_conversion(self):
+        """Test that any chunking produces the same objects as parsing the finished message."""
+        message = {"role": "assistant", "content": [{"type": "text", "text": GM_RESPONSE}]}
+        expected = filter_conversation_objects(convert_messages_to_cos([message]))
+        for chunk_size in (1, 7, 64, len(GM_RESPONSE)):
+            self.assertEqual(self._stream(GM_RESPONSE, chunk_size), expected)
+
+    def test_sections_are_emitted_once_complete(self):
+        """Test that a section is emitted as soon as the next one starts, with hidden ones left out."""
+        parser = StreamingConversationObjectParser()
+        self.assertEqual(parser.feed("# Difficulty Analysis\nRusted lock.\n\n# Difficulty Tar"), [
+            {'type': 'difficulty_analysis', 'text': 'Rusted lock.'},
+        ])
+        self.assertEqual(parser.feed("get\n35\n\n# Reveal Analysis\nPicked over.\n\n# Reveal Level\nLow\n\n# Res"), [
+            {'type': 'difficulty_target', 'text': 35},
+        ])
+        self.assertEqual(parser.feed("ulting Scene\nA dark stairwell."), [])
+        self.assertEqual(parser.finish(), [
+            {'type': 'resulting_scene_description', 'text': 'A dark stairwell.'},
+        ])
+
+    def test_finishing_a_response_resets_for_the_next(self):
+        """Test that two responses streamed in a row (e.g. around a tool call) are parsed separately."""
+        first_response = "# Difficulty Analysis\nRusted lock.\n\n# Difficulty Target\n35"
+        second_response = "The roll is in.\n\n# Resulting Scene\nA dark stairwell."
+        parser = StreamingConversationObjectParser()
+
+        streamed_cos = parser.feed(first_response) + parser.finish()
+        streamed_cos += parser.feed(second_response) + parser.finish()
+
+        messages = [{"role": "assistant", "content": [{"type": "text", "text": text}]} for text in (first_response, second_response)]
+        self.assertEqual(streamed_cos, filter_conversation_objects(convert_messages_to_cos(messages)))
+        self.assertEqual(streamed_cos[1], {'type': 'difficulty_target', 'text': 35})
+
+
+
+class TestPreRolledDiceSections(unittest.TestCase):
+    """Tests for rolls the GM writes into its own response from pre-rolled dice."""
+
+    def test_rolls_in_gm_text_match_tool_results(self):
+        gm_message = {"role": "assistant", "content": [{"type": "text", "text": (
+            "# Difficulty Target\n35\n\n# Difficulty Roll\n57\n\n# World Reveal Roll\n70\n\n# Resulting Scene\nThe door opens."
+        )}]}
+        tool_result_message = {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "t1", "content": "# Difficulty Roll \n57\n# World Reveal Roll\n70"}]}
+
+        cos = convert_messages_to_cos([gm_message])
+
+        self.assertEqual(cos[1:3], convert_messages_to_cos([tool_result_message]))
+        self.assertEqual(filter_conversation_objects(cos), [
+            {'type': 'difficulty_target', 'text': 35},
+            {'type': 'difficulty_roll', 'integer': 57},
+            {'type': 'resulting_scene_description', 'text': 'The door opens.'},
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Tests for tool utilities.
+
+This module tests answering GM tool calls through the tool registry defined in tool_utils.py.
+"""
+
+import asyncio
+import time
+import unittest
+from unittest import mock
+from . import tool_utils
+from .tool_utils import isToolUseRequest, generate_tool_result_async, register_tool
+
+
+def _tool_use(tool_id, name):
+    return {"type": "tool_use", "id": tool_id, "name": name, "input": {}}
+
+
+class TestToolDispatch(unittest.TestCase):
+    """Tests for finding and answering every tool_use block in a GM response."""
+
+    def test_answers_every_tool_use_in_order(self):
+        gm_response = {"role": "assistant", "content": [
+            _tool_use("t1", "roll_skill_only"),
+            {"type": "text", "text": "Let's see how that goes."},
+            _tool_use("t2", "roll_world_reveal_only"),
+            _tool_use("t3", "no_such_tool"),
+        ]}
+        self.assertTrue(isToolUseRequest(gm_response))
+
+        tool_result = asyncio.run(generate_tool_result_async(gm_response, {'difficulty_roll': 57, 'world_reveal_roll': 70}))
+
+        self.assertEqual(tool_result['role'], 'user')
+        self.assertEqual([block['tool_use_id'] for block in tool_result['content']], ["t1", "t2", "t3"])
+        self.assertIn("57", tool_result['content'][0]['content'])
+        self.assertIn("70", tool_result['content'][1]['content'])
+        self.assertTrue(tool_result['content'][2]['is_error'])
+
+    def test_async_tools_run_concurrently(self):
+        with mock.patch.dict(tool_utils.TOOL_HANDLERS):
+            @register_tool("slow_lookup")
+            async def slow_lookup(tool_input, context):
+                await asyncio.sleep(0.2)
+                return "found"
+
+            gm_response = {"role": "assistant", "content": [_tool_use(f"t{i}", "slow_lookup") for i in range(5)]}
+            started = time.monotonic()
+            tool_result = asyncio.run(generate_tool_result_async(gm_response))
+
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual([block['content'] for block in tool_result['content']], ["found"] * 5)
+
+    def test_text_only_response_is_not_a_tool_request(self):
+        self.assertFalse(isToolUseRequest({"role": "assistant", "content": [{"type": "text", "text": "# Resulting Scene\nQuiet."}]}))
+
+
+if __name__ == '__main__':
+    unittest.main()
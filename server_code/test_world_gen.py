@@ -0,0 +1,183 @@
+"""
+Tests for world generation.
+
+This module tests how the world gen sequence's header markers and placeholders are compiled and
+rendered by prompt_registry.py, and how business_logic.py runs (parallel) instructions side by
+side, resumes failed runs and reports the progress of world gen jobs.
+"""
+
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+from . import business_logic, persistence, prompt_registry
+from .prompt_registry import _compile_world_gen_sequence, render_world_gen_instruction
+
+
+SEQUENCE = """
+# Instruction (omit result later)
+Briefing.
+# Instruction
+Describe the world.
+# Instruction (parallel)
+Describe zone A.
+# Instruction (parallel) (omit result later)
+Describe zone B.
+# Instruction (parallel)
+Describe zone C.
+# Instruction
+Describe the adjacencies.
+# Instruction
+Begin.
+"""
+
+
+def _instruction(text, parallel=False, omit_result=False):
+    return {'text': text, 'parallel': parallel, 'omit_result': omit_result}
+
+
+class TestWorldGenSequence(unittest.TestCase):
+    """Tests for compiling and grouping the world gen sequence."""
+
+    def test_header_markers_are_parsed(self):
+        compiled = _compile_world_gen_sequence(SEQUENCE)
+
+        self.assertEqual([instruction['parallel'] for instruction in compiled], [False, False, True, True, True, False, False])
+        self.assertEqual([instruction['omit_result'] for instruction in compiled], [True, False, False, True, False, False, False])
+        self.assertEqual(compiled[3]['segments'], ["Describe zone B."])
+
+    def test_placeholders_are_rendered_with_fresh_rolls(self):
+        compiled = _compile_world_gen_sequence(
+            "# Instruction (omit result later)\nRoll <<<6>>> and <<<20>>>.\n"
+            "# Instruction (parallel)\n<<<100>>> zones\n"
+        )
+
+        self.assertEqual(compiled[0]['segments'], ["Roll ", " and ", "."])
+        self.assertEqual(compiled[0]['slots'], [6, 20])
+        # Roll the highest value of each slot, so the expected text shows which slot went where
+        with mock.patch.object(prompt_registry.random, 'randint', side_effect=lambda low, high: high) as randint:
+            rendered = [render_world_gen_instruction(instruction) for instruction in compiled]
+
+        self.assertEqual(rendered, ["Roll 6 and 20.", "100 zones"])
+        self.assertEqual(randint.call_args_list, [mock.call(1, 6), mock.call(1, 20), mock.call(1, 100)])
+        self.assertEqual([(instruction['omit_result'], instruction['parallel']) for instruction in compiled], [(True, False), (False, True)])
+
+    def test_consecutive_parallel_instructions_are_grouped(self):
+        instructions = [_instruction('a'), _instruction('b', parallel=True), _instruction('c', parallel=True), _instruction('d'), _instruction('e', parallel=True)]
+
+        groups = business_logic.groupParallelWorldGenInstructions(instructions)
+
+        self.assertEqual([[i for i, _ in group] for group in groups], [[0], [1, 2], [3], [4]])
+
+
+class TestParallelWorldGen(unittest.TestCase):
+    """Tests for running a world gen sequence with (parallel) instructions."""
+
+    def test_parallel_results_are_spliced_in_canonical_order(self):
+        instructions = [
+            _instruction('world'),
+            _instruction('zone A', parallel=True),
+            _instruction('zone B', parallel=True),
+            _instruction('zone C', parallel=True),
+            _instruction('adjacencies'),
+            _instruction('begin'),
+        ]
+        delays = {'zone A': 0.06, 'zone B': 0.0, 'zone C': 0.03}
+        prompts_seen = {}
+
+        async def fake_gm_response(messages, system_prompt, temperature=0.7, cache_points=None, on_text_delta=None, call_type='gm'):
+            instruction = messages[-1]['content'][0]['text']
+            prompts_seen[instruction] = [message['content'][0]['text'] for message in messages[:-1]]
+            await asyncio.sleep(delays.get(instruction, 0))
+            return {'role': 'assistant', 'content': [{'type': 'text', 'text': f"about {instruction}"}]}, None
+
+        with mock.patch.object(business_logic, 'get_world_gen_sequence_array', return_value=instructions), \
+             mock.patch.object(business_logic, 'getNextGMResponseAsync', side_effect=fake_gm_response), \
+             mock.patch.object(business_logic, 'refreshPromptCacheAsync', new=mock.AsyncMock()) as refresh, \
+             mock.patch.object(business_logic, 'write_game_seed'):
+            final_messages = asyncio.run(business_logic.createDynamicWorldGenDataMessagesAsync([], 'setup prompt'))
+
+        self.assertEqual(
+            [message['content'][0]['text'] for message in final_messages],
+            ['about world', 'about zone A', 'about zone B', 'about zone C', 'adjacencies', 'about adjacencies', 'about begin'],
+        )
+        # Each zone only saw what came before the group, and the next instruction saw them all
+        self.assertEqual(prompts_seen['zone C'], ['world', 'about world'])
+        self.assertEqual(prompts_seen['adjacencies'][2:], ['zone A', 'about zone A', 'zone B', 'about zone B', 'zone C', 'about zone C'])
+        refresh.assert_awaited_once()
+
+    def test_warmed_prefix_fits_the_breakpoint_limit(self):
+        prefix_messages = [{'role': 'user', 'content': [{'type': 'text', 'text': f"message {i}"}]} for i in range(12)]
+
+        with mock.patch.object(business_logic, 'refreshPromptCacheAsync', new=mock.AsyncMock()) as refresh:
+            cache_points = asyncio.run(business_logic._warmWorldGenPrefixAsync(prefix_messages, [1, 3, 5, 7], 'setup prompt'))
+
+        # One breakpoint is left for the system prompt, and the newest points are kept
+        self.assertEqual(cache_points, [5, 7, 11])
+        refresh.assert_awaited_once_with(prefix_messages, 'setup prompt', [5, 7, 11])
+
+
+class TestWorldGenJobs(unittest.TestCase):
+    """Tests for checkpointing world gen and resuming it."""
+
+    def setUp(self):
+        jobs_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(jobs_dir.cleanup)
+        for name in ('WORLD_GEN_JOBS_DIR', 'CONVERSATION_LOCKS_DIR'):
+            patcher = mock.patch.object(persistence, name, jobs_dir.name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_retry_resumes_from_the_last_completed_instruction(self):
+        instructions = [_instruction(f"step {i} rolled {i * 7}") for i in range(5)]
+        sent = []
+        fail_at = {'step 3 rolled 21'}
+
+        async def fake_gm_response(messages, system_prompt, temperature=0.7, cache_points=None, on_text_delta=None, call_type='gm'):
+            instruction = messages[-1]['content'][0]['text']
+            sent.append(instruction)
+            if instruction in fail_at:
+                raise RuntimeError("overloaded")
+            return {'role': 'assistant', 'content': [{'type': 'text', 'text': f"about {instruction}"}]}, None
+
+        with mock.patch.object(business_logic, 'get_world_gen_sequence_array', return_value=instructions) as get_sequence, \
+             mock.patch.object(business_logic, 'getNextGMResponseAsync', side_effect=fake_gm_response), \
+             mock.patch.object(business_logic, 'write_game_seed') as write_game_seed:
+            with self.assertRaises(RuntimeError):
+                asyncio.run(business_logic.createDynamicWorldGenDataMessagesAsync([], 'setup prompt', job_id='job'))
+            self.assertEqual(persistence.read_world_gen_job('job')['status'], 'failed')
+
+            fail_at.clear()
+            sent.clear()
+            final_messages = asyncio.run(business_logic.createDynamicWorldGenDataMessagesAsync([], 'setup prompt', job_id='job'))
+
+        self.assertEqual(sent, ['step 3 rolled 21', 'step 4 rolled 28'])
+        get_sequence.assert_called_once()
+        write_game_seed.assert_called_once()
+        self.assertEqual(len(final_messages), 6)
+        self.assertEqual(final_messages[2]['content'][0]['text'], 'about step 2 rolled 14')
+
+    def test_status_reports_progress_and_interruptions(self):
+        persistence.write_world_gen_job({
+            'job_id': 'job', 'status': 'running', 'created_at': '2026-01-01T00:00:00', 'prefix_message_count': 0,
+            'instructions': [_instruction(f"step {i}") for i in range(4)], 'steps': [[], [], None, None],
+        })
+
+        with mock.patch.object(business_logic, '_running_world_gen_jobs', {'job'}):
+            self.assertEqual(business_logic.getWorldGenJobStatus('job')['progress_message'], "Processing boot sequence instruction 3/4")
+        # Still marked running, but nothing in this process is running it
+        self.assertEqual(business_logic.getWorldGenJobStatus('job')['status'], 'interrupted')
+
+        # Run by someone else (e.g. resume_world_gen or the blocking advance path), who holds the conversation's lock
+        with persistence.conversation_lock('job'):
+            self.assertEqual(business_logic.getWorldGenJobStatus('job')['status'], 'running')
+
+        business_logic.completeWorldGenJob('job')
+        job_status = business_logic.getWorldGenJobStatus('job')
+        self.assertEqual(job_status['status'], 'completed')
+        self.assertEqual(job_status['completed_instructions'], 2)
+        self.assertNotIn('steps', persistence.read_world_gen_job('job'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,5 @@
+import asyncio
+import inspect
 import logging
 from random import randint
 
@@ -7,45 +9,113 @@ logger = logging.getLogger(__name__)
 from .logger_config import LogCategory, log_with_category, preview
 
 
-def isToolUseRequest(response_json):
-    return (len(response_json['content']) > 1 and 
-            'type' in response_json['content'][1] and 
-            response_json['content'][1]['type'] == "tool_use")
+# Tool registry
+#
+# Every server-side tool the GM can call (see tools.json) is a handler registered here under the
+# tool's name. A handler takes the tool_use block's input and a ToolContext and returns the text of
+# the tool result; it may be a coroutine function if it waits on I/O. All the tool_use blocks in a
+# GM response are answered together, so adding a tool never adds a round trip of its own.
 
-def generate_tool_result(gm_response_json):
-    logger.debug(f"Generating tool result for {gm_response_json}")
+# {tool name: handler}
+TOOL_HANDLERS = {}
 
-    tool_use_id = gm_response_json['content'][1]['id']
-    function = gm_response_json['content'][1]['name']
 
-    if function == "roll_skill_and_world_reveal":
-        skill_roll, fate_roll = roll_die(), roll_die()
-        roll_string = f"# Difficulty Roll \n{skill_roll}\n" + f"# World Reveal Roll\n{fate_roll}"
-    elif function == "roll_skill_only":
-        skill_roll = roll_die()
-        roll_string = f"# difficulty roll \n\n{skill_roll}\n\n"
-    elif function == "roll_world_reveal_only":
-        fate_roll = roll_die()
-        roll_string = f"# World reveal roll\n\n{fate_roll}\n\n"
-    else:
-        roll_string = "No valid tool use found."
+class ToolContext:
+    """What a tool handler may need to know about the turn it's answering."""
 
+    def __init__(self, pre_rolled_dice=None):
+        self.pre_rolled_dice = pre_rolled_dice
 
-            # add tool result to conversation
 
-    tool_result = {
+def register_tool(name):
+    """Decorator that registers a function as the handler for the named tool."""
+    def register(handler):
+        TOOL_HANDLERS[name] = handler
+        return handler
+    return register
+
+
+def isToolUseRequest(response_json):
+    return any(content.get('type') == "tool_use" for content in response_json['content'])
+
+async def generate_tool_result_async(gm_response_json, pre_rolled_dice=None):
+    """
+    Runs every tool the GM asked for in its response, concurrently, and returns a single user
+    message holding a tool_result for each tool_use block, in the same order.
+    """
+    logger.debug(f"Generating tool results for {preview(gm_response_json, 50)}")
+    context = ToolContext(pre_rolled_dice=pre_rolled_dice)
+    tool_uses = [content for content in gm_response_json['content'] if content.get('type') == "tool_use"]
+    tool_results = await asyncio.gather(*(_run_tool(tool_use, context) for tool_use in tool_uses))
+
+    return {
         "role": "user",
-        "content": [
-            {
-                "type": "tool_result",
-                "tool_use_id": tool_use_id,
-                "content": roll_string
-            }
-        ]
+        "content": list(tool_results)
+    }
+
+async def _run_tool(tool_use, context):
+    tool_result = {
+        "type": "tool_result",
+        "tool_use_id": tool_use['id'],
     }
-    
+    handler = TOOL_HANDLERS.get(tool_use['name'])
+    if handler is None:
+        log_with_category(LogCategory.ADVANCE_CONVERSATION_LOGIC, logging.WARNING, f"GM called unknown tool: {tool_use['name']}")
+        tool_result['content'] = "No valid tool use found."
+        tool_result['is_error'] = True
+        return tool_result
 
+    try:
+        content = handler(tool_use.get('input') or {}, context)
+        if inspect.isawaitable(content):
+            content = await content
+        tool_result['content'] = content
+    except Exception as e:
+        log_with_category(LogCategory.ADVANCE_CONVERSATION_LOGIC, logging.ERROR, f"Tool {tool_use['name']} failed: {e}")
+        tool_result['content'] = f"The {tool_use['name']} tool failed."
+        tool_result['is_error'] = True
     return tool_result
 
+
+# Dice tools. If the player's message came with pre-rolled dice, those are used, so a GM that calls
+# a roll tool anyway gets the same numbers.
+
+@register_tool("roll_skill_and_world_reveal")
+def roll_skill_and_world_reveal(tool_input, context):
+    return f"# Difficulty Roll \n{_difficulty_roll(context)}\n" + f"# World Reveal Roll\n{_world_reveal_roll(context)}"
+
+@register_tool("roll_skill_only")
+def roll_skill_only(tool_input, context):
+    return f"# difficulty roll \n\n{_difficulty_roll(context)}\n\n"
+
+@register_tool("roll_world_reveal_only")
+def roll_world_reveal_only(tool_input, context):
+    return f"# World reveal roll\n\n{_world_reveal_roll(context)}\n\n"
+
+def _difficulty_roll(context):
+    return context.pre_rolled_dice['difficulty_roll'] if context.pre_rolled_dice else roll_die()
+
+def _world_reveal_roll(context):
+    return context.pre_rolled_dice['world_reveal_roll'] if context.pre_rolled_dice else roll_die()
+
 def roll_die():
     return randint(1, 100)
+
+def roll_pre_rolled_dice():
+    """
+    Rolls both dice ahead of the GM's response, to be stored on the player's message as 'pre_rolled_dice'.
+    """
+    return {'difficulty_roll': roll_die(), 'world_reveal_roll': roll_die()}
+
+def format_pre_rolled_dice_note(pre_rolled_dice):
+    """
+    Returns the note that gives the GM a message's pre-rolled dice. It's rebuilt every time the message
+    is sent, so it must always come out the same for the cached prefix to stay valid.
+    """
+    return (
+        "[Pre-rolled dice for this turn. If your analysis calls for a roll, don't use a roll tool. Instead, "
+        "right before the resulting scene, write a 'Difficulty Roll' and/or 'World Reveal Roll' section "
+        "containing just the value below, leaving out any roll that isn't called for.]\n"
+        f"Difficulty Roll: {pre_rolled_dice['difficulty_roll']}\n"
+        f"World Reveal Roll: {pre_rolled_dice['world_reveal_roll']}"
+    )
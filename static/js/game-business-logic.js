@@ -4,6 +4,7 @@ import * as server from './game-server-comms.js';
 let conversationObjectsToShowOnBeginGame = [];
 let weAreWaitingForServerResponse = false;
 let activeConversationId = window.conversationId;
+const WORLD_GEN_POLL_INTERVAL_MS = 3000;
 
 async function onPageLoad() {
     try {   
@@ -91,7 +92,7 @@ function onMessageSubmitted(message_text) {
         //If it's a boot sequence, initiate boot sequence on server
 
         uiManager.reactToWaitingForServerResponse();
-        server.sendMessageAndGetResponseFromServer(user_message, activeConversationId, true)
+        _runWorldGenJob()
             .then(conversationObjects => {
                 uiManager.reactToNotWaitingForServerResponse();
                 uiManager.addNewMessagesFromServer(conversationObjects);
@@ -107,13 +108,31 @@ function onMessageSubmitted(message_text) {
 
         uiManager.addUserMessage(user_message);    // This is optimistic. It's possible that it wont stick if the server errors out.
         uiManager.reactToWaitingForServerResponse();
-        server.sendMessageAndGetResponseFromServer(user_message, activeConversationId)
+        let streamedText = '';
+        let sceneWasRendered = false;
+        server.streamMessageAndGetResponseFromServer(user_message, activeConversationId, textDelta => {
+                streamedText += textDelta;
+                const previewText = _getResultingSceneFromStreamedText(streamedText);
+                if (previewText && !sceneWasRendered) {
+                    uiManager.showStreamingPreview(previewText);
+                }
+            }, conversationObjects => {
+                uiManager.renderProvisionalConversationObjects(conversationObjects);
+                if (!sceneWasRendered && conversationObjects.some(co => co.type === 'resulting_scene_description')) {
+                    // The finished scene replaces the preview, so go back to plain thinking dots
+                    sceneWasRendered = true;
+                    uiManager.showServerIsNoLongerThinking();
+                    uiManager.showServerIsThinking();
+                }
+            })
             .then(conversationObjects => {
+                uiManager.clearProvisionalConversationObjects();
                 uiManager.reactToNotWaitingForServerResponse();
                 uiManager.addNewMessagesFromServer(conversationObjects);
             })
             .catch(error => {
                 console.error("error: ", error);
+                uiManager.clearProvisionalConversationObjects();
                 uiManager.reactToNotWaitingForServerResponse();
                                 // First check if this is a ConversationError
                 if (error instanceof server.ConversationError && !error.message_was_persisted) {
@@ -127,6 +146,32 @@ function onMessageSubmitted(message_text) {
 }
 
 
+// World generation runs as a job on the server, which we poll (showing its progress) until it's done.
+async function _runWorldGenJob() {
+    const jobId = await server.startWorldGenJobOnServer(activeConversationId);
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, WORLD_GEN_POLL_INTERVAL_MS));
+        const jobStatus = await server.getWorldGenJobStatusFromServer(jobId);
+        if (jobStatus === null) {
+            continue;
+        }
+        if (jobStatus.job_status === 'completed') {
+            return jobStatus.new_conversation_objects;
+        }
+        if (jobStatus.progress_message) {
+            uiManager.showServerProgress(jobStatus.progress_message);
+        }
+    }
+}
+
+
+// While the GM is still responding, only the resulting scene is previewed; the analysis and tracking
+// sections are shown (or hidden) once the full response has been parsed by the server.
+function _getResultingSceneFromStreamedText(streamedText) {
+    const match = streamedText.match(/#\s*resulting scene[^\n]*\n([\s\S]*?)(?=\n#|$)/i);
+    return match ? match[1].trim() : null;
+}
+
 
 document.addEventListener('DOMContentLoaded', function() {
     onPageLoad();
@@ -135,4 +180,4 @@ document.addEventListener('DOMContentLoaded', function() {
 export {
     onMessageSubmitted as on_message_submitted,
     onPageLoad as on_page_load,
-};
\ No newline at end of file
+};
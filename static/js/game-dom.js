@@ -13,6 +13,9 @@ let loadingDiv;
 
 let hasOverlapped = false;  // Track if overlap has occurred
 
+// Elements rendered from a response that is still streaming in, replaced once the turn completes
+let provisionalElements = [];
+
 // Add at the top with other global variables
 const messageSubmittedListeners = [];
 
@@ -143,6 +146,32 @@ function showServerIsThinking() {
     _scrollChatNearBottom();
 }
 
+function showStreamingPreview(preview_text) {
+    // Swap the thinking dots for the text the GM has produced so far
+    if (!loadingDiv) {
+        return;
+    }
+    if (dotAnimation) {
+        clearInterval(dotAnimation);
+        dotAnimation = null;
+    }
+    inject_content_into_element(loadingDiv, '.module_contents', body_text(marked.parse(preview_text)));
+    _scrollChatNearBottom();
+}
+
+function showServerProgress(progress_text) {
+    // Swap the thinking dots for a note on how far along a long-running job is
+    if (!loadingDiv) {
+        return;
+    }
+    if (dotAnimation) {
+        clearInterval(dotAnimation);
+        dotAnimation = null;
+    }
+    inject_content_into_element(loadingDiv, '.module_contents', body_text(progress_text + '...'));
+    _scrollChatNearBottom();
+}
+
 function showServerIsNoLongerThinking() {
     if (dotAnimation) {
         clearInterval(dotAnimation);
@@ -311,6 +340,29 @@ function renderConversationObjects(conversation_objects) {
     console.info("added " + conversation_objects.length + " conversation objects to screen");
 }
 
+function renderProvisionalConversationObjects(conversation_objects) {
+    // Keep the thinking indicator below whatever has arrived so far
+    if (loadingDiv) {
+        loadingDiv.remove();
+    }
+    const existingElements = new Set(chatMessagesWrapper.children);
+    renderConversationObjects(conversation_objects);
+    for (const element of chatMessagesWrapper.children) {
+        if (!existingElements.has(element)) {
+            provisionalElements.push(element);
+        }
+    }
+    if (loadingDiv) {
+        chatMessagesWrapper.appendChild(loadingDiv);
+    }
+    _scrollChatNearBottom();
+}
+
+function clearProvisionalConversationObjects() {
+    provisionalElements.forEach(element => element.remove());
+    provisionalElements = [];
+}
+
 function _addConversationObject(co) {
     let coDiv;
     let color;
@@ -524,11 +576,15 @@ export {
     setErrorState,
     beginGameByShowingInitialConversationObjects,
     renderConversationObjects,
+    renderProvisionalConversationObjects,
+    clearProvisionalConversationObjects,
     _addConversationObject,
     showIntroBlurb,
     showServerIsThinking,
     allowUserToBeginGame,
     showServerIsNoLongerThinking,
+    showStreamingPreview,
+    showServerProgress,
     _set_chat_title as setGameTitle,
     _resetInputStateToEmpty,
     _scrollChatNearBottom,
@@ -4,7 +4,9 @@ const ConversationErrorType = Object.freeze({
     SERVER_ERROR: 'SERVER_ERROR',
     SERVER_OFFLINE: 'SERVER_OFFLINE',
     CONNECTION_ERROR: 'CONNECTION_ERROR',
-    SERVER_INTERNAL_ERROR: 'SERVER_INTERNAL_ERROR'
+    SERVER_INTERNAL_ERROR: 'SERVER_INTERNAL_ERROR',
+    TURN_IN_PROGRESS: 'TURN_IN_PROGRESS',
+    LLM_UNAVAILABLE: 'LLM_UNAVAILABLE'
 });
 
 class ConversationError extends Error {
@@ -94,25 +96,7 @@ async function sendMessageAndGetResponseFromServer(text, activeConversationId, i
             errorData = { user_message_was_persisted: false };
         }
 
-        const wasMessagePersisted = errorData.user_message_was_persisted || false;
-
-        if (response.status === 403) {
-            throw new ConversationError(
-                `The server appears to be offline. Perhaps try again later.`,
-                ConversationErrorType.SERVER_OFFLINE,
-                wasMessagePersisted,
-                text
-            );
-        } else {
-
-            throw new ConversationError(
-                `There was some sort of server error. Refresh and perhaps try again later.`,
-                ConversationErrorType.GENERIC_HTTP_ERROR,
-                wasMessagePersisted,
-                text
-            );
-
-        }
+        throw _conversationErrorForResult(response.status, errorData, text);
     }
 
     const data = await response.json();
@@ -135,9 +119,209 @@ async function sendMessageAndGetResponseFromServer(text, activeConversationId, i
     return data.new_conversation_objects;
 }
 
+// Like sendMessageAndGetResponseFromServer, but the GM's text is passed to onTextDelta piece by piece
+// as it is generated (over Server-Sent Events), so the player sees the response start right away.
+// Sections that are already complete are passed to onConversationObjects before the turn is done.
+async function streamMessageAndGetResponseFromServer(text, activeConversationId, onTextDelta, onConversationObjects = () => {}) {
+    const requestBody = {
+        user_message: text,
+        conversation_id: activeConversationId
+    };
+
+    console.info("...sending message to server for streaming...");
+    let response;
+    try {
+        response = await fetch('/advance_conversation_stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(requestBody),
+        });
+    } catch (error) {
+        console.error("Network error where we weren't even able to get a response from the server: " + error);
+        throw new ConversationError(
+            "Failed to connect to the server. Please check your internet connection and try again.",
+            ConversationErrorType.CONNECTION_ERROR,
+            false
+        );
+    }
+
+    if (!response.ok || !response.body) {
+        throw _conversationErrorForResult(response.status, { user_message_was_persisted: false }, text);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    let turnResult = null;
+    try {
+        while (turnResult === null) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffered += decoder.decode(value, { stream: true });
+
+            // Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffered.indexOf('\n\n')) !== -1) {
+                const event = _parseServerSentEvent(buffered.slice(0, boundary));
+                buffered = buffered.slice(boundary + 2);
+                if (event.name === 'text_delta') {
+                    onTextDelta(event.data.text);
+                } else if (event.name === 'conversation_objects') {
+                    onConversationObjects(event.data.conversation_objects);
+                } else if (event.name === 'turn_result') {
+                    turnResult = event.data;
+                }
+            }
+        }
+    } catch (error) {
+        console.error("Lost connection to the server while streaming: " + error);
+    }
+
+    if (turnResult === null) {
+        // The turn carries on (and is saved) on the server even though we lost the stream
+        throw new ConversationError(
+            "Lost connection to the server while the game master was responding. Refresh to see the result.",
+            ConversationErrorType.CONNECTION_ERROR,
+            true,
+            text
+        );
+    }
+
+    if (turnResult.status === 'error') {
+        throw _conversationErrorForResult(turnResult.http_status, turnResult, text);
+    }
+
+    console.info("...received " + turnResult.new_conversation_objects.length + " new conversation objects for conversation id: " + activeConversationId + "...");
+    return turnResult.new_conversation_objects;
+}
+
+// World generation takes minutes, so instead of a single long request it runs as a job on the server.
+// startWorldGenJobOnServer starts it (or resumes it, if an earlier attempt failed) and returns its id,
+// then getWorldGenJobStatusFromServer is polled until the job is done.
+async function startWorldGenJobOnServer(activeConversationId) {
+    console.info("...starting world gen job on server...");
+    let response;
+    try {
+        response = await fetch('/start_world_gen_job', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ conversation_id: activeConversationId }),
+        });
+    } catch (error) {
+        console.error("Network error where we weren't even able to get a response from the server: " + error);
+        throw new ConversationError(
+            "Failed to connect to the server. Please check your internet connection and try again.",
+            ConversationErrorType.CONNECTION_ERROR,
+            false
+        );
+    }
+
+    if (!response.ok) {
+        throw _conversationErrorForResult(response.status, { user_message_was_persisted: false }, null);
+    }
+
+    const data = await response.json();
+    console.info("...world gen job " + data.job_id + " started for conversation id: " + activeConversationId + "...");
+    return data.job_id;
+}
+
+// Returns the job's status (job_status, progress_message, and new_conversation_objects once it's
+// completed), or null if the server couldn't be reached this time. Throws if the job failed.
+async function getWorldGenJobStatusFromServer(jobId) {
+    let response;
+    try {
+        response = await fetch('/get_world_gen_job_status?job_id=' + encodeURIComponent(jobId));
+    } catch (error) {
+        // The job carries on without us, so just try again on the next poll
+        console.warn("Couldn't reach the server for world gen job status: " + error);
+        return null;
+    }
+
+    if (!response.ok) {
+        throw _conversationErrorForResult(response.status, { user_message_was_persisted: false }, null);
+    }
+
+    const data = await response.json();
+    if (data.job_status === 'failed' || data.job_status === 'interrupted') {
+        console.error("World gen job " + jobId + " ended with status: " + data.job_status);
+        if (data.error_type === 'llm_unavailable') {
+            throw _conversationErrorForResult(503, data, null);
+        }
+        throw new ConversationError(
+            `World generation stopped partway through. Try again to pick up where it left off.`,
+            ConversationErrorType.SERVER_INTERNAL_ERROR,
+            false
+        );
+    }
+    return data;
+}
+
+function _parseServerSentEvent(rawEvent) {
+    let name = 'message';
+    let data = '';
+    for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event: ')) {
+            name = line.slice('event: '.length);
+        } else if (line.startsWith('data: ')) {
+            data += line.slice('data: '.length);
+        }
+    }
+    return { name: name, data: JSON.parse(data) };
+}
+
+function _conversationErrorForResult(httpStatus, errorData, text) {
+    const wasMessagePersisted = errorData.user_message_was_persisted || false;
+
+    if (httpStatus === 409 && errorData.error_type === 'turn_in_progress') {
+        return new ConversationError(
+            `The game master is still responding to an earlier message. Wait a moment and try again.`,
+            ConversationErrorType.TURN_IN_PROGRESS,
+            false,
+            text
+        );
+    } else if (httpStatus === 503 && errorData.error_type === 'llm_unavailable') {
+        return new ConversationError(
+            `The game master is overwhelmed right now. Wait a minute and try again.`,
+            ConversationErrorType.LLM_UNAVAILABLE,
+            wasMessagePersisted,
+            text
+        );
+    } else if (httpStatus === 403) {
+        return new ConversationError(
+            `The server appears to be offline. Perhaps try again later.`,
+            ConversationErrorType.SERVER_OFFLINE,
+            wasMessagePersisted,
+            text
+        );
+    } else if (httpStatus >= 400 && httpStatus !== 500) {
+        return new ConversationError(
+            `There was some sort of server error. Refresh and perhaps try again later.`,
+            ConversationErrorType.GENERIC_HTTP_ERROR,
+            wasMessagePersisted,
+            text
+        );
+    } else {
+        return new ConversationError(
+            `The server had some sort of internal error. Refresh and perhaps try again later.`,
+            ConversationErrorType.SERVER_INTERNAL_ERROR,
+            wasMessagePersisted,
+            text
+        );
+    }
+}
+
 export {
     getInitialConversationDataFromServer,
     sendMessageAndGetResponseFromServer,
+    streamMessageAndGetResponseFromServer,
+    startWorldGenJobOnServer,
+    getWorldGenJobStatusFromServer,
     ConversationErrorType,
     ConversationError
 };